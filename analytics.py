@@ -0,0 +1,197 @@
+"""Judge calibration and score statistics computed over all votes with NumPy"""
+import threading
+import numpy as np
+from sqlalchemy import func
+from models import db, Vote, User
+
+# Per-criterion weights of Vote.calculate_total_score (see Vote.total_score_expression)
+SCORE_WEIGHTS = np.array([3, 3, 2, 2])
+
+# Two-sided 95% Student t critical values by degrees of freedom; beyond the
+# table the normal approximation is within 2% of the exact value
+_T_95 = np.array([np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+                  2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+                  2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042])
+
+_cache = {'key': None, 'analytics': None}
+_cache_lock = threading.Lock()
+
+
+def load_vote_arrays():
+    """
+    Load every vote into columnar arrays with one query
+
+    Returns:
+        dict: vote_ids, judge_ids, team_ids (int arrays), scores (n x 4:
+        innovation, implementation, design, presentation) and totals
+        (weighted score out of 100)
+    """
+    rows = db.session.query(Vote.id, Vote.judge_id, Vote.team_id, Vote.innovation_score,
+                            Vote.implementation_score, Vote.design_score,
+                            Vote.presentation_score).order_by(Vote.id)
+    # Flattened fromiter is several times faster than np.array() on a list of rows
+    data = np.fromiter((value for row in rows for value in row), dtype=np.int64).reshape(-1, 7)
+    scores = data[:, 3:]
+    return {
+        'vote_ids': data[:, 0],
+        'judge_ids': data[:, 1],
+        'team_ids': data[:, 2],
+        'scores': scores,
+        'totals': (scores @ SCORE_WEIGHTS).astype(float)
+    }
+
+
+def _group_stats(groups, values, group_count):
+    """Count, mean and sample standard deviation of values per group index"""
+    counts = np.bincount(groups, minlength=group_count)
+    sums = np.bincount(groups, weights=values, minlength=group_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        squares = np.bincount(groups, weights=(values - means[groups]) ** 2, minlength=group_count)
+        stds = np.sqrt(squares / (counts - 1))
+    stds[counts < 2] = np.nan
+    return counts, means, stds
+
+
+def _rank_rows(matrix):
+    """Average ranks (1-based, ties share their mean rank) of each row, ignoring NaN"""
+    ranks = np.full(matrix.shape, np.nan)
+    for row in range(matrix.shape[0]):
+        present = ~np.isnan(matrix[row])
+        values = matrix[row, present]
+        if not values.size:
+            continue
+        order = np.argsort(values, kind='stable')
+        ordinal = np.empty(values.size)
+        ordinal[order] = np.arange(1, values.size + 1)
+        # Average the ordinal ranks within each group of equal values
+        _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+        ranks[row, present] = np.bincount(inverse, weights=ordinal)[inverse] / counts[inverse]
+    return ranks
+
+
+def rank_correlations(judge_index, team_index, totals, judge_count, team_count):
+    """
+    Spearman-style rank correlation between every pair of judges
+
+    Each judge's totals are ranked across the teams they scored; the
+    Pearson correlation of those ranks is then computed for all judge
+    pairs at once over the teams both scored (pairwise-complete), using
+    masked matrix products. When judges scored the same teams this is
+    exactly Spearman's rho.
+
+    Returns:
+        ndarray: judge_count x judge_count matrix, NaN where fewer than
+        three teams are shared or a judge gave every team the same score
+    """
+    matrix = np.full((judge_count, team_count), np.nan)
+    matrix[judge_index, team_index] = totals  # one vote per judge and team
+    ranks = _rank_rows(matrix)
+
+    mask = (~np.isnan(ranks)).astype(float)
+    x = np.nan_to_num(ranks)
+    n = mask @ mask.T
+    sum_x = x @ mask.T  # [i, j]: sum of judge i's ranks over teams shared with j
+    sum_xx = (x * x) @ mask.T
+    sum_xy = x @ x.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * sum_xy - sum_x * sum_x.T
+        variance = n * sum_xx - sum_x ** 2
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[n < 3] = np.nan
+    return correlation
+
+
+def confidence_intervals(means, stds, counts):
+    """95% t-based confidence interval half-widths for group means (NaN below two samples)"""
+    t = np.where(counts - 1 < len(_T_95), _T_95[np.minimum(counts - 1, len(_T_95) - 1)], 1.96)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return t * stds / np.sqrt(counts)
+
+
+def compute_vote_analytics(arrays=None):
+    """
+    Judge calibration statistics over all votes
+
+    Returns:
+        dict with
+            judges: {judge_id: count, mean, std, agreement (mean rank
+                correlation with the other judges)}
+            teams: {team_id: count, mean, ci_low, ci_high, normalized
+                (mean z-score of its votes)}
+            votes: {vote_id: z} - each vote's total standardized against
+                its judge's own mean and spread
+            correlation: {judge_ids, matrix}
+    """
+    if arrays is None:
+        arrays = load_vote_arrays()
+    totals = arrays['totals']
+    judge_ids, judge_index = np.unique(arrays['judge_ids'], return_inverse=True)
+    team_ids, team_index = np.unique(arrays['team_ids'], return_inverse=True)
+
+    judge_counts, judge_means, judge_stds = _group_stats(judge_index, totals, len(judge_ids))
+
+    # A judge with no spread (or a single vote) contributes z = 0
+    spread = judge_stds[judge_index]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(spread > 0, (totals - judge_means[judge_index]) / spread, 0.0)
+
+    team_counts, team_means, team_stds = _group_stats(team_index, totals, len(team_ids))
+    half_widths = confidence_intervals(team_means, team_stds, team_counts)
+    team_z = np.bincount(team_index, weights=z, minlength=len(team_ids)) / team_counts
+
+    correlation = rank_correlations(judge_index, team_index, totals, len(judge_ids), len(team_ids))
+    off_diagonal = correlation.copy()
+    np.fill_diagonal(off_diagonal, np.nan)
+    with np.errstate(invalid='ignore'):
+        has_pairs = ~np.all(np.isnan(off_diagonal), axis=1)
+        agreement = np.full(len(judge_ids), np.nan)
+        agreement[has_pairs] = np.nanmean(off_diagonal[has_pairs], axis=1)
+
+    def value(x):
+        return None if np.isnan(x) else float(x)
+
+    return {
+        'vote_count': int(totals.size),
+        'judges': {
+            int(judge_id): {
+                'count': int(judge_counts[i]),
+                'mean': value(judge_means[i]),
+                'std': value(judge_stds[i]),
+                'agreement': value(agreement[i])
+            } for i, judge_id in enumerate(judge_ids)
+        },
+        'teams': {
+            int(team_id): {
+                'count': int(team_counts[i]),
+                'mean': value(team_means[i]),
+                'ci_low': value(team_means[i] - half_widths[i]),
+                'ci_high': value(team_means[i] + half_widths[i]),
+                'normalized': value(team_z[i])
+            } for i, team_id in enumerate(team_ids)
+        },
+        'votes': dict(zip(arrays['vote_ids'].tolist(), z.tolist())),
+        'correlation': {
+            'judge_ids': judge_ids.tolist(),
+            'matrix': [[value(x) for x in row] for row in correlation]
+        }
+    }
+
+
+def get_vote_analytics():
+    """
+    Vote analytics, recomputed only when the votes have changed
+
+    The (count, max id) of the votes table is checked on each call; votes
+    are only ever added, so this detects any change in one cheap query.
+    """
+    key = tuple(db.session.query(func.count(Vote.id), func.max(Vote.id)).one())
+    if _cache['key'] != key:
+        analytics = compute_vote_analytics()
+        judges = analytics['judges']
+        for judge_id, username in db.session.query(User.id, User.username).filter(User.id.in_(judges)):
+            judges[judge_id]['username'] = username
+        with _cache_lock:
+            _cache['key'] = key
+            _cache['analytics'] = analytics
+    return _cache['analytics']
@@ -1,28 +1,56 @@
 import os
-import random
-import string
+import time
 import json
+import itertools
 from datetime import datetime, timedelta
 from functools import wraps
+from concurrent.futures import BrokenExecutor
 from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
 from models import (db, User, Team, Post, RegistrationCode, Reaction, Comment, 
-                    Mention, Vote, Announcement, PostMedia, Report, AuditLog, SiteSettings)
+                    Mention, Vote, Announcement, PostMedia, Report, AuditLog, SiteSettings,
+                    UploadSession, REACTION_TYPES)
 from forms import (LoginForm, RegistrationForm, PostForm, ProfilePictureForm,
                    CreateUserForm, CreateTeamForm, AssignTeamForm, GenerateCodesForm,
                    CommentForm, VoteForm, AnnouncementForm, ReportForm, ProfileUpdateForm,
                    TeamAvatarForm, BrandingForm, ModerationActionForm)
-from utils import (parse_mentions, highlight_mentions, sanitize_html, validate_url,
-                   get_site_settings, allowed_file, generate_unique_filename, 
-                   create_audit_log, format_time_ago)
-from decorators import rate_limit, audit_log, judge_required
+from utils import (parse_mentions, validate_url, encode_cursor, decode_cursor,
+                   get_site_settings, load_site_settings, get_active_announcements,
+                   invalidate_site_cache, invalidate_username, allowed_file, generate_unique_filename, 
+                   create_audit_log, format_time_ago, keyset_paginate, generate_registration_codes,
+                   render_comment, COMMENT_RENDER_VERSION)
+from decorators import rate_limit, audit_log, judge_required, init_rate_limit_storage
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
+from timeline import hydrate_posts, load_comment_previews
+from reactions import set_reaction, get_reaction_summary
+from user_index import username_index
+from audit import audit_writer
+from exports import (parse_date_range, filter_date_range, csv_response, audit_log_rows,
+                     archived_audit_log_rows, vote_rows, VOTE_ANALYTICS_HEADER)
+from audit_archive import archived_page, daily_action_counts
+from leaderboard import leaderboard
+from analytics import get_vote_analytics
+from judging import judge_overview, next_unvoted_team_id
+import media
+import derivatives
+from derivatives import derivative_name, parse_widths
+import upload_sessions
+from upload_sessions import UploadError
 
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'webm', 'mov'}
 MAX_IMAGES_PER_POST = 10
+MAX_POSTS_PER_PAGE = 50
+COMMENTS_PER_PAGE = 20
+COMMENT_PREVIEW_LIMIT = 3
+MAX_COMMENT_BATCH_POSTS = 50
+AUDIT_LOGS_PER_PAGE = 50
+CODES_PER_PAGE = 100
+RESULTS_TEAMS_PER_PAGE = 10
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -30,18 +58,51 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:/
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size for videos
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+# Threads per worker process that write a post's uploads in parallel (media.py)
+app.config['MEDIA_UPLOAD_WORKERS'] = int(os.environ.get('MEDIA_UPLOAD_WORKERS', 4))
+# Processes per worker that render resized image copies (derivatives.py)
+app.config['IMAGE_DERIVATIVE_WORKERS'] = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', 2))
+# Larger images are rejected as decompression bombs
+app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))
+# Resumable video uploads (upload_sessions.py) are sent in chunks of at most this size
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+app.config['MAX_VIDEO_UPLOAD_SIZE'] = int(os.environ.get('MAX_VIDEO_UPLOAD_SIZE', 1024 * 1024 * 1024))
+# Let the front proxy send uploaded files: '', 'x-accel-redirect' (nginx) or 'x-sendfile' (media.send_media)
+app.config['MEDIA_OFFLOAD'] = os.environ.get('MEDIA_OFFLOAD', '')
+# nginx internal location that maps to UPLOAD_FOLDER, for x-accel-redirect
+app.config['MEDIA_ACCEL_PREFIX'] = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-uploads')
+app.config['POSTS_PER_PAGE'] = int(os.environ.get('POSTS_PER_PAGE', 20))
+# Cache invalidation is per process; the TTL bounds staleness across workers
+app.config['SITE_CACHE_TTL'] = int(os.environ.get('SITE_CACHE_TTL', 60))
+# Leaderboard snapshot reload interval; votes from other workers appear within it
+app.config['LEADERBOARD_TTL'] = int(os.environ.get('LEADERBOARD_TTL', 30))
+# Audit entries are written in batches by a background thread (audit.py)
+app.config['AUDIT_ASYNC'] = os.environ.get('AUDIT_ASYNC', 'True').lower() == 'true'
+app.config['AUDIT_QUEUE_SIZE'] = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+app.config['AUDIT_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+app.config['AUDIT_OVERFLOW_POLICY'] = os.environ.get('AUDIT_OVERFLOW_POLICY', 'sync')
+# Rate-limit counters shared by all worker processes; empty keeps them per process
+app.config['RATE_LIMIT_DB'] = os.environ.get(
+    'RATE_LIMIT_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ratelimit.db'))
+# Older audit logs are moved to gzip files by audit_archive.py
+app.config['AUDIT_RETENTION_DAYS'] = int(os.environ.get('AUDIT_RETENTION_DAYS', 90))
+app.config['AUDIT_ARCHIVE_FOLDER'] = os.environ.get(
+    'AUDIT_ARCHIVE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive', 'audit_logs'))
 
 db.init_app(app)
+audit_writer.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
+init_rate_limit_storage(app.config['RATE_LIMIT_DB'])
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=f"sqlite:///{app.config['RATE_LIMIT_DB']}" if app.config['RATE_LIMIT_DB'] else "memory://"
 )
 
 
@@ -66,38 +127,61 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
 
-def save_upload(file, folder, allowed_extensions=None):
+def save_upload(file, folder, allowed_extensions=None, replaces=None):
     """
     Save uploaded file and return the filename
     
+    The file is validated and written to a staging file first, then moved
+    into content-addressed storage (see media.py). Its reference is counted
+    in the session, so the caller must commit.
+    
     Args:
         file: The file object to save
         folder: Subfolder within UPLOAD_FOLDER
         allowed_extensions: Set of allowed file extensions (defaults to ALLOWED_IMAGE_EXTENSIONS)
+        replaces: Filename this upload replaces, whose reference is released
     
     Returns:
         str: The filename if successful, None otherwise
     """
-    if not file or not file.filename:
-        return None
-    
     if allowed_extensions is None:
         allowed_extensions = ALLOWED_IMAGE_EXTENSIONS
     
-    if '.' not in file.filename:
-        return None
-    
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    if ext not in allowed_extensions:
-        return None
-    
-    filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{random.randint(1000, 9999)}.{ext}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], folder, filename)
+    return media.save_upload(file, folder, allowed_extensions, replaces=replaces)
+
+
+def timeline_query(feed):
+    """
+    Base query for one of the post feeds visible to the current user
     
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    Returns None if the feed does not exist or the user cannot see it
+    """
+    if feed == 'global':
+        return Post.query.filter_by(is_global=True, deleted_at=None)
+    if feed == 'team' and current_user.team_id:
+        return Post.query.filter_by(team_id=current_user.team_id, deleted_at=None)
+    if feed == 'profile':
+        return Post.query.filter_by(user_id=current_user.id, deleted_at=None)
+    return None
+
+
+def timeline_page_size():
+    """Page size for timelines, optionally overridden by a bounded ?limit="""
+    limit = request.args.get('limit', app.config['POSTS_PER_PAGE'], type=int)
+    return max(1, min(limit, MAX_POSTS_PER_PAGE))
+
+
+def paginate_timeline(feed, comment_limit=COMMENT_PREVIEW_LIMIT):
+    """
+    Return hydrated (posts, next_cursor) for the page of a feed selected by ?cursor=
     
-    file.save(filepath)
-    return filename
+    With comment_limit=0 the comment previews are left to the client
+    (prefetchCommentPreviews in comments.js).
+    """
+    posts, next_cursor = keyset_paginate(timeline_query(feed), Post,
+                                         cursor=request.args.get('cursor'),
+                                         limit=timeline_page_size())
+    return hydrate_posts(posts, current_user.id, comment_limit), next_cursor
 
 
 def time_ago(dt):
@@ -125,18 +209,39 @@ def time_ago(dt):
 app.jinja_env.filters['time_ago'] = time_ago
 
 
+def image_srcset(filename, widths, ext, folder='posts'):
+    """srcset listing an uploaded image's resized copies (see derivatives.py) in one format"""
+    return ', '.join(
+        f"{url_for('media_file', folder=folder, filename=derivative_name(filename, width, ext))} {width}w"
+        for width in parse_widths(widths)
+    )
+
+
+def image_derivative_url(filename, widths, ext='jpg', folder='posts'):
+    """URL of an uploaded image's largest resized copy, or of the original if it has none"""
+    widths = parse_widths(widths)
+    if not widths:
+        return url_for('media_file', folder=folder, filename=filename)
+    return url_for('media_file', folder=folder, filename=derivative_name(filename, widths[-1], ext))
+
+
+app.jinja_env.filters['srcset'] = image_srcset
+app.jinja_env.filters['derivative_url'] = image_derivative_url
+
+
+@app.route('/media/<folder>/<path:filename>')
+@limiter.exempt  # a timeline page loads dozens of files
+def media_file(folder, filename):
+    """Serve an uploaded file with caching headers and Range support (see media.send_media)"""
+    return media.send_media(folder, filename)
+
+
 @app.context_processor
 def inject_global_data():
     """Inject data into all templates"""
-    settings = get_site_settings()
-    
-    active_announcements = Announcement.query.filter(
-        (Announcement.expires_at == None) | (Announcement.expires_at > datetime.utcnow())
-    ).order_by(Announcement.is_pinned.desc(), Announcement.created_at.desc()).all()
-    
     return {
-        'site_settings': settings,
-        'active_announcements': active_announcements
+        'site_settings': get_site_settings(),
+        'active_announcements': get_active_announcements()
     }
 
 
@@ -218,6 +323,8 @@ def register():
         reg_code.used_by_user_id = user.id
         
         db.session.commit()
+        invalidate_username(user.username)
+        username_index.add_or_update(user)
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
@@ -279,6 +386,8 @@ def admin_users():
             user.team_id = form.team_id.data
         db.session.add(user)
         db.session.commit()
+        invalidate_username(user.username)
+        username_index.add_or_update(user)
         flash(f'User {user.username} created successfully!', 'success')
         return redirect(url_for('admin_users'))
     
@@ -303,6 +412,7 @@ def admin_assign_team():
         if user:
             user.team_id = form.team_id.data
             db.session.commit()
+            username_index.add_or_update(user)
             flash(f'User {user.username} assigned to team successfully!', 'success')
         else:
             flash('User not found.', 'error')
@@ -321,6 +431,7 @@ def admin_teams():
         team = Team(name=form.name.data)
         db.session.add(team)
         db.session.commit()
+        leaderboard.invalidate()
         flash(f'Team {team.name} created successfully!', 'success')
         return redirect(url_for('admin_teams'))
     
@@ -337,24 +448,35 @@ def admin_codes():
     
     if form.validate_on_submit():
         count = form.count.data
-        generated = []
-        for _ in range(count):
-            # Generate unique 6-digit code
-            while True:
-                code = ''.join(random.choices(string.digits, k=6))
-                if not RegistrationCode.query.filter_by(code=code).first():
-                    break
-            
-            reg_code = RegistrationCode(code=code)
-            db.session.add(reg_code)
-            generated.append(code)
-        
+        try:
+            generate_registration_codes(count)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('admin_codes'))
         db.session.commit()
         flash(f'Generated {count} registration codes successfully!', 'success')
         return redirect(url_for('admin_codes'))
     
-    codes = RegistrationCode.query.order_by(RegistrationCode.created_at.desc()).all()
-    return render_template('admin/codes.html', codes=codes, form=form)
+    status = request.args.get('status', '')
+    query = RegistrationCode.query.options(joinedload(RegistrationCode.user))
+    if status == 'used':
+        query = query.filter(RegistrationCode.is_used == True)
+    elif status == 'unused':
+        query = query.filter(RegistrationCode.is_used == False)
+    else:
+        status = ''
+    codes, next_cursor = keyset_paginate(query, RegistrationCode, cursor=request.args.get('cursor'),
+                                         limit=CODES_PER_PAGE)
+    
+    counts = dict(db.session.query(RegistrationCode.is_used, func.count(RegistrationCode.id))
+                  .group_by(RegistrationCode.is_used))
+    code_counts = {
+        'all': sum(counts.values()),
+        'used': counts.get(True, 0),
+        'unused': counts.get(False, 0)
+    }
+    return render_template('admin/codes.html', codes=codes, form=form, status=status,
+                           next_cursor=next_cursor, code_counts=code_counts)
 
 
 @app.route('/admin/codes/reset/<int:code_id>')
@@ -367,7 +489,7 @@ def admin_reset_code(code_id):
     code.used_by_user_id = None
     db.session.commit()
     flash(f'Registration code {code.code} has been reset.', 'success')
-    return redirect(url_for('admin_codes'))
+    return redirect(url_for('admin_codes', status=request.args.get('status') or None))
 
 
 # User routes
@@ -392,7 +514,7 @@ def profile():
         
         # Update profile picture
         if form.profile_picture.data:
-            filename = save_upload(form.profile_picture.data, 'profiles')
+            filename = save_upload(form.profile_picture.data, 'profiles', replaces=current_user.profile_picture)
             if filename:
                 current_user.profile_picture = filename
                 updated = True
@@ -413,13 +535,16 @@ def profile():
         
         if updated:
             db.session.commit()
+            username_index.add_or_update(current_user)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('profile'))
         else:
             flash('No changes made.', 'info')
     
-    posts = Post.query.filter_by(user_id=current_user.id, deleted_at=None).order_by(Post.created_at.desc()).all()
-    return render_template('user/profile.html', form=form, posts=posts)
+    posts, next_cursor = paginate_timeline('profile')
+    post_count = timeline_query('profile').count()
+    return render_template('user/profile.html', form=form, posts=posts,
+                           next_cursor=next_cursor, post_count=post_count)
 
 
 @app.route('/timeline/team')
@@ -430,16 +555,34 @@ def team_timeline():
         flash('You are not assigned to a team yet.', 'warning')
         return redirect(url_for('user_dashboard'))
     
-    posts = Post.query.filter_by(team_id=current_user.team_id, deleted_at=None).order_by(Post.created_at.desc()).all()
-    return render_template('user/team_timeline.html', posts=posts)
+    posts, next_cursor = paginate_timeline('team')
+    return render_template('user/team_timeline.html', posts=posts, next_cursor=next_cursor)
 
 
 @app.route('/timeline/global')
 @login_required
 def global_timeline():
     """Global timeline"""
-    posts = Post.query.filter_by(is_global=True, deleted_at=None).order_by(Post.created_at.desc()).all()
-    return render_template('user/global_timeline.html', posts=posts)
+    posts, next_cursor = paginate_timeline('global')
+    return render_template('user/global_timeline.html', posts=posts, next_cursor=next_cursor)
+
+
+@app.route('/api/timeline/<string:feed>')
+@login_required
+def timeline_feed(feed):
+    """Next page of a timeline as rendered post cards (load more / infinite scroll)"""
+    if timeline_query(feed) is None:
+        return jsonify({'success': False, 'message': 'Invalid timeline'}), 404
+    
+    # The appended cards fetch their comment previews in one batch call
+    posts, next_cursor = paginate_timeline(feed, comment_limit=0)
+    
+    return jsonify({
+        'success': True,
+        'html': render_template('components/post_list.html', posts=posts),
+        'count': len(posts),
+        'next_cursor': next_cursor
+    })
 
 
 @app.route('/post/create', methods=['GET', 'POST'])
@@ -454,53 +597,69 @@ def create_post():
     form = PostForm()
     
     if form.validate_on_submit():
-        # Create post
+        # Collect the uploads: up to MAX_IMAGES_PER_POST images, else a video, else the legacy image
+        claimed_video = None
+        if form.images.data:
+            images = [f for f in form.images.data if f and allowed_file(f.filename)]
+            if len(images) > MAX_IMAGES_PER_POST:
+                flash(f'Maximum {MAX_IMAGES_PER_POST} images allowed per post.', 'warning')
+                images = images[:MAX_IMAGES_PER_POST]
+            uploads = [(f, 'posts', ALLOWED_IMAGE_EXTENSIONS) for f in images]
+            media_type = 'image'
+        elif form.upload_id.data:
+            # A video sent through the resumable upload API is already stored
+            claimed_video = upload_sessions.claim_upload(form.upload_id.data, current_user.id)
+            if claimed_video is None:
+                flash('The uploaded video could not be found. Please upload it again.', 'error')
+                return render_template('user/create_post.html', form=form)
+            uploads = []
+            media_type = 'video'
+        elif form.video.data:
+            uploads = [(form.video.data, 'videos', ALLOWED_VIDEO_EXTENSIONS)]
+            media_type = 'video'
+        elif form.image.data:
+            uploads = [(form.image.data, 'posts', ALLOWED_IMAGE_EXTENSIONS)]
+            media_type = None
+        else:
+            uploads = []
+            media_type = None
+        
+        # Write the files in parallel and move them into place before opening
+        # a write transaction, so the database lock is never held during upload I/O
+        try:
+            staged = [upload for upload in media.stage_uploads(uploads) if upload]
+            if media_type != 'video':
+                # Resized copies are rendered from the staged files; undecodable images are dropped
+                staged = derivatives.render_staged(staged)
+            media.publish(staged)
+        except (OSError, BrokenExecutor) as e:
+            print(f"Media upload error: {e}")
+            flash('Failed to save the uploaded media. Please try again.', 'error')
+            return render_template('user/create_post.html', form=form)
+        
+        # Files published here but never committed are removed by the media garbage collector
         post = Post(
             user_id=current_user.id,
             team_id=current_user.team_id,
             description=form.description.data,
             is_global=form.is_global.data
         )
+        if media_type is None:
+            # Legacy single image support
+            if staged:
+                post.image_path = staged[0].filename
+                post.image_derivative_widths = staged[0].derivative_widths
+        else:
+            post.media = [
+                PostMedia(media_type=media_type, file_path=upload.filename,
+                          derivative_widths=upload.derivative_widths, display_order=order)
+                for order, upload in enumerate(staged)
+            ]
+            if claimed_video:
+                # The upload session's blob reference passes to the post
+                post.media.append(PostMedia(media_type='video', file_path=claimed_video, display_order=0))
         db.session.add(post)
-        db.session.flush()  # Get post ID
-        
-        # Handle multiple images (up to MAX_IMAGES_PER_POST)
-        if form.images.data:
-            image_count = 0
-            for image_file in form.images.data:
-                if image_count >= MAX_IMAGES_PER_POST:
-                    flash(f'Maximum {MAX_IMAGES_PER_POST} images allowed per post.', 'warning')
-                    break
-                
-                if image_file and allowed_file(image_file.filename):
-                    filename = save_upload(image_file, 'posts')
-                    if filename:
-                        media = PostMedia(
-                            post_id=post.id,
-                            media_type='image',
-                            file_path=filename,
-                            display_order=image_count
-                        )
-                        db.session.add(media)
-                        image_count += 1
-        
-        # Handle video upload (only if no images)
-        elif form.video.data:
-            filename = save_upload(form.video.data, 'videos', allowed_extensions=ALLOWED_VIDEO_EXTENSIONS)
-            if filename:
-                media = PostMedia(
-                    post_id=post.id,
-                    media_type='video',
-                    file_path=filename,
-                    display_order=0
-                )
-                db.session.add(media)
-        
-        # Legacy single image support
-        elif form.image.data:
-            image_filename = save_upload(form.image.data, 'posts')
-            post.image_path = image_filename
-        
+        media.add_references(staged)
         db.session.commit()
         
         create_audit_log(
@@ -522,54 +681,137 @@ def create_post():
 
 # API Routes for AJAX interactions
 
+def upload_error_response(error):
+    """JSON response for an UploadError, with the offset to resume from when known"""
+    body = {'success': False, 'message': str(error)}
+    if error.received is not None:
+        body['received'] = error.received
+    return jsonify(body), error.status
+
+
+def get_upload_session(upload_id):
+    """The current user's upload session, or None"""
+    return UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first()
+
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+@rate_limit(20, 60, 'video_uploads')
+def start_upload():
+    """
+    Start a resumable video upload
+    
+    Send {"filename": ..., "size": bytes, "sha256": optional hex digest};
+    then PUT the bytes to /api/uploads/<id>?offset=N in chunks of at most
+    chunk_size and POST /api/uploads/<id>/complete.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        session = upload_sessions.start_session(current_user.id, data.get('filename'), data.get('size'),
+                                                ALLOWED_VIDEO_EXTENSIONS, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    db.session.commit()
+    return jsonify({'success': True, 'upload': upload_sessions.session_state(session)}), 201
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Upload progress; a client resumes by sending the next chunk at 'received'"""
+    session = get_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    return jsonify({'success': True, 'upload': upload_sessions.session_state(session)})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@limiter.exempt  # one request per chunk; start_upload is rate limited instead
+@login_required
+def upload_chunk(upload_id):
+    """
+    Store one chunk of a resumable upload
+    
+    The raw request body is written at ?offset=N, which must equal the
+    bytes received so far (409 with 'received' otherwise). An optional
+    X-Chunk-SHA256 header is checked against the chunk.
+    """
+    session = get_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': 'offset is required'}), 400
+    if (request.content_length or 0) > app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'success': False, 'message': 'Chunk too large',
+                        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']}), 413
+    
+    try:
+        # request.stream reads the body as it arrives instead of buffering it
+        received = upload_sessions.write_chunk(session, offset, request.stream,
+                                               request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    # The session may have expired while the chunk streamed
+    touched = upload_sessions.touch_session(upload_id)
+    db.session.commit()
+    if not touched:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    return jsonify({'success': True, 'received': received})
+
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """
+    Finish a resumable upload once every byte has arrived
+    
+    Send {"sha256": hex digest of the whole file} to have it verified. The
+    returned id goes in the upload_id field of the create post form.
+    """
+    session = get_upload_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'message': 'Upload not found'}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        upload_sessions.finalize(session, data.get('sha256'))
+    except UploadError as e:
+        db.session.rollback()
+        return upload_error_response(e)
+    except OSError as e:
+        db.session.rollback()
+        print(f"Upload finalize error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to store the video. Please try again.'}), 500
+    db.session.commit()
+    return jsonify({'success': True, 'upload': upload_sessions.session_state(session)})
+
+
 @app.route('/api/reaction/<int:post_id>', methods=['POST'])
 @login_required
 @rate_limit(100, 60, 'reactions')
 def toggle_reaction(post_id):
-    """Toggle reaction on a post"""
+    """
+    Toggle reaction on a post
+    
+    Send {"reaction_type": ..., "active": true|false} to set the state
+    explicitly instead, which makes retries idempotent.
+    """
     post = Post.query.get_or_404(post_id)
     data = request.get_json()
     reaction_type = data.get('reaction_type')
+    active = data.get('active')
     
-    if not reaction_type or reaction_type not in ['like', 'love', 'celebrate', 'idea', 'fire', 'applause']:
+    if not reaction_type or reaction_type not in REACTION_TYPES:
         return jsonify({'success': False, 'message': 'Invalid reaction type'}), 400
     
-    # Check if reaction exists
-    existing_reaction = Reaction.query.filter_by(
-        post_id=post_id,
-        user_id=current_user.id,
-        reaction_type=reaction_type
-    ).first()
+    if active is not None and not isinstance(active, bool):
+        return jsonify({'success': False, 'message': 'active must be true or false'}), 400
     
-    if existing_reaction:
-        # Remove reaction
-        db.session.delete(existing_reaction)
-        db.session.commit()
-        action = 'removed'
-    else:
-        # Add reaction
-        reaction = Reaction(
-            post_id=post_id,
-            user_id=current_user.id,
-            reaction_type=reaction_type
-        )
-        db.session.add(reaction)
-        db.session.commit()
-        action = 'added'
+    action = set_reaction(post_id, current_user.id, reaction_type, active)
     
     # Get updated reaction counts
-    reactions_data = {}
-    for rtype in ['like', 'love', 'celebrate', 'idea', 'fire', 'applause']:
-        count = Reaction.query.filter_by(post_id=post_id, reaction_type=rtype).count()
-        user_reacted = Reaction.query.filter_by(
-            post_id=post_id,
-            user_id=current_user.id,
-            reaction_type=rtype
-        ).first() is not None
-        reactions_data[rtype] = {
-            'count': count,
-            'user_reacted': user_reacted
-        }
+    reactions_data = get_reaction_summary(post_id, current_user.id)
     
     return jsonify({
         'success': True,
@@ -593,14 +835,13 @@ def add_comment(post_id):
     if len(content) > 1000:
         return jsonify({'success': False, 'message': 'Comment too long (max 1000 characters)'}), 400
     
-    # Sanitize content before storing
-    content_sanitized = sanitize_html(content)
-    
-    # Create comment with sanitized content
+    # Store the raw text plus HTML rendered once, so reads never re-render
     comment = Comment(
         post_id=post_id,
         user_id=current_user.id,
-        content=content_sanitized  # Store sanitized content
+        content=content,
+        content_html=render_comment(content),
+        content_html_version=COMMENT_RENDER_VERSION
     )
     db.session.add(comment)
     db.session.flush()
@@ -612,21 +853,11 @@ def add_comment(post_id):
     
     db.session.commit()
     
-    # Return comment data
-    comment_data = {
-        'id': comment.id,
-        'content': content_sanitized,
-        'content_html': highlight_mentions(content_sanitized),
-        'time_ago': format_time_ago(comment.created_at),
-        'user': {
-            'id': current_user.id,
-            'username': current_user.username,
-            'profile_picture': f'/static/uploads/profiles/{current_user.profile_picture}' if current_user.profile_picture else None
-        },
-        'can_delete': True  # Current user can delete their own comment
-    }
+    for mention in mentions:
+        username_index.note_interaction(current_user.id, mention.mentioned_user_id)
+        username_index.note_interaction(mention.mentioned_user_id, current_user.id)
     
-    return jsonify({'success': True, 'comment': comment_data})
+    return jsonify({'success': True, 'comment': comment_to_dict(comment)})
 
 
 @app.route('/api/comment/<int:comment_id>', methods=['DELETE'])
@@ -646,50 +877,102 @@ def delete_comment(comment_id):
     return jsonify({'success': True})
 
 
+def comment_to_dict(comment):
+    """Serialize a comment (with its user already loaded) for the comments API"""
+    return {
+        'id': comment.id,
+        'content': comment.content,
+        'content_html': comment.content_html,
+        'time_ago': format_time_ago(comment.created_at),
+        'user': {
+            'id': comment.user.id,
+            'username': comment.user.username,
+            'profile_picture': url_for('media_file', folder='profiles', filename=comment.user.profile_picture) if comment.user.profile_picture else None
+        },
+        'can_delete': comment.user_id == current_user.id or current_user.is_admin
+    }
+
+
 @app.route('/api/comments/<int:post_id>')
 @login_required
 def get_comments(post_id):
-    """Get comments for a post"""
+    """Get a page of comments for a post, oldest first (?cursor= for the next page)"""
     post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post_id, deleted=False).order_by(Comment.created_at).all()
-    
-    comments_data = []
-    for comment in comments:
-        content_sanitized = sanitize_html(comment.content)
-        comments_data.append({
-            'id': comment.id,
-            'content': comment.content,
-            'content_html': highlight_mentions(content_sanitized),
-            'time_ago': format_time_ago(comment.created_at),
-            'user': {
-                'id': comment.user.id,
-                'username': comment.user.username,
-                'profile_picture': f'/static/uploads/profiles/{comment.user.profile_picture}' if comment.user.profile_picture else None
-            },
-            'can_delete': comment.user_id == current_user.id or current_user.is_admin
-        })
-    
-    return jsonify({'success': True, 'comments': comments_data})
+    limit = max(1, min(request.args.get('limit', COMMENTS_PER_PAGE, type=int), COMMENTS_PER_PAGE))
+    
+    query = Comment.query.options(joinedload(Comment.user)).filter_by(post_id=post_id, deleted=False)
+    comments, next_cursor = keyset_paginate(query, Comment, cursor=request.args.get('cursor'),
+                                            limit=limit, descending=False)
+    
+    return jsonify({
+        'success': True,
+        'comments': [comment_to_dict(comment) for comment in comments],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/comments/batch')
+@login_required
+def get_comments_batch():
+    """
+    Get the first comments and total comment count of several posts in one call
+    
+    Posts the user cannot see are omitted from the response.
+    
+    Query args:
+        post_ids: Comma-separated post IDs (at most MAX_COMMENT_BATCH_POSTS)
+        limit: Comments per post (default COMMENT_PREVIEW_LIMIT)
+    """
+    try:
+        post_ids = [int(pid) for pid in request.args.get('post_ids', '').split(',') if pid]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid post IDs'}), 400
+    
+    if len(post_ids) > MAX_COMMENT_BATCH_POSTS:
+        return jsonify({'success': False, 'message': f'At most {MAX_COMMENT_BATCH_POSTS} posts per request'}), 400
+    
+    limit = max(1, min(request.args.get('limit', COMMENT_PREVIEW_LIMIT, type=int), COMMENTS_PER_PAGE))
+    
+    # Unknown, removed and hidden posts, and other teams' posts, are left out
+    visible = Post.query.filter(Post.id.in_(post_ids), Post.deleted_at.is_(None))
+    if not current_user.is_admin:
+        visible = visible.filter(Post.is_hidden == False, or_(
+            Post.is_global == True, Post.team_id == current_user.team_id, Post.user_id == current_user.id))
+    post_ids = [post_id for (post_id,) in visible.with_entities(Post.id)]
+    
+    posts_data = {}
+    for post_id, (comments, total) in load_comment_previews(post_ids, limit).items():
+        next_cursor = None
+        if total > len(comments):
+            next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+        posts_data[post_id] = {
+            'comments': [comment_to_dict(comment) for comment in comments],
+            'total': total,
+            'next_cursor': next_cursor
+        }
+    
+    return jsonify({'success': True, 'posts': posts_data})
 
 
 @app.route('/api/users/search')
 @login_required
 def search_users():
-    """Search users for mentions"""
+    """Search users for mentions by username prefix, team-mates and recent contacts first"""
+    started = time.perf_counter()
     query = request.args.get('q', '').strip()
     
-    if len(query) < 1:
-        users = User.query.limit(10).all()
-    else:
-        users = User.query.filter(User.username.ilike(f'%{query}%')).limit(10).all()
+    users = username_index.search(query, searcher=current_user, limit=10)
     
     users_data = [{
-        'id': user.id,
-        'username': user.username,
-        'profile_picture': f'/static/uploads/profiles/{user.profile_picture}' if user.profile_picture else None
+        'id': user['id'],
+        'username': user['username'],
+        'profile_picture': url_for('media_file', folder='profiles', filename=user['profile_picture']) if user['profile_picture'] else None
     } for user in users]
     
-    return jsonify({'success': True, 'users': users_data})
+    took_ms = (time.perf_counter() - started) * 1000
+    response = jsonify({'success': True, 'users': users_data, 'took_ms': round(took_ms, 3)})
+    response.headers['Server-Timing'] = f'search;dur={took_ms:.3f}'
+    return response
 
 
 @app.route('/api/theme', methods=['POST'])
@@ -752,6 +1035,7 @@ def admin_announcements():
         )
         db.session.add(announcement)
         db.session.commit()
+        invalidate_site_cache()
         
         create_audit_log(
             user_id=current_user.id,
@@ -771,9 +1055,7 @@ def admin_announcements():
 @login_required
 def view_announcements():
     """View all announcements"""
-    announcements = Announcement.query.filter(
-        (Announcement.expires_at == None) | (Announcement.expires_at > datetime.utcnow())
-    ).order_by(Announcement.is_pinned.desc(), Announcement.created_at.desc()).all()
+    announcements = get_active_announcements()
     return render_template('user/announcements.html', announcements=announcements)
 
 
@@ -783,22 +1065,22 @@ def view_announcements():
 @judge_required
 def judge_teams():
     """Judge dashboard - view all teams"""
-    teams = Team.query.all()
+    teams_data = judge_overview(current_user.id)
+    voted_count = sum(1 for data in teams_data if data['voted'])
     
-    # Get voting status for each team
-    teams_data = []
-    for team in teams:
-        existing_vote = Vote.query.filter_by(
-            judge_id=current_user.id,
-            team_id=team.id
-        ).first()
-        teams_data.append({
-            'team': team,
-            'voted': existing_vote is not None,
-            'vote': existing_vote
-        })
-    
-    return render_template('judge/teams.html', teams_data=teams_data)
+    return render_template('judge/teams.html', teams_data=teams_data, voted_count=voted_count)
+
+
+@app.route('/judge/next')
+@login_required
+@judge_required
+def judge_next():
+    """Jump to the next team (after ?after=<team_id>) this judge hasn't voted on"""
+    team_id = next_unvoted_team_id(current_user.id, request.args.get('after', 0, type=int))
+    if team_id is None:
+        flash('You have voted for every team.', 'success')
+        return redirect(url_for('judge_teams'))
+    return redirect(url_for('judge_vote', team_id=team_id))
 
 
 @app.route('/judge/vote/<int:team_id>', methods=['GET', 'POST'])
@@ -832,6 +1114,7 @@ def judge_vote(team_id):
         )
         db.session.add(vote)
         db.session.commit()
+        leaderboard.record_vote(vote)
         
         create_audit_log(
             user_id=current_user.id,
@@ -845,6 +1128,7 @@ def judge_vote(team_id):
     
     # Get team posts for reference
     posts = Post.query.filter_by(team_id=team_id, deleted_at=None).order_by(Post.created_at.desc()).all()
+    hydrate_posts(posts, current_user.id, COMMENT_PREVIEW_LIMIT)
     
     return render_template('judge/vote.html', team=team, form=form, existing_vote=existing_vote, posts=posts)
 
@@ -853,66 +1137,69 @@ def judge_vote(team_id):
 @login_required
 @admin_required
 def admin_results():
-    """View voting results"""
-    teams = Team.query.all()
+    """
+    View voting results
     
-    results = []
-    for team in teams:
-        votes = Vote.query.filter_by(team_id=team.id).all()
-        if votes:
-            total_score = sum(vote.calculate_total_score() for vote in votes) / len(votes)
-        else:
-            total_score = 0
-        
-        results.append({
-            'team': team,
-            'votes': votes,
-            'average_score': total_score,
-            'vote_count': len(votes)
-        })
+    The whole ranking comes from the in-memory leaderboard; per-vote
+    details are loaded for one page of teams (?page=), restricted to the
+    votes that ranking counts so both parts of the page agree.
+    """
+    ranking, counted = leaderboard.snapshot()
+    pages = max(1, -(-len(ranking) // RESULTS_TEAMS_PER_PAGE))
+    page = max(1, min(request.args.get('page', 1, type=int), pages))
+    shown = ranking[(page - 1) * RESULTS_TEAMS_PER_PAGE:page * RESULTS_TEAMS_PER_PAGE]
+    
+    votes_by_team = {}
+    if shown:
+        for vote in (Vote.query.options(joinedload(Vote.judge))
+                     .filter(Vote.team_id.in_([entry['team_id'] for entry in shown]), counted)
+                     .order_by(Vote.id)):
+            votes_by_team.setdefault(vote.team_id, []).append(vote)
+    
+    analytics = get_vote_analytics()
     
-    # Sort by average score
-    results.sort(key=lambda x: x['average_score'], reverse=True)
+    # Already sorted by average score
+    results = [dict(entry, stats=analytics['teams'].get(entry['team_id'])) for entry in ranking]
+    details = [dict(entry, votes=votes_by_team.get(entry['team_id'], [])) for entry in shown]
     
-    return render_template('admin/results.html', results=results)
+    judges = sorted(analytics['judges'].values(), key=lambda judge: judge.get('username', ''))
+    
+    return render_template('admin/results.html', results=results, details=details, judges=judges,
+                           vote_z=analytics['votes'], page=page, pages=pages)
+
+
+@app.route('/admin/results/analytics')
+@login_required
+@admin_required
+def admin_results_analytics():
+    """Judge calibration statistics, including the judge rank-correlation matrix"""
+    analytics = get_vote_analytics()
+    return jsonify({
+        'success': True,
+        'vote_count': analytics['vote_count'],
+        'judges': analytics['judges'],
+        'teams': analytics['teams'],
+        'correlation': analytics['correlation']
+    })
 
 
 @app.route('/admin/results/export')
 @login_required
 @admin_required
 def admin_results_export():
-    """Export results as CSV"""
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    teams = Team.query.all()
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Team', 'Judge', 'Innovation', 'Implementation', 'Design', 'Presentation', 'Total Score', 'Comments'])
-    
-    for team in teams:
-        votes = Vote.query.filter_by(team_id=team.id).all()
-        for vote in votes:
-            writer.writerow([
-                team.name,
-                vote.judge.username,
-                vote.innovation_score,
-                vote.implementation_score,
-                vote.design_score,
-                vote.presentation_score,
-                vote.calculate_total_score(),
-                vote.comments or ''
-            ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = f'attachment; filename=voting_results_{datetime.utcnow().strftime("%Y%m%d")}.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
+    """Export results as CSV, streamed; supports start/end dates and gzip=1"""
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError:
+        abort(400)
+    
+    return csv_response(
+        f'voting_results_{datetime.utcnow().strftime("%Y%m%d")}.csv',
+        ['Team', 'Judge', 'Innovation', 'Implementation', 'Design', 'Presentation', 'Total Score', 'Comments']
+        + VOTE_ANALYTICS_HEADER,
+        vote_rows(start, end, analytics=get_vote_analytics()),
+        gzip=request.args.get('gzip', type=int) == 1
+    )
 
 
 # Content moderation routes
@@ -1033,12 +1320,31 @@ def admin_moderation_action(report_id):
 @login_required
 @admin_required
 def admin_audit_logs():
-    """View audit logs"""
-    page = request.args.get('page', 1, type=int)
+    """View audit logs, newest first, with keyset navigation in both directions"""
     action_type = request.args.get('action_type', '')
     user_id = request.args.get('user_id', type=int)
-    
-    query = AuditLog.query
+    cursor = request.args.get('cursor')  # show entries older than this
+    before = request.args.get('before')  # show entries newer than this
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError:
+        flash('Invalid date range.', 'error')
+        start = end = None
+    
+    # Filters carried over by the navigation links
+    filters = {key: request.args.get(key) for key in ('action_type', 'user_id', 'start', 'end', 'archived')
+               if request.args.get(key)}
+    
+    if request.args.get('archived', type=int) == 1:
+        # Archived ranges are read from the gzip partitions, older direction only
+        logs, older_cursor = archived_page(AUDIT_LOGS_PER_PAGE, start=start, end=end, action_type=action_type,
+                                           user_id=user_id, cursor=cursor)
+        return render_template('admin/audit_logs.html', logs=logs,
+                               action_types=audit_writer.action_types(),
+                               older_cursor=older_cursor, newer_cursor=None,
+                               filters=filters)
+    
+    query = AuditLog.query.options(joinedload(AuditLog.user))
     
     if action_type:
         query = query.filter_by(action_type=action_type)
@@ -1046,47 +1352,66 @@ def admin_audit_logs():
     if user_id:
         query = query.filter_by(user_id=user_id)
     
-    logs = query.order_by(AuditLog.created_at.desc()).paginate(page=page, per_page=50, error_out=False)
+    query = filter_date_range(query, AuditLog.created_at, start, end)
     
-    # Get unique action types for filter
-    action_types = db.session.query(AuditLog.action_type).distinct().all()
-    action_types = [at[0] for at in action_types]
+    if decode_cursor(before):
+        logs, newer_cursor = keyset_paginate(query, AuditLog, cursor=before,
+                                             limit=AUDIT_LOGS_PER_PAGE, descending=False)
+        logs.reverse()
+        older_cursor = encode_cursor(logs[-1].created_at, logs[-1].id) if logs else None
+    else:
+        logs, older_cursor = keyset_paginate(query, AuditLog, cursor=cursor, limit=AUDIT_LOGS_PER_PAGE)
+        newer_cursor = encode_cursor(logs[0].created_at, logs[0].id) if cursor and logs else None
     
-    return render_template('admin/audit_logs.html', logs=logs, action_types=action_types)
+    return render_template('admin/audit_logs.html', logs=logs,
+                           action_types=audit_writer.action_types(),
+                           older_cursor=older_cursor, newer_cursor=newer_cursor,
+                           filters=filters)
+
+
+@app.route('/admin/audit-logs/rollup')
+@login_required
+@admin_required
+def admin_audit_logs_rollup():
+    """Per-day, per-action audit log counts, including archived days"""
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date range'}), 400
+    
+    counts = [{'day': day, 'action_type': action_type, 'count': count}
+              for day, action_type, count in daily_action_counts(start, end)]
+    return jsonify({'success': True, 'counts': counts})
+
+
+@app.route('/admin/audit-logs/stats')
+@login_required
+@admin_required
+def admin_audit_logs_stats():
+    """Audit writer metrics: queue depth, batches written, dropped entries"""
+    return jsonify({'success': True, 'stats': audit_writer.stats()})
 
 
 @app.route('/admin/audit-logs/export')
 @login_required
 @admin_required
 def admin_audit_logs_export():
-    """Export audit logs as CSV"""
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    logs = AuditLog.query.order_by(AuditLog.created_at.desc()).all()
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Timestamp', 'User', 'Action Type', 'Details', 'IP Address'])
-    
-    for log in logs:
-        username = log.user.username if log.user else 'System'
-        writer.writerow([
-            log.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            username,
-            log.action_type,
-            log.action_details or '',
-            log.ip_address or ''
-        ])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = f'attachment; filename=audit_logs_{datetime.utcnow().strftime("%Y%m%d")}.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
+    """Export audit logs as CSV, streamed; supports start/end dates, archived=1 and gzip=1"""
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError:
+        abort(400)
+    
+    rows = audit_log_rows(start, end)
+    if request.args.get('archived', type=int) == 1:
+        rows = itertools.chain(rows, archived_audit_log_rows(start, end))
+    
+    return csv_response(
+        f'audit_logs_{datetime.utcnow().strftime("%Y%m%d")}.csv',
+        ['Timestamp', 'User', 'Action Type', 'Details', 'IP Address'],
+        rows,
+        gzip=request.args.get('gzip', type=int) == 1
+    )
 
 
 # Team avatar routes
@@ -1099,7 +1424,7 @@ def admin_team_avatar(team_id):
     form = TeamAvatarForm()
     
     if form.validate_on_submit():
-        filename = save_upload(form.avatar.data, 'team_avatars')
+        filename = save_upload(form.avatar.data, 'team_avatars', replaces=team.avatar_path)
         if filename:
             team.avatar_path = filename
             db.session.commit()
@@ -1117,7 +1442,7 @@ def admin_team_avatar(team_id):
 @admin_required
 def admin_settings():
     """Site branding settings"""
-    settings = get_site_settings()
+    settings = load_site_settings()
     form = BrandingForm(obj=settings)
     
     if form.validate_on_submit():
@@ -1130,17 +1455,18 @@ def admin_settings():
         
         # Handle logo upload
         if form.logo.data:
-            filename = save_upload(form.logo.data, 'branding')
+            filename = save_upload(form.logo.data, 'branding', replaces=settings.logo_path)
             if filename:
                 settings.logo_path = filename
         
         # Handle favicon upload
         if form.favicon.data:
-            filename = save_upload(form.favicon.data, 'branding')
+            filename = save_upload(form.favicon.data, 'branding', replaces=settings.favicon_path)
             if filename:
                 settings.favicon_path = filename
         
         db.session.commit()
+        invalidate_site_cache()
         
         create_audit_log(
             user_id=current_user.id,
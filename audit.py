@@ -0,0 +1,235 @@
+"""Asynchronous, batched audit log writer"""
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from models import db, AuditLog
+
+# What to do with an entry when the queue is full:
+#   'sync' - write it synchronously from the request thread (nothing is lost)
+#   'drop' - discard it and count it in the dropped metric
+OVERFLOW_POLICIES = ('sync', 'drop')
+
+# Reload interval of the known action types; types first written by another
+# worker process show up in this one's filter list after at most this long
+ACTION_TYPES_TTL = 300  # seconds
+
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Bounded in-process queue of audit rows drained by a background thread
+
+    Requests only enqueue a plain dict; the flusher thread writes queued
+    rows with one multi-row INSERT per batch on its own connection, so an
+    audit entry never commits (or waits on) the request's session. The
+    queue is flushed on interpreter shutdown.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.queue = None
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.overflow_policy = 'sync'
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._action_types = set()
+        self._action_types_loaded_at = None
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'dropped': 0,
+            'overflow_sync_writes': 0,
+            'failed': 0,
+            'max_queue_depth': 0
+        }
+
+    def init_app(self, app):
+        """Configure the writer from app.config and register the shutdown flush"""
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ASYNC', True)
+        self.queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.overflow_policy = app.config.get('AUDIT_OVERFLOW_POLICY', 'sync')
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'AUDIT_OVERFLOW_POLICY must be one of {OVERFLOW_POLICIES}')
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        """
+        Start the flusher thread in this process if it is not running
+
+        Started lazily rather than in init_app so that pre-forking servers
+        get a flusher in each worker, not just in the parent process.
+        """
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Entries inherited across a fork belong to the parent
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _count(self, metric, amount=1):
+        with self._lock:
+            self._metrics[metric] += amount
+
+    def submit(self, user_id, action_type, action_details, ip_address=None):
+        """Queue an audit entry; created_at is stamped now, not when it is written"""
+        row = {
+            'user_id': user_id,
+            'action_type': action_type,
+            'action_details': json.dumps(action_details) if isinstance(action_details, dict) else action_details,
+            'ip_address': ip_address,
+            'created_at': datetime.utcnow()
+        }
+        if action_type not in self._action_types:
+            with self._lock:
+                self._action_types.add(action_type)
+
+        if not self.enabled or self.app is None:
+            self._write([row])
+            return
+
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow_policy == 'drop':
+                self._count('dropped')
+            else:
+                self._write([row])
+                self._count('overflow_sync_writes')
+            return
+
+        depth = self.queue.qsize()
+        with self._lock:
+            self._metrics['enqueued'] += 1
+            if depth > self._metrics['max_queue_depth']:
+                self._metrics['max_queue_depth'] = depth
+
+    def _write(self, rows):
+        """Insert rows in a single multi-row INSERT on a dedicated connection"""
+        with db.engine.begin() as connection:
+            connection.execute(AuditLog.__table__.insert(), rows)
+
+    def _drain(self, first=None):
+        """Collect up to batch_size queued rows without blocking"""
+        rows = [] if first is None else [first]
+        stop = False
+        while len(rows) < self.batch_size:
+            try:
+                row = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is _STOP:
+                stop = True
+                break
+            rows.append(row)
+        return rows, stop
+
+    def _flush(self, rows):
+        """Write a drained batch and mark its queue items done"""
+        if not rows:
+            return
+        try:
+            with self.app.app_context():
+                self._write(rows)
+        except Exception as e:
+            # Don't let a bad batch kill the writer
+            print(f"Audit log error: {e}")
+            self._count('failed', len(rows))
+        else:
+            with self._lock:
+                self._metrics['written'] += len(rows)
+                self._metrics['batches'] += 1
+        finally:
+            for _ in rows:
+                self.queue.task_done()
+
+    def _run(self):
+        """Flusher loop: block for the first row, then write whatever else is queued"""
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is _STOP:
+                self.queue.task_done()
+                return
+            rows, stop = self._drain(first)
+            self._flush(rows)
+            if stop:
+                self.queue.task_done()
+                return
+
+    def flush(self, timeout=5.0):
+        """Write everything queued so far; returns False if the flusher could not keep up"""
+        if self.queue is None:
+            return True
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            # No flusher in this process: drain synchronously
+            while True:
+                rows, _ = self._drain()
+                if not rows:
+                    return True
+                self._flush(rows)
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.queue.unfinished_tasks
+
+    def shutdown(self, timeout=5.0):
+        """Stop the flusher after it has written every queued row"""
+        if self.queue is None:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+        # Anything left (flusher never started, or timed out) is written here
+        while True:
+            rows, _ = self._drain()
+            if not rows:
+                break
+            self._flush(rows)
+
+    def action_types(self):
+        """
+        Sorted set of action types present in the log
+
+        Seeded from the action_type index and then kept up to date by
+        submit(), instead of a SELECT DISTINCT on every viewer request.
+        """
+        loaded_at = self._action_types_loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > ACTION_TYPES_TTL:
+            stored = {row[0] for row in db.session.query(AuditLog.action_type).distinct()}
+            with self._lock:
+                self._action_types |= stored
+                self._action_types_loaded_at = time.monotonic()
+        return sorted(self._action_types)
+
+    def stats(self):
+        """Current counters plus the live queue depth"""
+        with self._lock:
+            stats = dict(self._metrics)
+        stats['queue_depth'] = self.queue.qsize() if self.queue is not None else 0
+        stats['queue_capacity'] = self.queue.maxsize if self.queue is not None else 0
+        stats['overflow_policy'] = self.overflow_policy
+        stats['async'] = self.enabled
+        return stats
+
+
+audit_writer = AuditWriter()
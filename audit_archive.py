@@ -0,0 +1,255 @@
+"""Audit log retention: archive old rows to gzip NDJSON and keep daily rollups"""
+import os
+import sys
+import glob
+import gzip
+import json
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import func
+from models import db, AuditLog, AuditLogRollup, User
+from utils import decode_cursor, encode_cursor
+
+PARTITION_PREFIX = 'audit_logs_'
+PARTITION_SUFFIX = '.ndjson.gz'
+
+
+def partition_path(day):
+    """Archive file for one UTC day: <AUDIT_ARCHIVE_FOLDER>/YYYY/MM/audit_logs_YYYY-MM-DD.ndjson.gz"""
+    return os.path.join(current_app.config['AUDIT_ARCHIVE_FOLDER'], f'{day:%Y}', f'{day:%m}',
+                        f'{PARTITION_PREFIX}{day:%Y-%m-%d}{PARTITION_SUFFIX}')
+
+
+def archived_days(start=None, end=None):
+    """Days that have an archive partition, newest first, optionally limited to start <= day < end"""
+    pattern = os.path.join(current_app.config['AUDIT_ARCHIVE_FOLDER'], '*', '*',
+                           f'{PARTITION_PREFIX}*{PARTITION_SUFFIX}')
+    days = []
+    for path in glob.glob(pattern):
+        name = os.path.basename(path)[len(PARTITION_PREFIX):-len(PARTITION_SUFFIX)]
+        try:
+            day = datetime.strptime(name, '%Y-%m-%d')
+        except ValueError:
+            continue
+        if (start and day + timedelta(days=1) <= start) or (end and day >= end):
+            continue
+        days.append(day.date())
+    return sorted(days, reverse=True)
+
+
+def _read_partition(day):
+    """Yield the raw records stored for one day"""
+    with gzip.open(partition_path(day), 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_partition(day, rows):
+    """
+    Write a day's rows to its archive partition, merging an existing one
+
+    Rows already in the partition (same id) are not duplicated, so a run
+    interrupted between writing the file and deleting the rows can simply
+    be repeated. The file is written to a temporary path and moved into
+    place, so readers never see a partial partition.
+
+    Returns:
+        tuple: (rows written from `rows`, highest id among them)
+    """
+    path = partition_path(day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    written, max_id, seen = 0, 0, set()
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            record = {
+                'id': row.id,
+                'created_at': row.created_at.isoformat(),
+                'user_id': row.user_id,
+                'username': row.username,
+                'action_type': row.action_type,
+                'action_details': row.action_details,
+                'ip_address': row.ip_address
+            }
+            f.write(json.dumps(record) + '\n')
+            seen.add(row.id)
+            written += 1
+            max_id = max(max_id, row.id)
+        if os.path.exists(path):
+            for record in _read_partition(day):
+                if record['id'] not in seen:
+                    f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return written, max_id
+
+
+def archive_day(day, batch_size=5000):
+    """
+    Move one day's audit log rows to its archive partition
+
+    The rollup counts and the delete commit together, after the partition
+    file is safely on disk.
+
+    Returns:
+        int: Number of rows archived
+    """
+    day_start = datetime.combine(day, time())
+    day_end = day_start + timedelta(days=1)
+    in_day = (AuditLog.created_at >= day_start, AuditLog.created_at < day_end)
+
+    rows = (db.session.query(AuditLog.id, AuditLog.created_at, AuditLog.user_id, User.username,
+                             AuditLog.action_type, AuditLog.action_details, AuditLog.ip_address)
+            .outerjoin(User, AuditLog.user_id == User.id)
+            .filter(*in_day)
+            .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+            .yield_per(batch_size))
+    written, max_id = _write_partition(day, rows)
+    if not written:
+        return 0
+
+    # Only rows that made it into the file (rows added meanwhile have higher ids)
+    archived = (*in_day, AuditLog.id <= max_id)
+    counts = (db.session.query(AuditLog.action_type, func.count(AuditLog.id))
+              .filter(*archived)
+              .group_by(AuditLog.action_type)
+              .all())
+    for action_type, count in counts:
+        rollup = db.session.get(AuditLogRollup, (day, action_type))
+        if rollup:
+            rollup.count += count
+        else:
+            db.session.add(AuditLogRollup(day=day, action_type=action_type, count=count))
+    AuditLog.query.filter(*archived).delete(synchronize_session=False)
+    db.session.commit()
+    return written
+
+
+def archive_audit_logs(retention_days=None):
+    """
+    Archive every whole UTC day older than the retention period
+
+    Args:
+        retention_days: Days of audit logs to keep in the database
+            (default AUDIT_RETENTION_DAYS)
+
+    Returns:
+        tuple: (days archived, rows archived)
+    """
+    if retention_days is None:
+        retention_days = current_app.config['AUDIT_RETENTION_DAYS']
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), time())
+
+    days = rows = 0
+    while True:
+        # Oldest remaining day; uses the (created_at, id) index
+        oldest = db.session.query(func.min(AuditLog.created_at)).filter(AuditLog.created_at < cutoff).scalar()
+        if oldest is None:
+            break
+        archived = archive_day(oldest.date())
+        if not archived:
+            break
+        rows += archived
+        days += 1
+    return days, rows
+
+
+def _to_log(record):
+    """Archived record as an object shaped like an AuditLog for templates and exports"""
+    return SimpleNamespace(
+        id=record['id'],
+        created_at=datetime.fromisoformat(record['created_at']),
+        user_id=record['user_id'],
+        user=SimpleNamespace(username=record['username']) if record['username'] else None,
+        action_type=record['action_type'],
+        action_details=record['action_details'],
+        ip_address=record['ip_address']
+    )
+
+
+def read_archived_logs(start=None, end=None, action_type=None, user_id=None, cursor=None):
+    """
+    Yield archived audit logs newest first, filtered like the live viewer
+
+    Only one day's partition is held in memory at a time.
+
+    Args:
+        start, end: Optional datetimes, start <= created_at < end
+        cursor: Optional keyset cursor; only entries older than it are returned
+    """
+    position = decode_cursor(cursor)
+    if position:
+        cursor_end = datetime.combine(position[0].date(), time()) + timedelta(days=1)
+        end = min(end, cursor_end) if end else cursor_end
+
+    for day in archived_days(start, end):
+        logs = [_to_log(record) for record in _read_partition(day)]
+        logs.sort(key=lambda log: (log.created_at, log.id), reverse=True)
+        for log in logs:
+            if (start and log.created_at < start) or (end and log.created_at >= end):
+                continue
+            if position and (log.created_at, log.id) >= position:
+                continue
+            if action_type and log.action_type != action_type:
+                continue
+            if user_id and log.user_id != user_id:
+                continue
+            yield log
+
+
+def archived_page(limit, **filters):
+    """
+    One page of archived logs for the admin viewer
+
+    Returns:
+        tuple: (logs, next_cursor); next_cursor is None on the last page
+    """
+    logs = []
+    for log in read_archived_logs(**filters):
+        if len(logs) == limit:
+            return logs, encode_cursor(logs[-1].created_at, logs[-1].id)
+        logs.append(log)
+    return logs, None
+
+
+def daily_action_counts(start=None, end=None):
+    """
+    Per-day, per-action audit log counts across archived and live rows
+
+    Returns:
+        list: (day 'YYYY-MM-DD', action_type, count) tuples, newest day first
+    """
+    totals = {}
+    rollups = AuditLogRollup.query
+    if start:
+        rollups = rollups.filter(AuditLogRollup.day >= start.date())
+    if end:
+        rollups = rollups.filter(AuditLogRollup.day < end.date())
+    for rollup in rollups:
+        key = (rollup.day.isoformat(), rollup.action_type)
+        totals[key] = totals.get(key, 0) + rollup.count
+
+    day = func.date(AuditLog.created_at)
+    live = db.session.query(day, AuditLog.action_type, func.count(AuditLog.id))
+    if start:
+        live = live.filter(AuditLog.created_at >= start)
+    if end:
+        live = live.filter(AuditLog.created_at < end)
+    for live_day, action_type, count in live.group_by(day, AuditLog.action_type):
+        key = (str(live_day)[:10], action_type)
+        totals[key] = totals.get(key, 0) + count
+
+    return sorted(((day, action, count) for (day, action), count in totals.items()),
+                  key=lambda row: (row[0], row[1]), reverse=True)
+
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        days_arg = next((arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--days=')), None)
+        archived_day_count, archived_rows = archive_audit_logs(int(days_arg) if days_arg else None)
+        print(f"✓ Archived {archived_rows} audit log rows from {archived_day_count} days "
+              f"to {app.config['AUDIT_ARCHIVE_FOLDER']}")
@@ -0,0 +1,95 @@
+"""
+Rate limiter benchmark at 100k distinct clients
+
+Compares the original fixed-window dict that was scanned on every request
+with TokenBucketLimiter (in process) and SQLiteTokenBucketLimiter (shared
+file). Reports per-check latency and the Python memory held for the
+clients (the SQLite limiter keeps them in the database file instead).
+
+    python benchmarks/rate_limit.py [--clients 100000] [--checks 20000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ratelimit import TokenBucketLimiter, SQLiteTokenBucketLimiter  # noqa: E402
+
+
+class DictScanLimiter:
+    """The limiter decorators.rate_limit used before: a fixed window, every expired key found by a full scan"""
+
+    def __init__(self):
+        self.storage = {}
+
+    def hit(self, key, capacity, period):
+        now = datetime.utcnow()
+        expired = [k for k, data in self.storage.items() if (now - data['first_request']).total_seconds() > 3600]
+        for k in expired:
+            del self.storage[k]
+        data = self.storage.get(key)
+        if data is None or (now - data['first_request']).total_seconds() >= period:
+            self.storage[key] = {'count': 1, 'first_request': now}
+            return True, 0
+        if data['count'] >= capacity:
+            return False, period
+        data['count'] += 1
+        return True, 0
+
+    def fill(self, keys):
+        """Insert keys directly; going through hit() would scan the dict once per key"""
+        now = datetime.utcnow()
+        for key in keys:
+            self.storage[key] = {'count': 1, 'first_request': now}
+
+    def __len__(self):
+        return len(self.storage)
+
+
+def run(name, limiter, clients, checks):
+    keys = [f'user_{i}_comments' for i in range(clients)]
+    tracemalloc.start()
+    started = time.perf_counter()
+    if hasattr(limiter, 'fill'):
+        limiter.fill(keys)
+    else:
+        for key in keys:
+            limiter.hit(key, 30, 3600)
+    fill_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rng = random.Random(1)
+    sample = [rng.choice(keys) for _ in range(checks)]
+    started = time.perf_counter()
+    for key in sample:
+        limiter.hit(key, 30, 3600)
+    per_check = (time.perf_counter() - started) / checks
+    print(f'{name:<28} {len(limiter):>9,} clients  {memory / 2**20:8.1f} MB  '
+          f'fill {fill_seconds:7.2f} s  {per_check * 1e6:9.2f} us/check')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=100_000)
+    parser.add_argument('--checks', type=int, default=20_000)
+    parser.add_argument('--skip-dict-scan', action='store_true',
+                        help='skip the old limiter (each of its checks scans every client)')
+    args = parser.parse_args()
+
+    run('TokenBucketLimiter', TokenBucketLimiter(), args.clients, args.checks)
+    with tempfile.TemporaryDirectory() as tmp:
+        run('SQLiteTokenBucketLimiter', SQLiteTokenBucketLimiter(os.path.join(tmp, 'ratelimit.db')),
+            args.clients, args.checks)
+    if not args.skip_dict_scan:
+        # Every check scans all clients; a smaller sample is enough
+        run('dict scan (before)', DictScanLimiter(), args.clients, max(1, args.checks // 100))
+
+
+if __name__ == '__main__':
+    main()
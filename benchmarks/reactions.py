@@ -0,0 +1,136 @@
+"""
+Reaction toggle latency under concurrent clients
+
+Each client thread toggles reactions on a few popular posts and reads back
+the post's reaction summary, as the reaction API does. "before" is the
+original handler: a lookup, an ORM add or delete, then a COUNT and an
+existence check per reaction type (12 queries). "after" is
+reactions.set_reaction plus get_reaction_summary, which read the
+maintained counters. Runs against a file-backed SQLite database.
+
+    python benchmarks/reactions.py [--clients 8] [--toggles 200] [--reactions 20000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+_tmp = tempfile.mkdtemp(prefix='campfire-bench-')
+# Read by app.py at import time
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp, "bench.db")}'
+os.environ['RATE_LIMIT_DB'] = ''
+os.environ['AUDIT_ASYNC'] = 'False'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app  # noqa: E402
+from models import db, User, Team, Post, Reaction, REACTION_TYPES  # noqa: E402
+from reactions import set_reaction, get_reaction_summary, rebuild_reaction_counts  # noqa: E402
+
+POSTS = 5
+
+
+def toggle_before(post_id, user_id, reaction_type):
+    """The reaction API before the counters"""
+    existing = Reaction.query.filter_by(post_id=post_id, user_id=user_id, reaction_type=reaction_type).first()
+    if existing:
+        db.session.delete(existing)
+    else:
+        db.session.add(Reaction(post_id=post_id, user_id=user_id, reaction_type=reaction_type))
+    db.session.commit()
+    summary = {}
+    for rtype in REACTION_TYPES:
+        summary[rtype] = {
+            'count': Reaction.query.filter_by(post_id=post_id, reaction_type=rtype).count(),
+            'user_reacted': Reaction.query.filter_by(post_id=post_id, user_id=user_id,
+                                                     reaction_type=rtype).first() is not None
+        }
+    return summary
+
+
+def toggle_after(post_id, user_id, reaction_type):
+    set_reaction(post_id, user_id, reaction_type)
+    return get_reaction_summary(post_id, user_id)
+
+
+def seed(users, reactions):
+    """Users, POSTS popular posts and reactions spread over them; returns (user ids, post ids)"""
+    db.drop_all()
+    db.create_all()
+    team = Team(name='Team 1')
+    db.session.add(team)
+    db.session.flush()
+    db.session.add_all([User(username=f'user{i}', password_hash='-', team_id=team.id) for i in range(users)])
+    db.session.flush()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    db.session.add_all([Post(user_id=user_ids[0], team_id=team.id, description=f'Post {i}', is_global=True)
+                        for i in range(POSTS)])
+    db.session.flush()
+    post_ids = [post_id for (post_id,) in db.session.query(Post.id)]
+
+    rng = random.Random(1)
+    rows = {(rng.choice(post_ids), rng.choice(user_ids), rng.choice(REACTION_TYPES)) for _ in range(reactions)}
+    db.session.execute(Reaction.__table__.insert(), [
+        {'post_id': post_id, 'user_id': user_id, 'reaction_type': rtype} for post_id, user_id, rtype in rows
+    ])
+    rebuild_reaction_counts()
+    db.session.commit()
+    return user_ids, post_ids
+
+
+def run(name, toggle, user_ids, post_ids, clients, toggles):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(seed):
+        rng = random.Random(seed)
+        timings = []
+        barrier.wait()
+        for _ in range(toggles):
+            args = (rng.choice(post_ids), rng.choice(user_ids), rng.choice(REACTION_TYPES))
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    toggle(*args)
+            except Exception as e:
+                errors.append(e)
+                continue
+            timings.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies) if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    print(f'{name:<8} {len(latencies):>6} toggles  {len(latencies) / elapsed:8.1f}/s  '
+          f'mean {mean * 1e3:7.2f} ms  p95 {p95 * 1e3:7.2f} ms  {len(errors)} errors')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--toggles', type=int, default=200, help='toggles per client')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--reactions', type=int, default=20_000, help='reactions seeded on the posts')
+    args = parser.parse_args()
+
+    for name, toggle in (('before', toggle_before), ('after', toggle_after)):
+        with app.app_context():
+            user_ids, post_ids = seed(args.users, args.reactions)
+        run(name, toggle, user_ids, post_ids, args.clients, args.toggles)
+
+
+if __name__ == '__main__':
+    main()
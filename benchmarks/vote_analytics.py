@@ -0,0 +1,113 @@
+"""
+Judge calibration analytics at 10k votes
+
+Seeds a file-backed SQLite database with every judge scoring every team
+and times analytics.get_vote_analytics() cold (load and compute), split
+into load_vote_arrays and compute_vote_analytics, and warm (cached).
+For comparison, a row-by-row pass over Vote objects computes only the
+per-judge means, standard deviations and z-scores.
+
+    python benchmarks/vote_analytics.py [--judges 20] [--teams 500] [--repeat 5]
+"""
+import os
+import sys
+import time
+import math
+import random
+import argparse
+import tempfile
+from collections import defaultdict
+
+_tmp = tempfile.mkdtemp(prefix='campfire-bench-')
+# Read by app.py at import time
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp, "bench.db")}'
+os.environ['RATE_LIMIT_DB'] = ''
+os.environ['AUDIT_ASYNC'] = 'False'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app  # noqa: E402
+from models import db, User, Team, Vote  # noqa: E402
+import analytics  # noqa: E402
+
+
+def seed(judges, teams):
+    """judges x teams votes; each judge has their own leniency"""
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Team.__table__.insert(), [{'name': f'Team {i}'} for i in range(teams)])
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'judge{i}', 'password_hash': '-', 'is_judge': True} for i in range(judges)
+    ])
+    team_ids = [team_id for (team_id,) in db.session.query(Team.id)]
+    judge_ids = [judge_id for (judge_id,) in db.session.query(User.id)]
+
+    rng = random.Random(1)
+    quality = {team_id: rng.uniform(3, 8) for team_id in team_ids}
+    rows = []
+    for judge_id in judge_ids:
+        leniency = rng.uniform(-1.5, 1.5)
+
+        def score(team_id):
+            return max(1, min(10, round(quality[team_id] + leniency + rng.gauss(0, 1))))
+
+        rows.extend({'judge_id': judge_id, 'team_id': team_id, 'innovation_score': score(team_id),
+                     'implementation_score': score(team_id), 'design_score': score(team_id),
+                     'presentation_score': score(team_id)} for team_id in team_ids)
+    db.session.execute(Vote.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def row_by_row():
+    """Per-judge mean, sample std dev and vote z-scores from Vote objects"""
+    by_judge = defaultdict(list)
+    for vote in Vote.query.all():
+        by_judge[vote.judge_id].append((vote.id, vote.calculate_total_score()))
+    z = {}
+    for votes in by_judge.values():
+        mean = sum(total for _, total in votes) / len(votes)
+        std = math.sqrt(sum((total - mean) ** 2 for _, total in votes) / (len(votes) - 1)) \
+            if len(votes) > 1 else 0
+        for vote_id, total in votes:
+            z[vote_id] = (total - mean) / std if std else 0.0
+    return z
+
+
+def best(func, repeat):
+    """Fastest of repeat runs, in ms"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+        db.session.expire_all()
+    return min(timings) * 1e3
+
+
+def cold():
+    analytics._cache['key'] = None
+    analytics.get_vote_analytics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--judges', type=int, default=20)
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        votes = seed(args.judges, args.teams)
+        print(f'{votes:,} votes, {args.judges} judges, {args.teams} teams (best of {args.repeat})')
+        arrays = analytics.load_vote_arrays()
+        for name, func in (
+                ('get_vote_analytics (cold)', cold),
+                ('  load_vote_arrays', analytics.load_vote_arrays),
+                ('  compute_vote_analytics', lambda: analytics.compute_vote_analytics(arrays)),
+                ('get_vote_analytics (cached)', analytics.get_vote_analytics),
+                ('row by row (judge stats, z)', row_by_row)):
+            print(f'{name:<30} {best(func, args.repeat):9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
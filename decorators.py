@@ -1,29 +1,35 @@
 """Decorators for rate limiting and audit logging"""
+import math
 from functools import wraps
-from flask import request, abort, flash, redirect, url_for
+from flask import request, abort, flash, redirect, url_for, jsonify
 from flask_login import current_user
-from datetime import datetime, timedelta
 from utils import create_audit_log
+from ratelimit import TokenBucketLimiter, SQLiteTokenBucketLimiter
 
-# In-memory rate limiting storage (for simplicity - production should use Redis)
-rate_limit_storage = {}
+# Rate limiting storage: in-memory until init_rate_limit_storage() points it
+# at the SQLite file shared by all worker processes
+rate_limit_storage = TokenBucketLimiter()
 
 
-def clear_old_rate_limits():
-    """Clear rate limits older than 1 hour"""
-    now = datetime.utcnow()
-    keys_to_delete = []
-    for key, data in rate_limit_storage.items():
-        if (now - data['first_request']).total_seconds() > 3600:
-            keys_to_delete.append(key)
-    for key in keys_to_delete:
-        del rate_limit_storage[key]
+def init_rate_limit_storage(path):
+    """Share rate limits across worker processes through the SQLite file at path (None: per process)"""
+    global rate_limit_storage
+    rate_limit_storage = SQLiteTokenBucketLimiter(path) if path else TokenBucketLimiter()
+
+
+def wants_json():
+    """Whether the current request is from a JSON API client rather than a page"""
+    return request.is_json or request.path.startswith('/api/')
 
 
 def rate_limit(max_requests, window_minutes, action_name):
     """
     Rate limiting decorator
     
+    Each client may make max_requests requests per window_minutes; unused
+    allowance refills continuously (token bucket), so bursts at window
+    edges cannot double the limit.
+    
     Args:
         max_requests: Maximum number of requests allowed
         window_minutes: Time window in minutes
@@ -42,35 +48,18 @@ def rate_limit(max_requests, window_minutes, action_name):
             else:
                 identifier = f"ip_{request.remote_addr}_{action_name}"
             
-            # Clean old entries
-            clear_old_rate_limits()
-            
-            # Check rate limit
-            now = datetime.utcnow()
-            if identifier in rate_limit_storage:
-                data = rate_limit_storage[identifier]
-                time_passed = (now - data['first_request']).total_seconds() / 60  # minutes
-                
-                if time_passed < window_minutes:
-                    if data['count'] >= max_requests:
-                        # Rate limit exceeded
-                        wait_time = int(window_minutes - time_passed)
-                        flash(f'Rate limit exceeded. Please wait {wait_time} minutes before trying again.', 'error')
-                        return redirect(request.referrer or url_for('index'))
-                    else:
-                        data['count'] += 1
+            allowed, retry_after = rate_limit_storage.hit(identifier, max_requests, window_minutes * 60)
+            if not allowed:
+                retry_after = math.ceil(retry_after)
+                message = f'Rate limit exceeded. Please wait {retry_after} seconds before trying again.'
+                if wants_json():
+                    response = jsonify({'success': False, 'message': message})
+                    response.status_code = 429
                 else:
-                    # Reset window
-                    rate_limit_storage[identifier] = {
-                        'count': 1,
-                        'first_request': now
-                    }
-            else:
-                # First request
-                rate_limit_storage[identifier] = {
-                    'count': 1,
-                    'first_request': now
-                }
+                    flash(message, 'error')
+                    response = redirect(request.referrer or url_for('index'))
+                response.headers['Retry-After'] = str(retry_after)
+                return response
             
             return f(*args, **kwargs)
         return decorated_function
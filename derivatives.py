@@ -0,0 +1,293 @@
+"""Resized WebP/JPEG copies of uploaded post images, rendered in a process pool"""
+import os
+import re
+import glob
+import math
+import uuid
+import warnings
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+import media
+from models import db, Post, PostMedia, MediaBlob
+
+# Widths rendered for each image; never wider than the image itself
+DERIVATIVE_WIDTHS = (320, 640, 1280, 1920)
+DERIVATIVE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+DERIVATIVE_FOLDER = 'derivatives'
+# How long a request waits for one image's derivatives
+RENDER_TIMEOUT = 60  # seconds
+BACKFILL_BATCH_SIZE = 50
+
+_executor = {'pid': None, 'pool': None}
+_executor_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    """The upload is not a decodable image or exceeds the pixel limit"""
+
+
+def derivative_name(filename, width, ext):
+    """Derivative filename for one width and format, relative to the upload's folder"""
+    stem = filename.rsplit('.', 1)[0]
+    return f'{DERIVATIVE_FOLDER}/{stem}_{width}w.{ext}'
+
+
+def derivative_files(folder_path, filename):
+    """Paths of every derivative of an upload that exists on disk"""
+    stem = filename.rsplit('.', 1)[0]
+    return glob.glob(os.path.join(folder_path, DERIVATIVE_FOLDER, glob.escape(stem) + '_*w.*'))
+
+
+def remove_orphaned_derivatives(upload_folder, cutoff):
+    """
+    Delete derivatives whose upload no longer exists, if older than cutoff
+
+    Returns:
+        int: Bytes freed
+    """
+    freed = 0
+    root = os.path.join(upload_folder, 'posts', DERIVATIVE_FOLDER)
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            match = re.fullmatch(r'(.+)_\d+w\.\w+', name)
+            if not match:
+                continue
+            path = os.path.join(dirpath, name)
+            source_stem = os.path.join(upload_folder, 'posts', os.path.relpath(dirpath, root), match.group(1))
+            try:
+                if glob.glob(glob.escape(source_stem) + '.*') or \
+                        datetime.utcfromtimestamp(os.path.getmtime(path)) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+    return freed
+
+
+def parse_widths(widths):
+    """Stored comma-separated widths as a list of ints"""
+    return [int(width) for width in widths.split(',')] if widths else []
+
+
+def _target_widths(width):
+    """Widths to render for an image `width` pixels wide"""
+    widths = [target for target in DERIVATIVE_WIDTHS if target < width]
+    if width <= DERIVATIVE_WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def render_derivatives(source_path, output_dir, filename, max_pixels, quality=80):
+    """
+    Write the resized copies of one image (runs in a pool process)
+
+    The image is rotated upright according to its EXIF orientation and
+    saved without any EXIF data (camera details, GPS position). JPEGs are
+    decoded at a reduced scale when the largest width allows it, which is
+    most of the cost for phone photos. Files are written under temporary
+    names and renamed into place.
+
+    Args:
+        source_path: Image file to read
+        output_dir: Folder of the upload; derivatives go in its
+            DERIVATIVE_FOLDER subfolder
+        filename: Upload filename the derivative names are based on
+        max_pixels: Reject images with more pixels than this
+
+    Returns:
+        tuple: (widths, paths) of the rendered derivatives
+
+    Raises:
+        InvalidImage: If the file cannot be decoded or is too large
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    paths = []
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns between max_pixels and twice that
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(source_path) as image:
+                stored_width, stored_height = image.size
+                if stored_width * stored_height > max_pixels:
+                    raise InvalidImage(f'{stored_width}x{stored_height} exceeds the {max_pixels} pixel limit')
+                width = stored_width
+                if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):  # rotated a quarter turn
+                    width = stored_height
+                widths = _target_widths(width)
+                # Lets the JPEG decoder skip detail the largest derivative doesn't need
+                scale = widths[-1] / width
+                image.draft('RGB', (math.ceil(stored_width * scale), math.ceil(stored_height * scale)))
+                image = ImageOps.exif_transpose(image)
+                image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError,
+            Image.DecompressionBombWarning, OSError, SyntaxError) as e:
+        raise InvalidImage(str(e)) from e
+
+    icc_profile = image.info.get('icc_profile')
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        opaque = Image.new('RGB', image.size, (255, 255, 255))
+        opaque.paste(image, mask=image.getchannel('A'))
+    else:
+        opaque = image
+
+    os.makedirs(os.path.dirname(os.path.join(output_dir, derivative_name(filename, 1, 'jpg'))), exist_ok=True)
+    try:
+        # Largest first, each width resized from the previous one rather than the full image
+        for target in reversed(widths):
+            size = (target, max(1, round(image.height * target / image.width)))
+            if image.size != size:
+                image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+                opaque = image if not has_alpha else opaque.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            for ext, image_format in DERIVATIVE_FORMATS.items():
+                resized = image if image_format == 'WEBP' else opaque
+                path = os.path.join(output_dir, derivative_name(filename, target, ext))
+                tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+                options = {'quality': quality, 'icc_profile': icc_profile}
+                if image_format == 'JPEG':
+                    options.update(optimize=True, progressive=True)
+                else:
+                    options.update(method=4)
+                resized.save(tmp_path, image_format, **options)
+                os.replace(tmp_path, path)
+                paths.append(path)
+    except BaseException:
+        for path in paths:
+            os.remove(path)
+        raise
+    return widths, paths
+
+
+def _get_executor():
+    """
+    Derivative process pool for this process
+
+    Worker processes are spawned rather than forked, so they never inherit
+    the web worker's threads, locks or database connections.
+    """
+    if _executor['pid'] != os.getpid():
+        with _executor_lock:
+            if _executor['pid'] != os.getpid():
+                _executor['pool'] = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('IMAGE_DERIVATIVE_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                _executor['pid'] = os.getpid()
+    return _executor['pool']
+
+
+def _submit(source_path, output_dir, filename):
+    return _get_executor().submit(render_derivatives, source_path, output_dir, filename,
+                                  current_app.config['IMAGE_MAX_PIXELS'])
+
+
+def render_staged(staged):
+    """
+    Render derivatives for staged uploads, in parallel, before they are published
+
+    An image whose blob is already stored with derivatives reuses them.
+    Uploads that turn out not to be valid images are discarded and left
+    out of the result; the others get derivative_widths set.
+
+    Returns:
+        list: The uploads that are valid images, in order
+    """
+    rendered = dict(db.session.query(MediaBlob.path, MediaBlob.derivative_widths)
+                    .filter(MediaBlob.path.in_([upload.blob_path for upload in staged]),
+                            MediaBlob.derivative_widths != None))
+    futures, submitted = [], {}
+    for upload in staged:
+        if upload.blob_path in rendered:
+            upload.derivative_widths = rendered[upload.blob_path]
+            futures.append((upload, None))
+            continue
+        if upload.blob_path not in submitted:
+            # The same image twice in one batch is rendered once
+            submitted[upload.blob_path] = _submit(upload.tmp_path, upload.folder_path, upload.filename)
+        futures.append((upload, submitted[upload.blob_path]))
+
+    valid, error = [], None
+    for upload, future in futures:
+        if future is not None:
+            try:
+                widths, _ = future.result(timeout=RENDER_TIMEOUT)
+            except InvalidImage:
+                media.discard([upload])
+                continue
+            except Exception as e:
+                # Keep waiting so no render is still writing when the error is raised
+                error = error or e
+                continue
+            upload.derivative_widths = ','.join(str(width) for width in widths)
+        valid.append(upload)
+    if error:
+        media.discard(staged)
+        raise error
+    return valid
+
+
+def backfill_derivatives():
+    """
+    Render derivatives for post images uploaded before the pipeline existed
+
+    Returns:
+        tuple: (images rendered, images skipped as missing or invalid)
+    """
+    posts_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'posts')
+    rendered = skipped = 0
+    last_media_id = last_post_id = 0
+    while True:
+        # (row, filename) pairs still without derivatives; skipped rows are passed by id
+        batch = [(item, item.file_path) for item in
+                 PostMedia.query.filter(PostMedia.media_type == 'image', PostMedia.derivative_widths == None,
+                                        PostMedia.id > last_media_id)
+                 .order_by(PostMedia.id).limit(BACKFILL_BATCH_SIZE)]
+        if batch:
+            last_media_id = batch[-1][0].id
+        else:
+            batch = [(post, post.image_path) for post in
+                     Post.query.filter(Post.image_path != None, Post.image_derivative_widths == None,
+                                       Post.id > last_post_id)
+                     .order_by(Post.id).limit(BACKFILL_BATCH_SIZE)]
+            if not batch:
+                break
+            last_post_id = batch[-1][0].id
+
+        futures = []
+        for row, filename in batch:
+            source_path = os.path.join(posts_folder, filename)
+            if os.path.exists(source_path):
+                futures.append((row, filename, _submit(source_path, posts_folder, filename)))
+            else:
+                skipped += 1
+        for row, filename, future in futures:
+            try:
+                widths, _ = future.result(timeout=RENDER_TIMEOUT)
+            except InvalidImage:
+                skipped += 1
+                continue
+            value = ','.join(str(width) for width in widths)
+            if isinstance(row, PostMedia):
+                row.derivative_widths = value
+            else:
+                row.image_derivative_widths = value
+            MediaBlob.query.filter_by(path=media.blob_path('posts', filename)) \
+                .update({'derivative_widths': value}, synchronize_session=False)
+            rendered += 1
+        db.session.commit()
+    return rendered, skipped
+
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        rendered_count, skipped_count = backfill_derivatives()
+        print(f"✓ Rendered derivatives for {rendered_count} images")
+        if skipped_count:
+            print(f"ℹ Skipped {skipped_count} missing or invalid images")
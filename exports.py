@@ -0,0 +1,154 @@
+"""Streaming CSV exports for the admin area"""
+import csv
+import zlib
+from io import StringIO
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from models import db, AuditLog, Vote, Team, User
+from audit_archive import read_archived_logs
+
+EXPORT_BATCH_SIZE = 1000
+# Rows buffered before a chunk is handed to the WSGI server
+CSV_CHUNK_ROWS = 500
+
+
+def parse_date_range(args):
+    """
+    Read optional start/end (YYYY-MM-DD) query arguments
+
+    Returns:
+        tuple: (start, end) datetimes, either may be None; end is exclusive
+        (the day after the requested end date)
+
+    Raises:
+        ValueError: If a date is malformed
+    """
+    start = args.get('start', '').strip()
+    end = args.get('end', '').strip()
+    start = datetime.strptime(start, '%Y-%m-%d') if start else None
+    end = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    return start, end
+
+
+def filter_date_range(query, column, start=None, end=None):
+    """Restrict query to start <= column < end"""
+    if start:
+        query = query.filter(column >= start)
+    if end:
+        query = query.filter(column < end)
+    return query
+
+
+def csv_chunks(header, rows):
+    """Encode rows as CSV, yielding a UTF-8 chunk every CSV_CHUNK_ROWS rows"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_response(filename, header, rows, gzip=False):
+    """
+    Build a streamed CSV download
+
+    rows is consumed lazily while the response is sent, inside the request
+    context, so only one batch of rows is held in memory at a time.
+    """
+    chunks = csv_chunks(header, rows)
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def audit_log_rows(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield audit log CSV rows, newest first, streamed in batches with usernames joined"""
+    query = db.session.query(
+        AuditLog.created_at, User.username, AuditLog.action_type,
+        AuditLog.action_details, AuditLog.ip_address
+    ).outerjoin(User, AuditLog.user_id == User.id)
+    query = filter_date_range(query, AuditLog.created_at, start, end)
+    query = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+
+    for log in query.yield_per(batch_size):
+        yield [
+            log.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            log.username or 'System',
+            log.action_type,
+            log.action_details or '',
+            log.ip_address or ''
+        ]
+
+
+def archived_audit_log_rows(start=None, end=None):
+    """Yield CSV rows for archived audit logs, newest first, one day partition at a time"""
+    for log in read_archived_logs(start, end):
+        yield [
+            log.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            log.user.username if log.user else 'System',
+            log.action_type,
+            log.action_details or '',
+            log.ip_address or ''
+        ]
+
+
+def vote_rows(start=None, end=None, batch_size=EXPORT_BATCH_SIZE, analytics=None):
+    """
+    Yield voting result CSV rows with team and judge names joined in one query
+    
+    With analytics (see analytics.get_vote_analytics) each row also gets
+    the vote's judge-normalized z-score and its team's normalized score
+    and 95% confidence interval.
+    """
+    query = db.session.query(Vote, Team.name, User.username) \
+        .join(Team, Vote.team_id == Team.id) \
+        .join(User, Vote.judge_id == User.id)
+    query = filter_date_range(query, Vote.created_at, start, end)
+
+    for vote, team_name, judge_name in query.order_by(Team.name, Vote.id).yield_per(batch_size):
+        row = [
+            team_name,
+            judge_name,
+            vote.innovation_score,
+            vote.implementation_score,
+            vote.design_score,
+            vote.presentation_score,
+            vote.calculate_total_score(),
+            vote.comments or ''
+        ]
+        if analytics is not None:
+            team = analytics['teams'].get(vote.team_id, {})
+            z = analytics['votes'].get(vote.id)
+            row += [_format_stat(z), _format_stat(team.get('normalized')),
+                    _format_stat(team.get('ci_low')), _format_stat(team.get('ci_high'))]
+        yield row
+
+
+def _format_stat(value):
+    """Format an optional float statistic for CSV"""
+    return '' if value is None else f'{value:.4f}'
+
+
+VOTE_ANALYTICS_HEADER = ['Judge Z-Score', 'Team Normalized Score', 'Team 95% CI Low', 'Team 95% CI High']
@@ -2,7 +2,7 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed, MultipleFileField
 from wtforms import (StringField, PasswordField, BooleanField, TextAreaField, 
-                     SelectField, SubmitField, IntegerField, DateTimeField)
+                     SelectField, SubmitField, IntegerField, DateTimeField, HiddenField)
 from wtforms.validators import DataRequired, Length, ValidationError, Regexp, Optional, NumberRange, URL
 from models import User, Team, RegistrationCode
 
@@ -47,6 +47,8 @@ class PostForm(FlaskForm):
     image = FileField('Image (Legacy)', validators=[FileAllowed(['png', 'jpg', 'jpeg'], 'Images only!')])
     images = MultipleFileField('Images (up to 10)', validators=[FileAllowed(['png', 'jpg', 'jpeg'], 'Images only!')])
     video = FileField('Video', validators=[FileAllowed(['mp4', 'webm', 'mov'], 'Videos only!')])
+    # Id of a video sent with the resumable uploader (static/js/uploads.js)
+    upload_id = HiddenField(validators=[Optional(), Length(max=32)])
     is_global = BooleanField('Post to Global Timeline')
     submit = SubmitField('Create Post')
 
@@ -97,7 +99,8 @@ class AssignTeamForm(FlaskForm):
 class GenerateCodesForm(FlaskForm):
     """Admin form to generate registration codes"""
     count = SelectField('Number of Codes', 
-                       choices=[(5, '5'), (10, '10'), (20, '20'), (50, '50')],
+                       choices=[(5, '5'), (10, '10'), (20, '20'), (50, '50'), (100, '100'),
+                                (500, '500'), (1000, '1000'), (5000, '5000')],
                        coerce=int,
                        validators=[DataRequired()])
     submit = SubmitField('Generate Codes')
@@ -1,9 +1,8 @@
 """Initialize database and create default admin account"""
 import os
-import random
-import string
 from app import app, db
 from models import User, Team, RegistrationCode
+from utils import generate_registration_codes
 
 
 def init_database():
@@ -29,17 +28,7 @@ def init_database():
         existing_codes = RegistrationCode.query.count()
         if existing_codes == 0:
             print("Generating 10 initial registration codes...")
-            codes = []
-            for _ in range(10):
-                # Generate unique 6-digit code
-                while True:
-                    code = ''.join(random.choices(string.digits, k=6))
-                    if code not in codes and not RegistrationCode.query.filter_by(code=code).first():
-                        break
-                
-                reg_code = RegistrationCode(code=code)
-                db.session.add(reg_code)
-                codes.append(code)
+            for code in generate_registration_codes(10):
                 print(f"  - {code}")
             
             db.session.commit()
@@ -0,0 +1,58 @@
+"""Judge-facing team queries"""
+from sqlalchemy import and_, func
+from models import db, Team, Vote, User, Post
+
+
+def judge_overview(judge_id):
+    """
+    Every team with the judge's vote (if any), member count and post count
+
+    Built as one query: teams LEFT JOIN the judge's votes and LEFT JOIN
+    grouped member and post counts, so the cost stays flat however many
+    teams there are.
+
+    Returns:
+        list: dicts with team, voted, vote, member_count and post_count,
+        in team id order
+    """
+    member_counts = (db.session.query(User.team_id, func.count(User.id).label('count'))
+                     .group_by(User.team_id)
+                     .subquery())
+    post_counts = (db.session.query(Post.team_id, func.count(Post.id).label('count'))
+                   .filter(Post.deleted_at == None)
+                   .group_by(Post.team_id)
+                   .subquery())
+
+    rows = (db.session.query(Team, Vote,
+                             func.coalesce(member_counts.c.count, 0),
+                             func.coalesce(post_counts.c.count, 0))
+            .outerjoin(Vote, and_(Vote.team_id == Team.id, Vote.judge_id == judge_id))
+            .outerjoin(member_counts, member_counts.c.team_id == Team.id)
+            .outerjoin(post_counts, post_counts.c.team_id == Team.id)
+            .order_by(Team.id)
+            .all())
+
+    return [{
+        'team': team,
+        'voted': vote is not None,
+        'vote': vote,
+        'member_count': member_count,
+        'post_count': post_count
+    } for team, vote, member_count, post_count in rows]
+
+
+def next_unvoted_team_id(judge_id, after_team_id=0):
+    """
+    ID of the first team after after_team_id that the judge hasn't voted on
+
+    Walks teams in id order from after_team_id, probing the unique
+    (judge_id, team_id) vote index for each, and stops at the first
+    match; wraps around to the start once. Returns None when every team
+    has a vote.
+    """
+    voted = (db.session.query(Vote.id)
+             .filter(Vote.judge_id == judge_id, Vote.team_id == Team.id)
+             .exists())
+    query = db.session.query(Team.id).filter(~voted).order_by(Team.id)
+    return (query.filter(Team.id > after_team_id).limit(1).scalar()
+            or query.filter(Team.id <= after_team_id).limit(1).scalar())
@@ -0,0 +1,127 @@
+"""Cached team leaderboard, maintained incrementally as votes are submitted"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, or_
+from models import db, Team, Vote
+
+
+class Leaderboard:
+    """
+    Per-team vote totals with a pre-sorted ranking
+
+    Totals are loaded with one grouped query, then updated in place by
+    record_vote() when a vote commits, so serving the ranking does no
+    database work. Writes made by other worker processes are picked up
+    when the snapshot is reloaded after LEADERBOARD_TTL seconds.
+
+    A reload and record_vote() can race: the reload may already have read
+    the vote, or may have read before it committed and finish after it was
+    recorded. Each snapshot therefore remembers the highest vote id it
+    read; votes at or below it are not added again, and votes above it
+    recorded meanwhile are carried into the new snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = None  # team_id -> {'team_id', 'team_name', 'points', 'vote_count'}
+        self._ranking = []
+        self._loaded_at = 0
+        self._max_vote_id = 0  # Highest vote id included in the snapshot's query
+        self._recorded = {}  # vote id -> (team_id, points) recorded since the snapshot was read
+
+    @staticmethod
+    def _rank(totals):
+        """Ranking entries sorted by average score, best first"""
+        ranking = []
+        for entry in totals.values():
+            count = entry['vote_count']
+            ranking.append(dict(entry, average_score=entry['points'] / count if count else 0))
+        ranking.sort(key=lambda entry: entry['average_score'], reverse=True)
+        return ranking
+
+    @staticmethod
+    def _add(entry, points):
+        entry['points'] += points
+        entry['vote_count'] += 1
+
+    def _load(self):
+        """Aggregate every team's weighted points and vote count in one query"""
+        # Read in the same statement, so it describes exactly the votes aggregated
+        max_vote_id = db.session.query(func.coalesce(func.max(Vote.id), 0)).scalar_subquery()
+        rows = (db.session.query(Team.id, Team.name, func.count(Vote.id),
+                                 func.coalesce(func.sum(Vote.total_score_expression()), 0), max_vote_id)
+                .outerjoin(Vote, Vote.team_id == Team.id)
+                .group_by(Team.id, Team.name)
+                .all())
+        totals = {team_id: {'team_id': team_id, 'team_name': name, 'points': points, 'vote_count': count}
+                  for team_id, name, count, points, _ in rows}
+        max_vote_id = rows[0][4] if rows else 0
+        with self._lock:
+            if self._totals is not None and max_vote_id < self._max_vote_id:
+                return  # A concurrent reload installed a newer snapshot
+            # Votes recorded after this query read the table are not in it
+            self._recorded = {vote_id: vote for vote_id, vote in self._recorded.items() if vote_id > max_vote_id}
+            for team_id, points in self._recorded.values():
+                if team_id in totals:
+                    self._add(totals[team_id], points)
+            self._max_vote_id = max_vote_id
+            self._totals = totals
+            self._ranking = self._rank(totals)
+            self._loaded_at = time.monotonic()
+
+    def ranking(self):
+        """
+        Teams ordered by average score
+
+        Returns:
+            list: dicts with team_id, team_name, average_score, vote_count
+            and points (sum of weighted vote totals); treat as read-only
+        """
+        self._refresh()
+        return self._ranking
+
+    def snapshot(self):
+        """
+        The ranking together with the votes it counts
+
+        Returns:
+            tuple: (ranking, counted), where counted is a SQL condition on
+            Vote selecting exactly the votes included in the ranking, so
+            vote details shown next to it agree with its totals
+        """
+        self._refresh()
+        with self._lock:
+            ranking, max_vote_id, recorded = self._ranking, self._max_vote_id, list(self._recorded)
+        return ranking, or_(Vote.id <= max_vote_id, Vote.id.in_(recorded))
+
+    def _refresh(self):
+        ttl = current_app.config.get('LEADERBOARD_TTL', 30)
+        if self._totals is None or (ttl and time.monotonic() - self._loaded_at > ttl):
+            self._load()
+
+    def record_vote(self, vote):
+        """Fold a newly committed vote into the cached totals"""
+        # Always a whole number (see Vote.total_score_expression); round off float error
+        points = round(vote.calculate_total_score())
+        with self._lock:
+            if vote.id <= self._max_vote_id or vote.id in self._recorded:
+                return  # Already counted
+            # Kept even without a snapshot, in case a reload in progress read before the commit
+            self._recorded[vote.id] = (vote.team_id, points)
+            if self._totals is None:
+                return  # Nothing cached yet; the next read loads it
+            entry = self._totals.get(vote.team_id)
+            if entry is None:
+                self._totals = None  # Team unknown to the snapshot; reload
+                return
+            self._add(entry, points)
+            self._ranking = self._rank(self._totals)
+
+    def invalidate(self):
+        """Drop the snapshot, e.g. after a team is created or renamed"""
+        with self._lock:
+            self._totals = None
+
+
+leaderboard = Leaderboard()
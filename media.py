@@ -0,0 +1,510 @@
+"""
+Upload ingestion and content-addressed storage
+
+Uploads are staged and validated in parallel, then moved atomically into a
+content-addressed layout: <UPLOAD_FOLDER>/<folder>/ab/cd/<sha256>.<ext>.
+Identical files are stored once; the media_blobs table counts the rows
+referencing each file and the garbage collector (python media.py) deletes
+blobs nothing references any more.
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import hashlib
+import mimetypes
+import threading
+from zlib import adler32
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app, request, send_file, abort
+from werkzeug.security import safe_join
+from sqlalchemy import func
+from models import db, MediaBlob, Post, PostMedia, User, Team, SiteSettings, UploadSession
+from utils import upsert, remove_file
+
+# Staged files live under the upload folder so the final move is a same-filesystem rename
+STAGING_FOLDER = '.staging'
+STAGED_SUFFIX = '.part'
+# Staged files older than this were left behind by a crashed worker
+STALE_STAGED_AGE = 3600  # seconds
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Unreferenced blobs are only deleted once untouched for this long, so an
+# upload that reuses a blob just before the collector runs keeps it
+GC_GRACE_PERIOD = timedelta(hours=24)
+
+# Leading bytes expected for each extension; extensions not listed are not sniffed
+SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'webm': (b'\x1a\x45\xdf\xa3',),
+    'ico': (b'\x00\x00\x01\x00',),
+}
+# MP4 and QuickTime files start with a box: 4-byte size, then its type
+ISO_MEDIA_EXTENSIONS = {'mp4', 'mov'}
+ISO_MEDIA_BOXES = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+# Spellings stored under one extension, so identical files share a blob
+CANONICAL_EXTENSIONS = {'jpeg': 'jpg'}
+
+BLOB_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+# A blob or one of its resized copies (derivatives.DERIVATIVE_FOLDER): the name fixes the content
+IMMUTABLE_PATTERN = re.compile(r'^(?:derivatives/)?[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:_\d+w)?\.\w+)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # seconds
+
+# Upload folders served by send_media(); the staging folder is not among them
+MEDIA_FOLDERS = {'posts', 'videos', 'profiles', 'team_avatars', 'branding'}
+OFFLOAD_HEADERS = {'x-accel-redirect': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
+
+_executor = {'pid': None, 'pool': None}
+_executor_lock = threading.Lock()
+_next_sweep = 0
+
+
+class StagedUpload:
+    """An uploaded file written to the staging folder, waiting to be published"""
+
+    def __init__(self, upload_folder, folder, filename, tmp_path, size):
+        self.folder = folder
+        self.filename = filename
+        self.tmp_path = tmp_path
+        self.size = size
+        self.folder_path = os.path.join(upload_folder, folder)
+        self.final_path = os.path.join(self.folder_path, filename)
+        self.published = False
+        # Widths of the resized copies (see derivatives.py)
+        self.derivative_widths = None
+
+    @property
+    def blob_path(self):
+        return blob_path(self.folder, self.filename)
+
+    def __repr__(self):
+        return f'<StagedUpload {self.folder}/{self.filename}>'
+
+
+def blob_path(folder, filename):
+    """media_blobs key of an upload: its path relative to UPLOAD_FOLDER"""
+    return f'{folder}/{filename}'
+
+
+def _get_executor():
+    """Upload thread pool for this process (recreated after a fork)"""
+    if _executor['pid'] != os.getpid():
+        with _executor_lock:
+            if _executor['pid'] != os.getpid():
+                _executor['pool'] = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('MEDIA_UPLOAD_WORKERS', 4),
+                    thread_name_prefix='media-upload'
+                )
+                _executor['pid'] = os.getpid()
+    return _executor['pool']
+
+
+def _extension(filename, allowed_extensions):
+    """Lower-cased extension of filename, or None if it is not allowed"""
+    if not filename or '.' not in filename:
+        return None
+    ext = filename.rsplit('.', 1)[1].lower()
+    return ext if ext in allowed_extensions else None
+
+
+def matches_signature(header, ext):
+    """Check a file's leading bytes against what its extension promises"""
+    if ext in ISO_MEDIA_EXTENSIONS:
+        return header[4:8] in ISO_MEDIA_BOXES
+    signatures = SIGNATURES.get(ext)
+    return signatures is None or header.startswith(signatures)
+
+
+def content_filename(digest, ext):
+    """Sharded content-addressed filename: ab/cd/<sha256>.<ext>"""
+    ext = CANONICAL_EXTENSIONS.get(ext, ext)
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{ext}'
+
+
+def _stage(file, upload_folder, folder, ext):
+    """Copy one upload into the staging folder, hashing it on the way (runs on the upload pool)"""
+    stream = file.stream
+    stream.seek(0)
+    if not matches_signature(stream.read(16), ext):
+        return None
+    stream.seek(0)
+
+    staging_dir = os.path.join(upload_folder, STAGING_FOLDER)
+    os.makedirs(staging_dir, exist_ok=True)
+    tmp_path = os.path.join(staging_dir, uuid.uuid4().hex + STAGED_SUFFIX)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+
+    return StagedUpload(upload_folder, folder, content_filename(digest.hexdigest(), ext), tmp_path, size)
+
+
+def stage_uploads(uploads):
+    """
+    Stage several uploads concurrently
+
+    Each file is checked (extension and leading bytes), hashed and copied
+    to the staging folder on the upload thread pool; nothing touches the
+    database, so no transaction is open while the bytes are written.
+
+    Args:
+        uploads: List of (file, folder, allowed_extensions) tuples
+
+    Returns:
+        list: A StagedUpload per upload, or None where the file was
+        missing or invalid, in the order given
+
+    Raises:
+        OSError: If a file could not be written; anything already staged
+            is removed first
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    _sweep_stale(upload_folder)
+
+    futures = []
+    for file, folder, allowed_extensions in uploads:
+        ext = _extension(file.filename if file else None, allowed_extensions)
+        futures.append(_get_executor().submit(_stage, file, upload_folder, folder, ext) if ext else None)
+
+    staged, error = [], None
+    for future in futures:
+        try:
+            staged.append(future.result() if future else None)
+        except Exception as e:
+            error = error or e
+            staged.append(None)
+    if error:
+        discard(staged)
+        raise error
+    return staged
+
+
+def publish(staged):
+    """
+    Move staged files to their content-addressed paths
+
+    Each move is an atomic rename, so a blob is either absent or complete.
+    A file whose content is already stored is not written again; the
+    existing blob is touched instead so the garbage collector's grace
+    period starts over.
+
+    Returns:
+        list: The published filenames, in order (None entries skipped)
+    """
+    staged = [upload for upload in staged if upload]
+    try:
+        for upload in staged:
+            if os.path.exists(upload.final_path):
+                os.utime(upload.final_path)
+                remove_file(upload.tmp_path)
+            else:
+                os.makedirs(os.path.dirname(upload.final_path), exist_ok=True)
+                os.replace(upload.tmp_path, upload.final_path)
+            upload.published = True
+    except BaseException:
+        discard(staged)
+        raise
+    return [upload.filename for upload in staged]
+
+
+def discard(staged):
+    """
+    Remove the staging files of uploads that will not be recorded
+
+    Published blobs are left in place even if the rows referencing them
+    are never committed: another upload may already share them. Blobs
+    left unreferenced are removed by the garbage collector.
+    """
+    for upload in staged:
+        if upload and not upload.published:
+            remove_file(upload.tmp_path)
+
+
+def add_references(staged):
+    """
+    Count one new reference to each published upload's blob
+
+    Runs in the caller's transaction, so the counts commit (or roll back)
+    together with the rows that reference the files.
+    """
+    table = MediaBlob.__table__
+    now = datetime.utcnow()
+    for upload in staged:
+        stmt = upsert(table).values(path=upload.blob_path, size=upload.size, ref_count=1,
+                                     derivative_widths=upload.derivative_widths,
+                                     created_at=now, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.path],
+            set_={
+                'ref_count': table.c.ref_count + 1,
+                'derivative_widths': func.coalesce(stmt.excluded.derivative_widths, table.c.derivative_widths),
+                'updated_at': now
+            }
+        )
+        db.session.execute(stmt)
+
+
+def release_reference(folder, filename):
+    """Drop one reference to a blob (no-op for files stored before content addressing)"""
+    if not filename:
+        return
+    table = MediaBlob.__table__
+    db.session.execute(table.update()
+                       .where(table.c.path == blob_path(folder, filename), table.c.ref_count > 0)
+                       .values(ref_count=table.c.ref_count - 1, updated_at=datetime.utcnow()))
+
+
+def save_upload(file, folder, allowed_extensions, replaces=None):
+    """
+    Stage and publish a single upload and count its reference
+
+    The caller stores the returned filename and commits.
+
+    Args:
+        replaces: Filename the upload replaces in the same folder; its
+            reference is released
+
+    Returns:
+        str: The filename if successful, None if the file was missing or invalid
+    """
+    staged = [upload for upload in stage_uploads([(file, folder, allowed_extensions)]) if upload]
+    if not staged:
+        return None
+    filename = publish(staged)[0]
+    add_references(staged)
+    release_reference(folder, replaces)
+    return filename
+
+
+def send_media(folder, filename):
+    """
+    Response for an uploaded file, answering conditional and Range requests
+
+    Content-addressed files never change, so their name is a strong ETag
+    and browsers may cache them for a year without revalidating. Other
+    files get send_file's mtime/size ETag and are revalidated.
+
+    With MEDIA_OFFLOAD set to x-accel-redirect (nginx) or x-sendfile
+    (Apache, lighttpd) only the headers are built here: the front proxy
+    sends the bytes and answers Range requests itself, so a worker is not
+    tied up streaming a video. Conditional requests are still answered
+    with 304 here.
+
+    Raises:
+        NotFound: If the file does not exist or is outside MEDIA_FOLDERS
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(upload_folder, folder, filename) if folder in MEDIA_FOLDERS else None
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    match = IMMUTABLE_PATTERN.match(filename)
+    offload = OFFLOAD_HEADERS.get(current_app.config.get('MEDIA_OFFLOAD', '').lower())
+
+    if offload is None:
+        # send_file handles If-None-Match, If-Modified-Since, Range and If-Range
+        response = send_file(path, etag=match.group(1) if match else True, conditional=True)
+        response.accept_ranges = 'bytes'  # werkzeug only sends it on 206 responses
+    else:
+        stat = os.stat(path)
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if offload == 'X-Accel-Redirect':
+            response.headers[offload] = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/') + \
+                quote(f'/{folder}/{filename}')
+        else:
+            response.headers[offload] = path
+        response.last_modified = stat.st_mtime
+        response.cache_control.no_cache = True
+        response.set_etag(match.group(1) if match else
+                          f'{stat.st_mtime}-{stat.st_size}-{adler32(path.encode()) & 0xFFFFFFFF}')
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            # The proxy would follow the header and send the file after all
+            del response.headers[offload]
+
+    if match:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def reference_columns():
+    """(folder, column, extra filter) for every column that stores an upload filename"""
+    return [
+        ('posts', PostMedia.file_path, PostMedia.media_type == 'image'),
+        ('videos', PostMedia.file_path, PostMedia.media_type == 'video'),
+        ('posts', Post.image_path, None),
+        ('profiles', User.profile_picture, None),
+        ('team_avatars', Team.avatar_path, None),
+        ('branding', SiteSettings.logo_path, None),
+        ('branding', SiteSettings.favicon_path, None),
+        # Finished resumable uploads not yet attached to a post (upload_sessions.py)
+        ('videos', UploadSession.file_path, UploadSession.status == 'complete'),
+    ]
+
+
+def reference_counts():
+    """Actual number of referencing rows per blob path, counted from the referencing columns"""
+    counts = {}
+    for folder, column, condition in reference_columns():
+        query = db.session.query(column, func.count()).filter(column != None)
+        if condition is not None:
+            query = query.filter(condition)
+        for filename, count in query.group_by(column):
+            if BLOB_PATTERN.match(filename):
+                path = blob_path(folder, filename)
+                counts[path] = counts.get(path, 0) + count
+    return counts
+
+
+def recount_references():
+    """
+    Rebuild media_blobs from the referencing columns
+
+    Fixes counts that drifted (e.g. rows removed outside the app). Run it
+    while no uploads are in progress; the caller commits.
+
+    Returns:
+        int: Number of blobs whose count changed
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    counts = reference_counts()
+    blobs = {blob.path: blob for blob in MediaBlob.query}
+    changed = 0
+    now = datetime.utcnow()
+    for path in set(counts) | set(blobs):
+        count = counts.get(path, 0)
+        blob = blobs.get(path)
+        if blob is None:
+            full_path = os.path.join(upload_folder, path)
+            if not os.path.exists(full_path):
+                continue
+            db.session.add(MediaBlob(path=path, size=os.path.getsize(full_path), ref_count=count,
+                                     created_at=now, updated_at=now))
+            changed += 1
+        elif blob.ref_count != count:
+            blob.ref_count = count
+            blob.updated_at = now
+            changed += 1
+    return changed
+
+
+def _blob_files(upload_folder):
+    """Yield (blob path, full path) for every content-addressed file on disk"""
+    for folder in sorted({folder for folder, _, _ in reference_columns()}):
+        root = os.path.join(upload_folder, folder)
+        for dirpath, dirnames, filenames in os.walk(root):
+            if dirpath == root:
+                # Only the ab/cd shards; skip derivatives and legacy flat files
+                dirnames[:] = [name for name in dirnames if re.fullmatch(r'[0-9a-f]{2}', name)]
+            for name in filenames:
+                relative = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+                if BLOB_PATTERN.match(relative):
+                    yield blob_path(folder, relative), os.path.join(dirpath, name)
+
+
+def _remove_blob(upload_folder, path, cutoff):
+    """Delete a blob file and its derivatives unless it was touched after cutoff; returns bytes freed"""
+    from derivatives import derivative_files
+    full_path = os.path.join(upload_folder, path)
+    try:
+        if datetime.utcfromtimestamp(os.path.getmtime(full_path)) > cutoff:
+            return 0
+        size = os.path.getsize(full_path)
+    except FileNotFoundError:
+        return 0
+    folder, filename = path.split('/', 1)
+    for derivative in derivative_files(os.path.join(upload_folder, folder), filename):
+        remove_file(derivative)
+    remove_file(full_path)
+    return size
+
+
+def collect_garbage(grace_period=GC_GRACE_PERIOD):
+    """
+    Delete blobs that no row references
+
+    A blob is removed when its media_blobs count is zero (and no column
+    actually references it) or when it has no media_blobs row at all,
+    e.g. it was published by a request whose transaction then failed.
+    Either way it must have been untouched for the grace period.
+
+    Returns:
+        tuple: (blobs removed, bytes freed)
+    """
+    from derivatives import remove_orphaned_derivatives
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    cutoff = datetime.utcnow() - grace_period
+    counts = reference_counts()
+    table = MediaBlob.__table__
+
+    unreferenced = [path for (path,) in db.session.query(MediaBlob.path)
+                    .filter(MediaBlob.ref_count <= 0, MediaBlob.updated_at < cutoff)]
+    removed = []
+    for path in unreferenced:
+        if counts.get(path):
+            continue  # count drifted; left for recount_references()
+        # Conditional delete: a concurrent upload may have referenced it meanwhile
+        result = db.session.execute(table.delete().where(table.c.path == path, table.c.ref_count <= 0))
+        if result.rowcount:
+            removed.append(path)
+    db.session.commit()
+
+    freed = sum(_remove_blob(upload_folder, path, cutoff) for path in removed)
+    known = {path for (path,) in db.session.query(MediaBlob.path)}
+    orphans = [path for path, _ in _blob_files(upload_folder) if path not in known and not counts.get(path)]
+    freed += sum(_remove_blob(upload_folder, path, cutoff) for path in orphans)
+    freed += remove_orphaned_derivatives(upload_folder, cutoff)
+    return len(removed) + len(orphans), freed
+
+
+def _sweep_stale(upload_folder):
+    """Delete staged files abandoned by a crashed worker, at most once per STALE_STAGED_AGE"""
+    global _next_sweep
+    now = time.time()
+    if now < _next_sweep:
+        return
+    _next_sweep = now + STALE_STAGED_AGE
+    staging_dir = os.path.join(upload_folder, STAGING_FOLDER)
+    if not os.path.isdir(staging_dir):
+        return
+    for entry in os.scandir(staging_dir):
+        try:
+            if entry.name.endswith(STAGED_SUFFIX) and now - entry.stat().st_mtime > STALE_STAGED_AGE:
+                remove_file(entry.path)
+        except OSError:
+            continue
+
+
+if __name__ == '__main__':
+    from app import app
+    from upload_sessions import expire_sessions
+    with app.app_context():
+        expired_count = expire_sessions()
+        print(f"✓ Expired {expired_count} abandoned upload sessions")
+        if '--recount' in sys.argv[1:]:
+            changed_count = recount_references()
+            db.session.commit()
+            print(f"✓ Recounted media references ({changed_count} blobs changed)")
+        removed_count, freed_bytes = collect_garbage()
+        print(f"✓ Removed {removed_count} unreferenced media files ({freed_bytes / 1024 / 1024:.1f} MB)")
@@ -1,10 +1,67 @@
 """Database migration script to add new features"""
 import os
+from sqlalchemy import inspect, text
 from app import app, db
+from reactions import rebuild_reaction_counts
+from rerender_comments import rerender_comments
 from models import (User, Team, Post, RegistrationCode, Reaction, Comment, 
                     Mention, Vote, Announcement, PostMedia, Report, AuditLog, SiteSettings)
 
 
+def sync_columns():
+    """
+    Add model columns that an existing table is missing
+    
+    Only suitable for nullable columns, which is how new columns are added.
+    """
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+                    added.append(f'{table.name}.{column.name}')
+    return added
+
+
+# Columns removed from the models; NOT NULL ones would make inserts fail
+OBSOLETE_COLUMNS = [('upload_sessions', 'received')]
+
+
+def drop_obsolete_columns():
+    """Drop columns in OBSOLETE_COLUMNS that an existing table still has"""
+    inspector = inspect(db.engine)
+    dropped = []
+    with db.engine.begin() as connection:
+        for table_name, column_name in OBSOLETE_COLUMNS:
+            if not inspector.has_table(table_name):
+                continue
+            if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+                connection.execute(text(f'ALTER TABLE {table_name} DROP COLUMN {column_name}'))
+                dropped.append(f'{table_name}.{column_name}')
+    return dropped
+
+
+def sync_indexes():
+    """Create indexes declared on the models that an existing database is missing"""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
 def migrate_database():
     """Run database migrations for new features"""
     with app.app_context():
@@ -14,6 +71,22 @@ def migrate_database():
         db.create_all()
         print("✓ All tables created/updated")
         
+        # create_all() skips columns and indexes on tables that already exist
+        for column_name in sync_columns():
+            print(f"✓ Column {column_name} added")
+        for column_name in drop_obsolete_columns():
+            print(f"✓ Column {column_name} dropped")
+        for index_name in sync_indexes():
+            print(f"✓ Index {index_name} created")
+        
+        # Backfill (or repair) the denormalized reaction counters
+        rebuilt = rebuild_reaction_counts()
+        print(f"✓ Reaction counters rebuilt for {rebuilt} post/reaction pairs")
+        
+        # Render stored HTML for comments written before content_html existed
+        rendered = rerender_comments()
+        print(f"✓ Rendered HTML for {rendered} comments")
+        
         # Create default site settings if not exist
         site_settings = SiteSettings.query.first()
         if not site_settings:
@@ -57,6 +130,14 @@ def migrate_database():
         print("  - Social links")
         print("  - Team avatars")
         print("  - Branding/theming system")
+        print("  - Paginated timelines")
+        print("  - Denormalized reaction counters")
+        print("  - Pre-rendered comment HTML")
+        print("  - Audit log archival and daily rollups (run audit_archive.py)")
+        print("  - Resized post image copies (run derivatives.py for existing images)")
+        print("  - Deduplicated upload storage (run migrate_uploads.py once)")
+        print("  - Resumable chunked video uploads")
+        print("  - Cached media serving with Range support (/media)")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,103 @@
+"""Move existing uploads into content-addressed storage and count their references"""
+import os
+import shutil
+import hashlib
+from app import app
+from models import db, MediaBlob, Post, PostMedia
+import media
+from derivatives import DERIVATIVE_FOLDER, derivative_files
+
+
+def file_digest(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(media.COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, destination):
+    """Place a copy of source at destination atomically (hard link when possible)"""
+    if os.path.exists(destination):
+        return
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    tmp_path = destination + '.tmp'
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def migrate_file(folder_path, filename):
+    """
+    Copy one legacy upload (and its derivatives) to its content-addressed name
+
+    Returns:
+        tuple: (new filename, legacy paths to delete once the database points
+        at the new name)
+    """
+    source = os.path.join(folder_path, filename)
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+    new_filename = media.content_filename(file_digest(source), ext)
+    link_or_copy(source, os.path.join(folder_path, new_filename))
+
+    legacy_paths = [source]
+    stem = os.path.join(folder_path, DERIVATIVE_FOLDER, filename.rsplit('.', 1)[0])
+    new_stem = os.path.join(folder_path, DERIVATIVE_FOLDER, new_filename.rsplit('.', 1)[0])
+    for path in derivative_files(folder_path, filename):
+        link_or_copy(path, new_stem + path[len(stem):])  # keeps the _<width>w.<ext> suffix
+        legacy_paths.append(path)
+    return new_filename, legacy_paths
+
+
+def migrate_uploads():
+    """Rename every referenced legacy upload, then rebuild media_blobs"""
+    with app.app_context():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        renamed = {}  # (folder, legacy filename) -> new filename
+        legacy_paths = []
+        missing = 0
+
+        for folder, column, condition in media.reference_columns():
+            query = db.session.query(column).filter(column != None).distinct()
+            if condition is not None:
+                query = query.filter(condition)
+            for (filename,) in query.all():
+                if media.BLOB_PATTERN.match(filename):
+                    continue
+                key = (folder, filename)
+                if key not in renamed:
+                    if not os.path.exists(os.path.join(upload_folder, folder, filename)):
+                        missing += 1
+                        continue
+                    renamed[key], paths = migrate_file(os.path.join(upload_folder, folder), filename)
+                    legacy_paths.extend(paths)
+                column.class_.query.filter(column == filename) \
+                    .update({column.key: renamed[key]}, synchronize_session=False)
+        print(f"✓ Copied {len(renamed)} uploads to content-addressed storage")
+        if missing:
+            print(f"ℹ {missing} referenced files were missing and kept their names")
+
+        changed = media.recount_references()
+        # Blobs remember their derivatives so identical re-uploads reuse them
+        for column, widths in ((PostMedia.file_path, PostMedia.derivative_widths),
+                               (Post.image_path, Post.image_derivative_widths)):
+            for filename, value in db.session.query(column, widths).filter(widths != None):
+                MediaBlob.query.filter_by(path=media.blob_path('posts', filename)) \
+                    .update({'derivative_widths': value}, synchronize_session=False)
+        db.session.commit()
+        print(f"✓ Reference counts rebuilt ({changed} blobs updated)")
+
+        # Only now that the database points at the new names
+        for path in legacy_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        print(f"✓ Removed {len(legacy_paths)} legacy files")
+
+
+if __name__ == '__main__':
+    migrate_uploads()
@@ -6,6 +6,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Emoji reactions available on posts, in display order
+REACTION_TYPES = ['like', 'love', 'celebrate', 'idea', 'fire', 'applause']
+
 
 class User(UserMixin, db.Model):
     """User model for authentication and profile management"""
@@ -79,6 +82,7 @@ class Post(db.Model):
     team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_path = db.Column(db.String(255), nullable=True)
+    image_derivative_widths = db.Column(db.String(64), nullable=True)  # widths of resized copies, see derivatives.py
     is_global = db.Column(db.Boolean, default=False, nullable=False)
     is_hidden = db.Column(db.Boolean, default=False, nullable=False)
     deleted_at = db.Column(db.DateTime, nullable=True)
@@ -88,11 +92,19 @@ class Post(db.Model):
     user = db.relationship('User', back_populates='posts')
     team = db.relationship('Team', back_populates='posts')
     reactions = db.relationship('Reaction', back_populates='post', cascade='all, delete-orphan')
+    reaction_counts = db.relationship('PostReactionCount', back_populates='post', cascade='all, delete-orphan')
     comments = db.relationship('Comment', back_populates='post', cascade='all, delete-orphan')
     mentions = db.relationship('Mention', back_populates='post', cascade='all, delete-orphan')
     media = db.relationship('PostMedia', back_populates='post', cascade='all, delete-orphan')
     reports = db.relationship('Report', back_populates='post', cascade='all, delete-orphan')
     
+    # Composite indexes backing the (created_at, id) keyset pagination of each feed
+    __table_args__ = (
+        db.Index('ix_posts_global_feed', 'is_global', 'created_at', 'id'),
+        db.Index('ix_posts_team_feed', 'team_id', 'created_at', 'id'),
+        db.Index('ix_posts_user_feed', 'user_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Post {self.id} by {self.user_id}>'
 
@@ -110,6 +122,12 @@ class RegistrationCode(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='registration_code')
     
+    # Back the admin code list (newest first, optionally by used/unused)
+    __table_args__ = (
+        db.Index('ix_registration_codes_created', 'created_at', 'id'),
+        db.Index('ix_registration_codes_used', 'is_used', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<RegistrationCode {self.code}>'
 
@@ -135,6 +153,21 @@ class Reaction(db.Model):
         return f'<Reaction {self.reaction_type} by {self.user_id} on {self.post_id}>'
 
 
+class PostReactionCount(db.Model):
+    """Denormalized per-post reaction totals, maintained on every reaction write"""
+    __tablename__ = 'post_reaction_counts'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True)
+    reaction_type = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Relationships
+    post = db.relationship('Post', back_populates='reaction_counts')
+    
+    def __repr__(self):
+        return f'<PostReactionCount {self.reaction_type}={self.count} on {self.post_id}>'
+
+
 class Comment(db.Model):
     """Comment model for post comments"""
     __tablename__ = 'comments'
@@ -142,7 +175,9 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(db.Text, nullable=False)  # Raw text as written
+    content_html = db.Column(db.Text, nullable=True)  # Rendered once at write time
+    content_html_version = db.Column(db.Integer, nullable=True)  # Renderer version; NULL = legacy row
     deleted = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
@@ -198,6 +233,17 @@ class Vote(db.Model):
     # Unique constraint: one vote per judge per team
     __table_args__ = (db.UniqueConstraint('judge_id', 'team_id', name='unique_vote'),)
     
+    @classmethod
+    def total_score_expression(cls):
+        """
+        SQL expression for calculate_total_score
+        
+        The 30/30/20/20 weights scaled to 100 are integers (3/3/2/2), so
+        sums of it aggregate exactly.
+        """
+        return (cls.innovation_score * 3 + cls.implementation_score * 3 +
+                cls.design_score * 2 + cls.presentation_score * 2)
+    
     def calculate_total_score(self):
         """Calculate weighted total score"""
         return (
@@ -239,6 +285,7 @@ class PostMedia(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
     media_type = db.Column(db.String(10), nullable=False)  # image or video
     file_path = db.Column(db.String(255), nullable=False)
+    derivative_widths = db.Column(db.String(64), nullable=True)  # widths of resized copies, see derivatives.py
     display_order = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
@@ -285,10 +332,29 @@ class AuditLog(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='audit_logs')
     
+    # Keyset pagination of the admin viewer, unfiltered and by each filter
+    __table_args__ = (
+        db.Index('ix_audit_logs_created', 'created_at', 'id'),
+        db.Index('ix_audit_logs_action', 'action_type', 'created_at', 'id'),
+        db.Index('ix_audit_logs_user', 'user_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<AuditLog {self.action_type} by {self.user_id}>'
 
 
+class AuditLogRollup(db.Model):
+    """Per-day, per-action counts of audit log rows that have been archived"""
+    __tablename__ = 'audit_log_rollups'
+    
+    day = db.Column(db.Date, primary_key=True)
+    action_type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<AuditLogRollup {self.day} {self.action_type}={self.count}>'
+
+
 class SiteSettings(db.Model):
     """SiteSettings model for site-wide branding and customization (singleton)"""
     __tablename__ = 'site_settings'
@@ -309,3 +375,56 @@ class SiteSettings(db.Model):
     
     def __repr__(self):
         return f'<SiteSettings {self.site_name}>'
+
+
+class MediaBlob(db.Model):
+    """
+    Content-addressed upload file and the number of rows referencing it
+    
+    path is '<folder>/ab/cd/<sha256>.<ext>' relative to UPLOAD_FOLDER (see
+    media.py). Blobs whose count has dropped to zero are deleted by the
+    media garbage collector.
+    """
+    __tablename__ = 'media_blobs'
+    
+    path = db.Column(db.String(255), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    derivative_widths = db.Column(db.String(64), nullable=True)  # rendered copies, see derivatives.py
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_media_blobs_unreferenced', 'ref_count', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<MediaBlob {self.path} refs={self.ref_count}>'
+
+
+class UploadSession(db.Model):
+    """
+    Resumable chunked upload of a large video (see upload_sessions.py)
+    
+    Chunks are appended to a staging file until the upload is finalized;
+    the finished file is then moved into content-addressed storage and the
+    session holds one media_blobs reference to it until a post claims it.
+    """
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # random hex token
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)  # name on the client, for its extension
+    size = db.Column(db.BigInteger, nullable=False)  # declared when the upload starts
+    sha256 = db.Column(db.String(64), nullable=True)  # expected checksum, if the client sent one
+    status = db.Column(db.String(20), default='uploading', nullable=False)  # uploading, complete, attached
+    file_path = db.Column(db.String(255), nullable=True)  # content-addressed filename once complete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_upload_sessions_status_updated', 'status', 'updated_at'),
+    )
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.status} {self.size}>'
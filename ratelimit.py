@@ -0,0 +1,281 @@
+"""Token-bucket rate limiting with timing-wheel expiry of idle clients"""
+import os
+import math
+import sqlite3
+import threading
+import time
+from limits.storage import Storage
+
+# Granularity of the expiry wheel; idle buckets are dropped at most this late
+WHEEL_RESOLUTION = 1.0  # seconds
+
+
+class TokenBucketLimiter:
+    """
+    In-process token buckets keyed by client and action
+
+    Each key holds `capacity` tokens that refill continuously at
+    capacity / period tokens per second, so a client can burst up to its
+    limit but never exceed it over any window (no fixed-window edge
+    bursts). A bucket that has refilled completely is indistinguishable
+    from a new one, so it is scheduled on a timing wheel for that moment
+    and dropped then. Each check does O(1) work plus, amortized, O(1)
+    expiry work; nothing ever scans all clients.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, updated_at, expires_at, wheel slot]
+        self._wheel = {}  # slot -> [key, ...]
+        self._cursor = None  # next wheel slot to sweep
+
+    def hit(self, key, capacity, period):
+        """
+        Take one token for key
+
+        Args:
+            key: Client/action identifier
+            capacity: Maximum requests in a burst (and per period)
+            period: Seconds to refill the bucket from empty
+
+        Returns:
+            tuple: (allowed, retry_after) where retry_after is the number of
+            seconds until a token is available (0 when allowed)
+        """
+        rate = capacity / period
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            retry_after = 0 if allowed else (1 - tokens) / rate
+
+            expires_at = now + (capacity - tokens) / rate
+            slot = self._slot(expires_at) + 1  # swept once the whole slot has passed
+            if bucket is None:
+                self._buckets[key] = [tokens, now, expires_at, slot]
+                self._wheel.setdefault(slot, []).append(key)
+            else:
+                if slot != bucket[3]:
+                    # The entry left in the old slot goes stale and is skipped
+                    self._wheel.setdefault(slot, []).append(key)
+                bucket[:] = [tokens, now, expires_at, slot]
+            return allowed, retry_after
+
+    def _slot(self, timestamp):
+        return math.floor(timestamp / WHEEL_RESOLUTION)
+
+    def _expire(self, now):
+        """Sweep wheel slots that have passed, dropping buckets that are now full"""
+        current = self._slot(now)
+        if self._cursor is None:
+            self._cursor = current
+        if current - self._cursor > len(self._wheel):
+            # Long idle gap: visit only occupied slots instead of every empty one
+            slots = sorted(slot for slot in self._wheel if slot <= current)
+        else:
+            slots = range(self._cursor, current + 1)
+        for slot in slots:
+            for key in self._wheel.pop(slot, ()):
+                bucket = self._buckets.get(key)
+                # Skip stale entries: the bucket was used again after this was scheduled
+                if bucket is not None and bucket[2] <= now:
+                    del self._buckets[key]
+        self._cursor = current + 1
+
+    def reset(self, key=None):
+        """Forget one key, or every key"""
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+                self._wheel.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteStore:
+    """
+    Connection handling for rate-limit state kept in a SQLite (WAL) file
+
+    Every worker process opens the same file, so limits hold across the
+    whole deployment without an external service. Connections are per
+    thread and per process (never shared across a fork).
+    """
+
+    # How often each process deletes expired rows (via the expires_at index)
+    PURGE_INTERVAL = 60  # seconds
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self):
+        """
+        Connection with a write transaction open (BEGIN IMMEDIATE)
+
+        Taking the write lock up front serializes read-modify-write cycles
+        across processes instead of failing them on upgrade.
+        """
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        return connection
+
+    def _maybe_purge(self, connection, table, now):
+        """Delete expired rows at most once per PURGE_INTERVAL (caller holds the transaction)"""
+        if now >= self._next_purge:
+            connection.execute(f'DELETE FROM {table} WHERE expires_at <= ?', (now,))
+            self._next_purge = now + self.PURGE_INTERVAL
+
+
+class SQLiteTokenBucketLimiter(SQLiteStore):
+    """TokenBucketLimiter with its buckets shared by all processes through SQLite"""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+        'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_expires ON rate_limit_buckets (expires_at)',
+    )
+
+    def hit(self, key, capacity, period):
+        """Take one token for key; same contract as TokenBucketLimiter.hit"""
+        rate = capacity / period
+        now = time.time()  # wall clock: shared between processes
+        connection = self._transaction()
+        try:
+            self._maybe_purge(connection, 'rate_limit_buckets', now)
+            row = connection.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?',
+                                     (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0, now - row[1]) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            retry_after = 0 if allowed else (1 - tokens) / rate
+
+            connection.execute(
+                'INSERT INTO rate_limit_buckets (key, tokens, updated_at, expires_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, '
+                'updated_at = excluded.updated_at, expires_at = excluded.expires_at',
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+    def reset(self, key=None):
+        """Forget one key, or every key"""
+        connection = self._connect()
+        if key is None:
+            connection.execute('DELETE FROM rate_limit_buckets')
+        else:
+            connection.execute('DELETE FROM rate_limit_buckets WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM rate_limit_buckets').fetchone()[0]
+
+
+class SQLiteLimitsStorage(SQLiteStore, Storage):
+    """
+    Flask-Limiter (limits) storage backend on the shared SQLite file
+
+    Registered for storage_uri="sqlite:///<path>"; supports the default
+    fixed-window strategy.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS rate_limit_counters ('
+        'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_rate_limit_counters_expires ON rate_limit_counters (expires_at)',
+    )
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        Storage.__init__(self, uri, wrap_exceptions=wrap_exceptions, **options)
+        SQLiteStore.__init__(self, uri[len('sqlite:///'):])
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        """
+        Add amount to key's counter and return the new count
+
+        elastic_expiry (passed by limits 3.x) restarts the window on every
+        hit; limits 4 and later never pass it.
+        """
+        now = time.time()
+        connection = self._transaction()
+        try:
+            self._maybe_purge(connection, 'rate_limit_counters', now)
+            # A counter whose window has ended starts over
+            count = connection.execute(
+                'INSERT INTO rate_limit_counters (key, count, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, '
+                'expires_at = CASE WHEN expires_at <= ? OR ? THEN excluded.expires_at ELSE expires_at END '
+                'RETURNING count',
+                (key, amount, now + expiry, now, now, bool(elastic_expiry))
+            ).fetchone()[0]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return count
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT count FROM rate_limit_counters WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT expires_at FROM rate_limit_counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connect().execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connect().execute('DELETE FROM rate_limit_counters').rowcount
+
+    def clear(self, key):
+        self._connect().execute('DELETE FROM rate_limit_counters WHERE key = ?', (key,))
@@ -0,0 +1,137 @@
+"""Reaction writes and maintained reaction counters for posts"""
+from collections import defaultdict
+from sqlalchemy import func
+from models import db, Reaction, PostReactionCount, REACTION_TYPES
+from utils import upsert
+
+
+def adjust_reaction_count(post_id, reaction_type, delta):
+    """
+    Atomically add delta to a post's counter for one reaction type
+    
+    Runs inside the caller's transaction, so the counter commits (or rolls
+    back) together with the Reaction row it accounts for.
+    """
+    table = PostReactionCount.__table__
+    if delta > 0:
+        stmt = upsert(table).values(post_id=post_id, reaction_type=reaction_type, count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.post_id, table.c.reaction_type],
+            set_={'count': table.c.count + stmt.excluded.count}
+        )
+    else:
+        stmt = (table.update()
+                .where(table.c.post_id == post_id, table.c.reaction_type == reaction_type)
+                .values(count=table.c.count + delta))
+    db.session.execute(stmt)
+
+
+def add_reaction(post_id, user_id, reaction_type):
+    """
+    Insert a reaction unless it already exists (INSERT ... ON CONFLICT DO NOTHING)
+    
+    Returns True only if this call created the row, so concurrent or
+    retried requests never hit the unique constraint or double count.
+    """
+    table = Reaction.__table__
+    stmt = (upsert(table)
+            .values(post_id=post_id, user_id=user_id, reaction_type=reaction_type)
+            .on_conflict_do_nothing(index_elements=[table.c.post_id, table.c.user_id,
+                                                    table.c.reaction_type])
+            .returning(table.c.id))
+    created = db.session.execute(stmt).first() is not None
+    if created:
+        adjust_reaction_count(post_id, reaction_type, 1)
+    return created
+
+
+def remove_reaction(post_id, user_id, reaction_type):
+    """Delete a reaction if present (DELETE ... RETURNING); returns True if this call removed it"""
+    table = Reaction.__table__
+    stmt = (table.delete()
+            .where(table.c.post_id == post_id,
+                   table.c.user_id == user_id,
+                   table.c.reaction_type == reaction_type)
+            .returning(table.c.id))
+    removed = db.session.execute(stmt).first() is not None
+    if removed:
+        adjust_reaction_count(post_id, reaction_type, -1)
+    return removed
+
+
+def set_reaction(post_id, user_id, reaction_type, active=None):
+    """
+    Set or toggle a user's reaction on a post and commit
+    
+    Args:
+        active: True/False to set the reaction state explicitly (idempotent,
+            safe for client retries), or None to toggle it
+    
+    Returns:
+        str: 'added', 'removed' or 'unchanged'
+    """
+    if active is None:
+        if remove_reaction(post_id, user_id, reaction_type):
+            action = 'removed'
+        else:
+            action = 'added' if add_reaction(post_id, user_id, reaction_type) else 'unchanged'
+    elif active:
+        action = 'added' if add_reaction(post_id, user_id, reaction_type) else 'unchanged'
+    else:
+        action = 'removed' if remove_reaction(post_id, user_id, reaction_type) else 'unchanged'
+    db.session.commit()
+    return action
+
+
+def get_reaction_counts(post_ids):
+    """Return {post_id: {reaction_type: count}} read from the maintained counters"""
+    counts = defaultdict(dict)
+    if not post_ids:
+        return counts
+    for row in PostReactionCount.query.filter(PostReactionCount.post_id.in_(post_ids)):
+        counts[row.post_id][row.reaction_type] = row.count
+    return counts
+
+
+def get_viewer_reactions(post_ids, user_id):
+    """Return the set of (post_id, reaction_type) pairs the user has reacted with"""
+    if not post_ids:
+        return set()
+    return set(
+        db.session.query(Reaction.post_id, Reaction.reaction_type)
+        .filter(Reaction.user_id == user_id, Reaction.post_id.in_(post_ids))
+    )
+
+
+def summarize_reactions(counts, reacted_types):
+    """Build the {reaction_type: {'count', 'user_reacted'}} mapping used by templates and the API"""
+    return {
+        rtype: {
+            'count': counts.get(rtype, 0),
+            'user_reacted': rtype in reacted_types
+        }
+        for rtype in REACTION_TYPES
+    }
+
+
+def get_reaction_summary(post_id, user_id):
+    """Reaction summary for one post in two queries: its counters and the user's reactions"""
+    counts = get_reaction_counts([post_id])[post_id]
+    reacted_types = {rtype for _, rtype in get_viewer_reactions([post_id], user_id)}
+    return summarize_reactions(counts, reacted_types)
+
+
+def rebuild_reaction_counts():
+    """Recompute every counter from the reactions table; returns the number of rows written"""
+    table = PostReactionCount.__table__
+    db.session.execute(table.delete())
+    totals = (db.session.query(Reaction.post_id, Reaction.reaction_type, func.count(Reaction.id))
+              .group_by(Reaction.post_id, Reaction.reaction_type)
+              .all())
+    if totals:
+        db.session.execute(table.insert(), [
+            {'post_id': post_id, 'reaction_type': reaction_type, 'count': count}
+            for post_id, reaction_type, count in totals
+        ])
+    db.session.commit()
+    return len(totals)
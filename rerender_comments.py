@@ -0,0 +1,54 @@
+"""Re-render stored comment HTML after the mention/formatting rules change"""
+import sys
+import html
+from sqlalchemy import or_
+from app import app, db
+from models import Comment
+from utils import render_comment, COMMENT_RENDER_VERSION
+
+
+def legacy_comment_text(content):
+    """Recover the raw text of a comment stored before content_html existed (pre-escaped)"""
+    return html.unescape(content.replace('<br>', '\n'))
+
+
+def rerender_comments(batch_size=500, force=False):
+    """
+    Re-render content_html for comments produced by an older renderer
+    
+    Args:
+        batch_size: Number of comments to update per transaction
+        force: Re-render every comment, regardless of its version
+    
+    Returns:
+        int: Number of comments re-rendered
+    """
+    query = Comment.query
+    if not force:
+        query = query.filter(or_(Comment.content_html_version == None,
+                                 Comment.content_html_version < COMMENT_RENDER_VERSION))
+    
+    total = 0
+    last_id = 0
+    while True:
+        batch = query.filter(Comment.id > last_id).order_by(Comment.id).limit(batch_size).all()
+        if not batch:
+            break
+        
+        for comment in batch:
+            if comment.content_html_version is None:
+                comment.content = legacy_comment_text(comment.content)
+            comment.content_html = render_comment(comment.content)
+            comment.content_html_version = COMMENT_RENDER_VERSION
+        
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    
+    return total
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        count = rerender_comments(force='--all' in sys.argv)
+        print(f"✓ Re-rendered {count} comments (renderer version {COMMENT_RENDER_VERSION})")
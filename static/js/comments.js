@@ -40,12 +40,9 @@ function submitComment(postId) {
     });
 }
 
-// Add comment to display
-function addCommentToDisplay(postId, comment) {
-    const commentsContainer = document.querySelector(`#comments-${postId}`);
-    if (!commentsContainer) return;
-    
-    const commentHtml = `
+// Build the HTML for a single comment
+function renderComment(comment) {
+    return `
         <div class="comment" id="comment-${comment.id}">
             <img src="${comment.user.profile_picture || '/static/uploads/profiles/default.png'}" 
                  alt="${comment.user.username}" class="comment-avatar">
@@ -63,8 +60,14 @@ function addCommentToDisplay(postId, comment) {
             ` : ''}
         </div>
     `;
+}
+
+// Add comment to display
+function addCommentToDisplay(postId, comment) {
+    const commentsContainer = document.querySelector(`#comments-${postId}`);
+    if (!commentsContainer) return;
     
-    commentsContainer.insertAdjacentHTML('beforeend', commentHtml);
+    commentsContainer.insertAdjacentHTML('beforeend', renderComment(comment));
 }
 
 // Delete comment
@@ -113,38 +116,77 @@ function toggleComments(postId) {
     }
 }
 
-// Load comments for a post
-function loadComments(postId) {
-    fetch(`/api/comments/${postId}`)
+// Show or hide the "load more comments" button of a post
+function updateMoreCommentsButton(postId, nextCursor) {
+    const commentsContainer = document.querySelector(`#comments-${postId}`);
+    if (!commentsContainer) return;
+    
+    let button = document.querySelector(`#comments-more-${postId}`);
+    if (!nextCursor) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = `comments-more-${postId}`;
+        button.className = 'comments-toggle';
+        button.textContent = 'Load more comments';
+        commentsContainer.insertAdjacentElement('afterend', button);
+    }
+    button.onclick = () => loadComments(postId, nextCursor);
+}
+
+// Load a page of comments for a post (appending when a cursor is given)
+function loadComments(postId, cursor = null) {
+    const url = cursor
+        ? `/api/comments/${postId}?cursor=${encodeURIComponent(cursor)}`
+        : `/api/comments/${postId}`;
+    
+    fetch(url)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
                 const commentsContainer = document.querySelector(`#comments-${postId}`);
                 if (commentsContainer) {
-                    commentsContainer.innerHTML = data.comments.map(comment => `
-                        <div class="comment" id="comment-${comment.id}">
-                            <img src="${comment.user.profile_picture || '/static/uploads/profiles/default.png'}" 
-                                 alt="${comment.user.username}" class="comment-avatar">
-                            <div class="comment-content">
-                                <div class="comment-header">
-                                    <a href="/user/${comment.user.id}" class="comment-author">${comment.user.username}</a>
-                                    <span class="comment-time">${comment.time_ago}</span>
-                                </div>
-                                <div class="comment-text">${comment.content_html}</div>
-                            </div>
-                            ${comment.can_delete ? `
-                                <button class="comment-delete-btn" onclick="deleteComment(${comment.id})" title="Delete comment">
-                                    🗑️
-                                </button>
-                            ` : ''}
-                        </div>
-                    `).join('');
+                    const html = data.comments.map(renderComment).join('');
+                    if (cursor) {
+                        commentsContainer.insertAdjacentHTML('beforeend', html);
+                    } else {
+                        commentsContainer.innerHTML = html;
+                    }
                 }
+                updateMoreCommentsButton(postId, data.next_cursor);
             }
         })
         .catch(error => console.error('Error loading comments:', error));
 }
 
+// Fill in the comment previews of every post card under root in one request
+function prefetchCommentPreviews(root = document) {
+    const sections = Array.from(root.querySelectorAll('.comments-section'))
+        .filter(section => section.dataset.loaded !== 'true');
+    if (sections.length === 0) return;
+    
+    const postIds = sections.map(section => section.id.replace('comments-section-', ''));
+    
+    fetch(`/api/comments/batch?post_ids=${postIds.join(',')}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+            
+            Object.entries(data.posts).forEach(([postId, preview]) => {
+                const commentsContainer = document.querySelector(`#comments-${postId}`);
+                const commentsSection = document.querySelector(`#comments-section-${postId}`);
+                if (!commentsContainer || !commentsSection) return;
+                
+                commentsContainer.innerHTML = preview.comments.map(renderComment).join('');
+                commentsSection.dataset.loaded = 'true';
+                updateMoreCommentsButton(postId, preview.next_cursor);
+            });
+        })
+        .catch(error => console.error('Error loading comment previews:', error));
+}
+
 // Get CSRF token
 function getCsrfToken() {
     const tokenField = document.querySelector('input[name="csrf_token"]');
@@ -184,5 +226,6 @@ function showToast(message, type = 'info') {
 
 // Initialize comments on page load
 document.addEventListener('DOMContentLoaded', function() {
+    prefetchCommentPreviews();
     console.log('Comments system initialized');
 });
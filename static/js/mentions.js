@@ -1,7 +1,6 @@
 // Mentions System JavaScript (@username autocomplete)
 
-let mentionCache = [];
-let mentionCacheTime = 0;
+const mentionCache = new Map(); // search term -> { users, time }
 const CACHE_DURATION = 60000; // 1 minute
 
 // Initialize mentions autocomplete on textareas
@@ -171,16 +170,16 @@ async function fetchUsers(searchTerm) {
     try {
         // Use cache if recent
         const now = Date.now();
-        if (mentionCache.length > 0 && now - mentionCacheTime < CACHE_DURATION) {
-            return filterUsers(mentionCache, searchTerm);
+        const cached = mentionCache.get(searchTerm);
+        if (cached && now - cached.time < CACHE_DURATION) {
+            return cached.users;
         }
         
         const response = await fetch('/api/users/search?q=' + encodeURIComponent(searchTerm));
         const data = await response.json();
         
         if (data.success) {
-            mentionCache = data.users;
-            mentionCacheTime = now;
+            mentionCache.set(searchTerm, { users: data.users, time: now });
             return data.users;
         }
         return [];
@@ -190,16 +189,6 @@ async function fetchUsers(searchTerm) {
     }
 }
 
-// Filter users by search term
-function filterUsers(users, searchTerm) {
-    if (!searchTerm) return users.slice(0, 10);
-    
-    const term = searchTerm.toLowerCase();
-    return users
-        .filter(user => user.username.toLowerCase().includes(term))
-        .slice(0, 10);
-}
-
 // Close dropdown when clicking outside
 document.addEventListener('click', function(event) {
     const dropdown = document.querySelector('.mention-dropdown');
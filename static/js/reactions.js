@@ -2,6 +2,11 @@
 
 // Toggle reaction on a post
 function toggleReaction(postId, reactionType) {
+    // Send the desired state rather than "toggle" so a retried or
+    // double-clicked request cannot flip the reaction back
+    const button = document.querySelector(`#reactions-${postId} .reaction-btn[title="${reactionType}"]`);
+    const active = button ? !button.classList.contains('active') : undefined;
+    
     fetch(`/api/reaction/${postId}`, {
         method: 'POST',
         headers: {
@@ -9,7 +14,8 @@ function toggleReaction(postId, reactionType) {
             'X-CSRFToken': getCsrfToken()
         },
         body: JSON.stringify({
-            reaction_type: reactionType
+            reaction_type: reactionType,
+            active: active
         })
     })
     .then(response => response.json())
@@ -0,0 +1,64 @@
+// Timeline Pagination JavaScript
+
+// Fetch the next page of a timeline and append its post cards
+function loadMorePosts(button) {
+    if (button.dataset.loading === 'true') return;
+    button.dataset.loading = 'true';
+    button.textContent = 'Loading...';
+    
+    fetch(`${button.dataset.feedUrl}?cursor=${encodeURIComponent(button.dataset.cursor)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showToast(data.message || 'Failed to load posts', 'error');
+                button.textContent = 'Load more posts';
+                return;
+            }
+            
+            const timeline = document.getElementById(button.dataset.target);
+            if (timeline) {
+                timeline.insertAdjacentHTML('beforeend', data.html);
+                if (typeof prefetchCommentPreviews === 'function') {
+                    prefetchCommentPreviews(timeline);
+                }
+            }
+            
+            if (data.next_cursor) {
+                // Keep the no-JS fallback link pointing at the next page too
+                const nextPage = new URL(button.href, window.location.href);
+                nextPage.searchParams.set('cursor', data.next_cursor);
+                button.href = nextPage.toString();
+                button.dataset.cursor = data.next_cursor;
+                button.textContent = 'Load more posts';
+            } else {
+                button.parentElement.remove();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading posts:', error);
+            showToast('Network error occurred', 'error');
+            button.textContent = 'Load more posts';
+        })
+        .finally(() => {
+            button.dataset.loading = 'false';
+        });
+}
+
+// Initialize load more buttons, auto-loading when they scroll into view
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.load-more-btn').forEach(button => {
+        button.addEventListener('click', function(event) {
+            event.preventDefault();
+            loadMorePosts(button);
+        });
+        
+        if ('IntersectionObserver' in window) {
+            const observer = new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting) {
+                    loadMorePosts(button);
+                }
+            }, { rootMargin: '400px' });
+            observer.observe(button);
+        }
+    });
+});
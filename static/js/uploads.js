@@ -0,0 +1,177 @@
+// Resumable Video Upload JavaScript (see upload_sessions.py)
+
+const UPLOAD_RETRY_LIMIT = 8;
+const UPLOAD_MAX_BACKOFF = 30000;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// SHA-256 hex digest of a chunk, or null where WebCrypto is unavailable (plain HTTP)
+async function sha256Hex(buffer) {
+    if (!window.crypto || !window.crypto.subtle) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// Sessions are remembered per file, so choosing the same file after a reload resumes it
+function uploadStorageKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function requestJson(url, options = {}) {
+    const response = await fetch(url, options);
+    let data = {};
+    try {
+        data = await response.json();
+    } catch (error) {
+        // Error pages from a proxy are not JSON
+    }
+    return { status: response.status, ok: response.ok, data };
+}
+
+async function startOrResumeUpload(file, baseUrl, signal) {
+    const savedId = localStorage.getItem(uploadStorageKey(file));
+    if (savedId) {
+        const { ok, data } = await requestJson(`${baseUrl}/${savedId}`, { signal });
+        if (ok) return data.upload;
+    }
+
+    const { ok, data } = await requestJson(baseUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size }),
+        signal
+    });
+    if (!ok) throw new Error(data.message || 'Could not start the upload');
+    localStorage.setItem(uploadStorageKey(file), data.upload.id);
+    return data.upload;
+}
+
+/**
+ * Upload a file in chunks, resuming after dropped connections
+ * @param {File} file - File to upload
+ * @param {string} baseUrl - URL of the upload API
+ * @param {function} onProgress - Called with the fraction uploaded so far
+ * @param {AbortSignal} signal - Aborts the upload
+ * @returns {Promise<string>} Id of the finished upload
+ */
+async function uploadVideo(file, baseUrl, onProgress, signal) {
+    const upload = await startOrResumeUpload(file, baseUrl, signal);
+    let offset = upload.received;
+    let failures = 0;
+
+    while (upload.status === 'uploading' && offset < file.size) {
+        onProgress(offset / file.size);
+        const buffer = await file.slice(offset, offset + upload.chunk_size).arrayBuffer();
+        const headers = { 'Content-Type': 'application/octet-stream' };
+        const digest = await sha256Hex(buffer);
+        if (digest) headers['X-Chunk-SHA256'] = digest;
+
+        try {
+            const { status, ok, data } = await requestJson(`${baseUrl}/${upload.id}?offset=${offset}`, {
+                method: 'PUT', headers, body: buffer, signal
+            });
+            if (ok) {
+                offset = data.received;
+                failures = 0;
+                continue;
+            }
+            if (status === 409 && data.received !== undefined) {
+                // Another attempt got further (or less far) than we thought
+                offset = data.received;
+                continue;
+            }
+            if (status < 500 && status !== 422) {
+                throw new Error(data.message || 'Upload failed');
+            }
+        } catch (error) {
+            // fetch rejects with a TypeError when the network is down
+            if (!(error instanceof TypeError)) throw error;
+        }
+
+        failures += 1;
+        if (failures > UPLOAD_RETRY_LIMIT) {
+            throw new Error('Connection lost. Choose the file again to resume the upload.');
+        }
+        await sleep(Math.min(1000 * 2 ** failures, UPLOAD_MAX_BACKOFF));
+        // The server keeps the part of a chunk that arrived; continue from there
+        const resumed = await requestJson(`${baseUrl}/${upload.id}`, { signal })
+            .catch(error => {
+                if (signal && signal.aborted) throw error;
+                return { ok: false };
+            });
+        if (resumed.ok) offset = resumed.data.upload.received;
+    }
+
+    onProgress(1);
+    const { ok, data } = await requestJson(`${baseUrl}/${upload.id}/complete`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: '{}',
+        signal
+    });
+    if (!ok) {
+        if (data.received === 0) {
+            // The stored data was rejected; start over next time
+            localStorage.removeItem(uploadStorageKey(file));
+        }
+        throw new Error(data.message || 'Upload failed');
+    }
+    localStorage.removeItem(uploadStorageKey(file));
+    return data.upload.id;
+}
+
+// Send videos through the resumable upload API as soon as they are chosen
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[type="file"][data-upload-url]').forEach(input => {
+        const form = input.form;
+        const uploadIdField = form.querySelector('input[name="upload_id"]');
+        const progress = document.getElementById('videoProgress');
+        const status = document.getElementById('videoStatus');
+        const submitButtons = form.querySelectorAll('[type="submit"]');
+        let controller = null;
+
+        input.addEventListener('change', function() {
+            if (controller) controller.abort();
+            uploadIdField.value = '';
+            const file = input.files[0];
+            if (!file) {
+                progress.hidden = true;
+                status.textContent = '';
+                return;
+            }
+
+            const current = controller = new AbortController();
+            progress.hidden = false;
+            progress.value = 0;
+            status.textContent = 'Uploading...';
+            submitButtons.forEach(button => button.disabled = true);
+
+            uploadVideo(file, input.dataset.uploadUrl, fraction => {
+                progress.value = Math.floor(fraction * 100);
+                status.textContent = `Uploading... ${Math.floor(fraction * 100)}%`;
+            }, current.signal)
+                .then(uploadId => {
+                    uploadIdField.value = uploadId;
+                    status.textContent = 'Video uploaded';
+                })
+                .catch(error => {
+                    if (current.signal.aborted) return;
+                    console.error('Error uploading video:', error);
+                    status.textContent = error.message;
+                    showToast(error.message, 'error');
+                })
+                .finally(() => {
+                    if (controller === current) {
+                        submitButtons.forEach(button => button.disabled = false);
+                    }
+                });
+        });
+
+        form.addEventListener('submit', function() {
+            // Already uploaded; don't send the file a second time with the form
+            if (uploadIdField.value) input.disabled = true;
+        });
+    });
+});
@@ -0,0 +1,91 @@
+"""Shared fixtures: the app on a throwaway SQLite database"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix='campfire-tests-')
+# Read by app.py at import time
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_tmp, "test.db")}'
+os.environ['RATE_LIMIT_DB'] = ''
+os.environ['AUDIT_ASYNC'] = 'False'
+
+import pytest
+from sqlalchemy import event
+from app import app as flask_app, limiter
+from models import db, User, Team, Post
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False,
+                            UPLOAD_FOLDER=os.path.join(_tmp, 'uploads'))
+    limiter.enabled = False
+    return flask_app
+
+
+@pytest.fixture
+def database(app):
+    """Empty schema, recreated for every test"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def team_with_posts(database):
+    """A team of three users and 60 posts on the global timeline; returns the team id"""
+    team = Team(name='Team 1')
+    db.session.add(team)
+    db.session.flush()
+    users = []
+    for i in range(3):
+        user = User(username=f'user{i}', team_id=team.id)
+        user.set_password('password')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([Post(user_id=users[i % 3].id, team_id=team.id, description=f'Post {i}', is_global=True)
+                        for i in range(60)])
+    db.session.commit()
+    return team.id
+
+
+@pytest.fixture
+def admin_client(app, database):
+    """Test client logged in as an admin user"""
+    admin = User(username='admin', is_admin=True)
+    admin.set_password('password')
+    db.session.add(admin)
+    db.session.commit()
+    return login(app, 'admin')
+
+
+def login(app, username, password='password'):
+    """Test client logged in as username"""
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    @property
+    def count(self):
+        return len(self.statements)
@@ -0,0 +1,122 @@
+"""The asynchronous audit writer: queueing, flushing, overflow policies and metrics"""
+import os
+import pytest
+import audit
+from audit import AuditWriter
+from models import db, AuditLog
+
+
+@pytest.fixture
+def make_writer(app, database, monkeypatch):
+    """Build an async AuditWriter for the test app; its atexit hooks are collected, not registered"""
+    writers = []
+    shutdown_hooks = []
+    monkeypatch.setattr(audit.atexit, 'register', shutdown_hooks.append)
+
+    def make(**config):
+        config = dict({'AUDIT_ASYNC': True, 'AUDIT_FLUSH_INTERVAL': 0.05}, **config)
+        for key, value in config.items():
+            monkeypatch.setitem(app.config, key, value)
+        writer = AuditWriter()
+        writer.init_app(app)
+        writer.shutdown_hooks = shutdown_hooks
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.shutdown()
+
+
+def stored_count():
+    db.session.commit()  # end the read transaction so rows from other connections show
+    return AuditLog.query.count()
+
+
+def submit(writer, count, action_type='test_action'):
+    for i in range(count):
+        writer.submit(1, action_type, {'n': i}, '127.0.0.1')
+
+
+def test_queued_rows_are_written_by_the_flusher(make_writer):
+    writer = make_writer()
+    submit(writer, 25)
+
+    assert writer.flush()
+    assert stored_count() == 25
+    stats = writer.stats()
+    assert stats['async'] and stats['enqueued'] == 25 and stats['written'] == 25
+    assert 1 <= stats['batches'] <= 25
+    assert stats['queue_depth'] == 0 and stats['failed'] == 0
+
+
+def test_rows_are_written_in_batches(make_writer):
+    writer = make_writer(AUDIT_BATCH_SIZE=10)
+    writer._ensure_started = lambda: None  # hold the rows in the queue
+    submit(writer, 25)
+
+    assert writer.flush()  # no flusher in this process: drained synchronously
+    assert stored_count() == 25
+    assert writer.stats()['batches'] == 3
+
+
+def test_shutdown_writes_everything_queued_and_stops_the_flusher(make_writer):
+    writer = make_writer()
+    submit(writer, 10)
+    thread = writer._thread
+    assert thread.is_alive()
+
+    writer.shutdown()
+    assert not thread.is_alive()
+    assert stored_count() == 10
+    assert writer.shutdown in writer.shutdown_hooks
+
+
+def test_sync_overflow_writes_from_the_request_thread(make_writer):
+    writer = make_writer(AUDIT_QUEUE_SIZE=2, AUDIT_OVERFLOW_POLICY='sync')
+    writer._ensure_started = lambda: None
+    submit(writer, 5)
+
+    stats = writer.stats()
+    assert stats['enqueued'] == 2 and stats['overflow_sync_writes'] == 3 and stats['dropped'] == 0
+    assert stats['max_queue_depth'] == 2
+    assert stored_count() == 3  # the overflow, written at once
+    writer.flush()
+    assert stored_count() == 5
+
+
+def test_drop_overflow_discards_and_counts(make_writer):
+    writer = make_writer(AUDIT_QUEUE_SIZE=2, AUDIT_OVERFLOW_POLICY='drop')
+    writer._ensure_started = lambda: None
+    submit(writer, 5)
+
+    stats = writer.stats()
+    assert stats['enqueued'] == 2 and stats['dropped'] == 3 and stats['overflow_sync_writes'] == 0
+    writer.flush()
+    assert stored_count() == 2
+
+
+def test_unknown_overflow_policy_is_rejected(make_writer):
+    with pytest.raises(ValueError):
+        make_writer(AUDIT_OVERFLOW_POLICY='block')
+
+
+def test_flusher_is_restarted_after_a_fork(make_writer):
+    writer = make_writer()
+    writer._ensure_started = lambda: None
+    submit(writer, 3)
+    del writer._ensure_started
+
+    # As seen by a forked child: the parent's flusher and queued rows are not its own
+    writer._pid = -1
+    submit(writer, 1)
+    assert writer._pid == os.getpid() and writer._thread.is_alive()
+    assert writer.flush()
+    assert stored_count() == 1
+
+
+def test_disabled_writer_writes_synchronously(make_writer):
+    writer = make_writer(AUDIT_ASYNC=False)
+    submit(writer, 2)
+    assert writer._thread is None
+    assert stored_count() == 2
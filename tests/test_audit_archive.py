@@ -0,0 +1,67 @@
+"""Audit log retention: archiving old days and reading them back through the admin viewer"""
+from datetime import datetime, timedelta
+import pytest
+from audit_archive import archive_audit_logs, archived_days, read_archived_logs
+from models import db, AuditLog, AuditLogRollup
+
+OLD_DAY = (datetime.utcnow() - timedelta(days=200)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def archive_folder(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'AUDIT_ARCHIVE_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def add_logs():
+    """Three logs on OLD_DAY (two sharing a timestamp) and one recent log"""
+    rows = [
+        AuditLog(action_type='old_action', action_details='archived-1', created_at=OLD_DAY),
+        AuditLog(action_type='old_action', action_details='archived-2', created_at=OLD_DAY),
+        AuditLog(action_type='other_action', action_details='archived-3', created_at=OLD_DAY + timedelta(hours=1)),
+        AuditLog(action_type='old_action', action_details='live-1', created_at=datetime.utcnow()),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+
+
+def test_archive_moves_old_days_to_partitions(archive_folder, admin_client):
+    add_logs()
+
+    assert archive_audit_logs(retention_days=90) == (1, 3)
+    assert archived_days() == [OLD_DAY.date()]
+    assert AuditLog.query.filter(AuditLog.action_details.like('archived-%')).count() == 0
+    assert AuditLog.query.filter_by(action_details='live-1').count() == 1
+    rollups = {rollup.action_type: rollup.count for rollup in AuditLogRollup.query}
+    assert rollups == {'old_action': 2, 'other_action': 1}
+
+    logs = list(read_archived_logs())
+    assert [log.action_details for log in logs] == ['archived-3', 'archived-2', 'archived-1']
+    assert [log.action_details for log in read_archived_logs(action_type='old_action')] == \
+        ['archived-2', 'archived-1']
+
+    # Nothing left to archive; a rerun changes nothing
+    assert archive_audit_logs(retention_days=90) == (0, 0)
+    assert len(list(read_archived_logs())) == 3
+
+
+def test_admin_viewer_and_export_read_archived_days(archive_folder, admin_client):
+    add_logs()
+    archive_audit_logs(retention_days=90)
+
+    live = admin_client.get('/admin/audit-logs').data.decode()
+    assert 'live-1' in live and 'archived-1' not in live
+
+    archived = admin_client.get('/admin/audit-logs?archived=1').data.decode()
+    assert all(f'archived-{i}' in archived for i in (1, 2, 3))
+    assert 'live-1' not in archived
+    day = OLD_DAY.strftime('%Y-%m-%d')
+    filtered = admin_client.get(f'/admin/audit-logs?archived=1&action_type=other_action&start={day}&end={day}')
+    assert 'archived-3' in filtered.data.decode() and 'archived-1' not in filtered.data.decode()
+
+    export = admin_client.get('/admin/audit-logs/export?archived=1').data.decode()
+    assert all(marker in export for marker in ('archived-1', 'archived-2', 'archived-3', 'live-1'))
+    assert 'archived-1' not in admin_client.get('/admin/audit-logs/export').data.decode()
+
+    counts = admin_client.get(f'/admin/audit-logs/rollup?start={day}&end={day}').get_json()['counts']
+    assert {(row['action_type'], row['count']) for row in counts} == {('old_action', 2), ('other_action', 1)}
@@ -0,0 +1,106 @@
+"""Comment pagination by keyset cursor and the batched comment previews"""
+from datetime import datetime, timedelta
+from conftest import login
+from models import db, Team, Post, Comment, User
+
+STAMP = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def add_comments(post_id, stamps):
+    """One comment per created_at in stamps; returns their ids in display order"""
+    user_id = User.query.first().id
+    comments = [Comment(post_id=post_id, user_id=user_id, content=f'Comment {i}',
+                        content_html=f'<p>Comment {i}</p>', created_at=stamp)
+                for i, stamp in enumerate(stamps)]
+    db.session.add_all(comments)
+    db.session.commit()
+    return [c.id for c in sorted(comments, key=lambda c: (c.created_at, c.id))]
+
+
+def page_through(client, post_id, limit):
+    """Follow next_cursor to the end; returns the ids of every page"""
+    pages, cursor = [], None
+    while True:
+        url = f'/api/comments/{post_id}?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        pages.append([comment['id'] for comment in data['comments']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_comment_pages_split_ties_on_created_at(app, team_with_posts):
+    post_id = Post.query.first().id
+    # Runs of equal timestamps that straddle the page boundaries
+    expected = add_comments(post_id, [STAMP] * 5 + [STAMP + timedelta(seconds=1)] * 4 + [STAMP] * 2)
+    client = login(app, 'user0')
+
+    pages = page_through(client, post_id, 3)
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [comment_id for page in pages for comment_id in page] == expected
+
+
+def test_last_full_page_has_no_cursor(app, team_with_posts):
+    post_id = Post.query.first().id
+    expected = add_comments(post_id, [STAMP + timedelta(seconds=i) for i in range(8)])
+    client = login(app, 'user0')
+
+    assert page_through(client, post_id, 4) == [expected[:4], expected[4:]]
+
+
+def test_garbage_comment_cursor_returns_first_page(app, team_with_posts):
+    post_id = Post.query.first().id
+    expected = add_comments(post_id, [STAMP] * 3)
+    client = login(app, 'user0')
+
+    response = client.get(f'/api/comments/{post_id}?cursor=not-a-cursor!')
+    assert response.status_code == 200
+    assert [comment['id'] for comment in response.get_json()['comments']] == expected
+
+
+def test_batch_previews_leave_out_posts_the_user_cannot_see(app, team_with_posts):
+    posts = Post.query.order_by(Post.id).limit(3).all()
+    visible, hidden, removed = posts
+    hidden.is_hidden = True
+    removed.deleted_at = datetime.utcnow()
+    other_team = Team(name='Team 2')
+    db.session.add(other_team)
+    db.session.flush()
+    private = Post(user_id=User.query.first().id, team_id=other_team.id, description='Team only')
+    db.session.add(private)
+    db.session.commit()
+    for post in (visible, hidden, removed, private):
+        add_comments(post.id, [STAMP + timedelta(seconds=i) for i in range(5)])
+    client = login(app, 'user1')
+
+    ids = ','.join(str(post_id) for post_id in (visible.id, hidden.id, removed.id, private.id, 99999))
+    data = client.get(f'/api/comments/batch?post_ids={ids}').get_json()
+    assert data['success']
+    assert list(data['posts']) == [str(visible.id)]
+    preview = data['posts'][str(visible.id)]
+    assert preview['total'] == 5
+    assert len(preview['comments']) == 3
+    assert preview['next_cursor']
+
+    # The cursor continues where the preview stopped
+    rest = client.get(f"/api/comments/{visible.id}?cursor={preview['next_cursor']}").get_json()
+    assert len(rest['comments']) == 2 and rest['next_cursor'] is None
+
+
+def test_batch_previews_reject_bad_post_ids(app, team_with_posts):
+    client = login(app, 'user0')
+    assert client.get('/api/comments/batch?post_ids=1,abc').status_code == 400
+    too_many = ','.join(str(i) for i in range(1, 100))
+    assert client.get(f'/api/comments/batch?post_ids={too_many}').status_code == 400
+
+
+def test_load_more_cards_leave_previews_to_the_batch_call(app, team_with_posts):
+    post = Post.query.order_by(Post.created_at.desc(), Post.id.desc()).first()
+    add_comments(post.id, [STAMP])
+    client = login(app, 'user0')
+
+    page = client.get('/timeline/global?limit=1').data.decode()
+    assert 'data-loaded="true"' in page and 'Comment 0' in page
+    data = client.get('/api/timeline/global?limit=1').get_json()
+    assert 'data-loaded' not in data['html'] and 'Comment 0' not in data['html']
+    assert 'Comments (1)' in data['html']
@@ -0,0 +1,82 @@
+"""Leaderboard snapshot kept exact when reloads race with recorded votes"""
+from conftest import login
+from app import RESULTS_TEAMS_PER_PAGE
+from models import db, User, Team, Vote
+from leaderboard import Leaderboard, leaderboard
+
+
+def make_vote(team_id, judge_id, score=5, **kwargs):
+    return Vote(team_id=team_id, judge_id=judge_id, innovation_score=score, implementation_score=score,
+                design_score=score, presentation_score=score, **kwargs)
+
+
+def totals(board, team_id):
+    entry = board._totals[team_id]
+    return entry['vote_count'], entry['points']
+
+
+def test_vote_read_by_reload_is_not_counted_twice(app, team_with_posts):
+    judge_id = User.query.first().id
+    board = Leaderboard()
+    board._load()
+    vote = make_vote(team_with_posts, judge_id)
+    db.session.add(vote)
+    db.session.commit()
+
+    # The reload ran after the commit, then the request recorded its vote
+    board._load()
+    board.record_vote(vote)
+    assert totals(board, team_with_posts) == (1, 50)
+
+
+def test_vote_committed_after_reload_read_is_kept(app, team_with_posts):
+    judge_id = User.query.first().id
+    board = Leaderboard()
+    board._load()
+
+    # Recorded while a reload that cannot see it yet is in progress
+    board.record_vote(make_vote(team_with_posts, judge_id, id=1))
+    board._load()
+    assert totals(board, team_with_posts) == (1, 50)
+
+    db.session.add(make_vote(team_with_posts, judge_id, id=1))
+    db.session.commit()
+    board._load()
+    assert totals(board, team_with_posts) == (1, 50)
+
+
+def details(client, url):
+    """The Detailed Scores section of the admin results page"""
+    return client.get(url).data.decode().split('Detailed Scores', 1)[1]
+
+
+def test_admin_results_details_match_the_ranking_snapshot(app, team_with_posts):
+    admin = User(username='admin', is_admin=True)
+    admin.set_password('password')
+    db.session.add(admin)
+    db.session.add_all([Team(name=f'Team {i}') for i in range(2, RESULTS_TEAMS_PER_PAGE + 3)])
+    db.session.commit()
+    judge_id = User.query.filter_by(username='user0').first().id
+    teams = Team.query.order_by(Team.id).all()
+    # Team i scores i, so the ranking runs from the last team to the first
+    db.session.add_all([make_vote(team.id, judge_id, score=min(i + 1, 10)) for i, team in enumerate(teams)])
+    db.session.commit()
+    leaderboard.invalidate()
+    client = login(app, 'admin')
+
+    first = details(client, '/admin/results')
+    assert first.count('>@user0<') == RESULTS_TEAMS_PER_PAGE
+    assert 'Page 1 of 2' in first
+    second = details(client, '/admin/results?page=2')
+    assert second.count('>@user0<') == len(teams) - RESULTS_TEAMS_PER_PAGE
+
+    # A vote written by another worker is not in the cached ranking, so its row stays out too
+    other_judge = User.query.filter_by(username='user1').first().id
+    db.session.add(make_vote(teams[0].id, other_judge, score=1))
+    db.session.commit()
+    second = details(client, '/admin/results?page=2')
+    assert '>@user1<' not in second
+
+    leaderboard.invalidate()
+    second = details(client, '/admin/results?page=2')
+    assert '>@user1<' in second
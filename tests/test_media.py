@@ -0,0 +1,112 @@
+"""Content-addressed uploads: deduplication, reference counts and garbage collection"""
+import io
+import os
+from datetime import timedelta
+import pytest
+from werkzeug.datastructures import FileStorage
+import media
+from models import db, MediaBlob, User
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.fixture
+def upload_folder(app, database, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def save_png(content, replaces=None):
+    file = FileStorage(io.BytesIO(PNG_HEADER + content), filename='avatar.png')
+    return media.save_upload(file, 'profiles', {'png'}, replaces=replaces)
+
+
+def ref_count(filename):
+    blob = db.session.get(MediaBlob, media.blob_path('profiles', filename))
+    return None if blob is None else blob.ref_count
+
+
+def blob_exists(upload_folder, filename):
+    return os.path.isfile(os.path.join(upload_folder, 'profiles', filename))
+
+
+def add_user(username, picture):
+    user = User(username=username, password_hash='-', profile_picture=picture)
+    db.session.add(user)
+    return user
+
+
+def test_identical_uploads_share_one_blob(upload_folder):
+    first = save_png(b'same bytes')
+    add_user('a', first)
+    second = save_png(b'same bytes')
+    add_user('b', second)
+    other = save_png(b'other bytes')
+    add_user('c', other)
+    db.session.commit()
+
+    assert first == second != other
+    assert media.BLOB_PATTERN.match(first)
+    assert ref_count(first) == 2 and ref_count(other) == 1
+    blobs = [name for _, _, names in os.walk(upload_folder / 'profiles') for name in names]
+    assert len(blobs) == 2
+    assert not os.listdir(upload_folder / media.STAGING_FOLDER)
+
+
+def test_replacing_an_upload_releases_the_old_blob(upload_folder):
+    user = add_user('a', save_png(b'old picture'))
+    db.session.commit()
+    old = user.profile_picture
+
+    user.profile_picture = save_png(b'new picture', replaces=old)
+    db.session.commit()
+
+    assert ref_count(old) == 0
+    assert ref_count(user.profile_picture) == 1
+    # Never drops below zero, e.g. when a replace is retried
+    media.release_reference('profiles', old)
+    db.session.commit()
+    assert ref_count(old) == 0
+
+
+def test_garbage_collection_removes_only_unreferenced_blobs(upload_folder):
+    user = add_user('a', save_png(b'old picture'))
+    db.session.commit()
+    old = user.profile_picture
+    user.profile_picture = save_png(b'kept picture', replaces=old)
+    db.session.commit()
+
+    # Within the grace period nothing is removed
+    assert media.collect_garbage() == (0, 0)
+    assert blob_exists(upload_folder, old)
+
+    removed, freed = media.collect_garbage(grace_period=timedelta(0))
+    assert (removed, freed) == (1, len(PNG_HEADER + b'old picture'))
+    assert not blob_exists(upload_folder, old) and ref_count(old) is None
+    assert blob_exists(upload_folder, user.profile_picture) and ref_count(user.profile_picture) == 1
+
+
+def test_garbage_collection_removes_blobs_without_a_row(upload_folder):
+    # Published by a request whose transaction then rolled back
+    orphan = save_png(b'never recorded')
+    db.session.rollback()
+    assert ref_count(orphan) is None and blob_exists(upload_folder, orphan)
+
+    assert media.collect_garbage(grace_period=timedelta(0))[0] == 1
+    assert not blob_exists(upload_folder, orphan)
+
+
+def test_drifted_counts_are_kept_and_recounted(upload_folder):
+    user = add_user('a', save_png(b'picture'))
+    db.session.commit()
+    db.session.get(MediaBlob, media.blob_path('profiles', user.profile_picture)).ref_count = 0
+    db.session.commit()
+
+    # Still referenced by a column, so the collector leaves it alone
+    assert media.collect_garbage(grace_period=timedelta(0)) == (0, 0)
+    assert blob_exists(upload_folder, user.profile_picture)
+
+    assert media.recount_references() == 1
+    db.session.commit()
+    assert ref_count(user.profile_picture) == 1
+    assert media.recount_references() == 0
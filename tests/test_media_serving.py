@@ -0,0 +1,83 @@
+"""The media route: Range requests, ETag revalidation and front-proxy offload"""
+import hashlib
+import pytest
+import media
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def stored(app, database, tmp_path, monkeypatch):
+    """A content-addressed video and a legacy (mutable) image; returns their filenames"""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    video = media.content_filename(digest, 'mp4')
+    (tmp_path / 'videos' / video).parent.mkdir(parents=True)
+    (tmp_path / 'videos' / video).write_bytes(CONTENT)
+    (tmp_path / 'posts').mkdir()
+    (tmp_path / 'posts' / 'legacy.jpg').write_bytes(CONTENT)
+    return {'video': video, 'digest': digest, 'image': 'legacy.jpg'}
+
+
+def test_range_request_returns_206_with_the_slice(app, stored):
+    client = app.test_client()
+    response = client.get(f"/media/videos/{stored['video']}", headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+
+    full = client.get(f"/media/videos/{stored['video']}")
+    assert full.status_code == 200 and full.data == CONTENT
+    assert full.headers['Accept-Ranges'] == 'bytes'
+
+    unsatisfiable = client.get(f"/media/videos/{stored['video']}", headers={'Range': f'bytes={len(CONTENT)}-'})
+    assert unsatisfiable.status_code == 416
+
+
+def test_content_addressed_files_are_immutable_and_revalidate_to_304(app, stored):
+    client = app.test_client()
+    response = client.get(f"/media/videos/{stored['video']}")
+    assert response.headers['ETag'] == f"\"{stored['digest']}.mp4\""
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+
+    again = client.get(f"/media/videos/{stored['video']}", headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+
+
+def test_legacy_files_are_revalidated(app, stored):
+    client = app.test_client()
+    response = client.get(f"/media/posts/{stored['image']}")
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    again = client.get(f"/media/posts/{stored['image']}", headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_unknown_folder_and_traversal_are_404(app, stored):
+    client = app.test_client()
+    assert client.get(f"/media/secrets/{stored['image']}").status_code == 404
+    assert client.get('/media/posts/../videos/x.mp4').status_code == 404
+    assert client.get('/media/posts/missing.jpg').status_code == 404
+
+
+def test_x_accel_redirect_leaves_the_body_to_the_proxy(app, stored, monkeypatch):
+    monkeypatch.setitem(app.config, 'MEDIA_OFFLOAD', 'x-accel-redirect')
+    monkeypatch.setitem(app.config, 'MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+    client = app.test_client()
+
+    response = client.get(f"/media/videos/{stored['video']}", headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 200 and response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f"/protected-uploads/videos/{stored['video']}"
+    assert response.headers['Content-Type'] == 'video/mp4'
+    assert response.headers['ETag'] == f"\"{stored['digest']}.mp4\""
+
+    again = client.get(f"/media/videos/{stored['video']}", headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304 and 'X-Accel-Redirect' not in again.headers
+
+
+def test_x_sendfile_names_the_file_on_disk(app, stored, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'MEDIA_OFFLOAD', 'x-sendfile')
+    response = app.test_client().get(f"/media/posts/{stored['image']}")
+    assert response.headers['X-Sendfile'] == str(tmp_path / 'posts' / 'legacy.jpg')
+    assert response.data == b''
+    assert response.headers['ETag']
@@ -0,0 +1,123 @@
+"""Keyset pagination: page boundaries, rows sharing created_at and malformed cursors"""
+import re
+import base64
+from datetime import datetime
+import pytest
+from conftest import login
+from models import db, AuditLog, RegistrationCode
+from utils import encode_cursor, decode_cursor, keyset_paginate, generate_registration_codes
+
+STAMP = datetime(2026, 1, 1, 12, 0, 0)
+CURSOR_LINK = re.compile(r'[?&]{}=([A-Za-z0-9_-]+)')
+
+
+def link_cursor(html, name='cursor'):
+    """The cursor in the page's navigation link, or None"""
+    match = re.compile(CURSOR_LINK.pattern.format(name)).search(html)
+    return match.group(1) if match else None
+
+
+def b64(text):
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(stamp, 42)) == (stamp, 42)
+
+
+@pytest.mark.parametrize('token', [None, '', 'not-a-cursor!', '%%%', b64('no separator'), b64('yesterday|1'),
+                                   b64('2026-01-01T00:00:00|one'), b64('2026-01-01T00:00:00|1|2'),
+                                   base64.urlsafe_b64encode(b'\xff\xfe|1').decode()])
+def test_malformed_cursors_decode_to_none(token):
+    assert decode_cursor(token) is None
+
+
+def test_bulk_generated_codes_page_through_without_gaps(app, database):
+    generate_registration_codes(250)
+    db.session.commit()
+    # Bulk-generated codes may all share one timestamp
+    RegistrationCode.query.update({'created_at': STAMP})
+    db.session.commit()
+    expected = [code.id for code in RegistrationCode.query.order_by(RegistrationCode.id.desc())]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        codes, cursor = keyset_paginate(RegistrationCode.query, RegistrationCode, cursor=cursor, limit=100)
+        seen.extend(code.id for code in codes)
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 3 and seen == expected
+
+
+def test_last_full_page_has_no_cursor(app, database):
+    generate_registration_codes(100)
+    db.session.commit()
+    codes, cursor = keyset_paginate(RegistrationCode.query, RegistrationCode, limit=100)
+    assert len(codes) == 100 and cursor is None
+
+
+def test_admin_codes_pages_and_garbage_cursor(app, admin_client):
+    generate_registration_codes(150)
+    db.session.commit()
+    RegistrationCode.query.update({'created_at': STAMP})
+    db.session.commit()
+    all_codes = {code.code for code in RegistrationCode.query}
+
+    first = admin_client.get('/admin/codes').data.decode()
+    cursor = link_cursor(first)
+    second = admin_client.get(f'/admin/codes?cursor={cursor}').data.decode()
+    shown = [set(re.findall(r'<strong>(\d{6})</strong>', html)) for html in (first, second)]
+    assert [len(codes) for codes in shown] == [100, 50]
+    assert shown[0] | shown[1] == all_codes
+    assert link_cursor(second) is None
+
+    garbage = admin_client.get('/admin/codes?cursor=garbage%25%25')
+    assert garbage.status_code == 200
+    assert set(re.findall(r'<strong>(\d{6})</strong>', garbage.data.decode())) == shown[0]
+
+
+def test_audit_logs_page_both_ways_across_equal_timestamps(app, admin_client):
+    db.session.add_all([AuditLog(action_type='tie_test', action_details=f'entry-{i:03d}', created_at=STAMP)
+                        for i in range(120)])
+    db.session.commit()
+    url = '/admin/audit-logs?action_type=tie_test'
+
+    def entries(html):
+        return re.findall(r'entry-\d{3}', html)
+
+    pages, cursor = [], None
+    while True:
+        html = admin_client.get(url + (f'&cursor={cursor}' if cursor else '')).data.decode()
+        pages.append((entries(html), link_cursor(html, 'before')))
+        cursor = link_cursor(html)
+        if cursor is None:
+            break
+    assert [len(page) for page, _ in pages] == [50, 50, 20]
+    # Newest first: equal timestamps fall back to descending id
+    assert [entry for page, _ in pages for entry in page] == [f'entry-{i:03d}' for i in reversed(range(120))]
+
+    # "Newer" from the last page returns exactly the page before it
+    newer = admin_client.get(f'{url}&before={pages[-1][1]}').data.decode()
+    assert entries(newer) == pages[1][0]
+
+
+@pytest.mark.parametrize('arg', ['cursor', 'before'])
+def test_garbage_audit_log_cursor_returns_first_page(app, admin_client, arg):
+    db.session.add_all([AuditLog(action_type='tie_test', action_details=f'entry-{i:03d}', created_at=STAMP)
+                        for i in range(60)])
+    db.session.commit()
+    first = admin_client.get('/admin/audit-logs?action_type=tie_test').data.decode()
+
+    response = admin_client.get(f'/admin/audit-logs?action_type=tie_test&{arg}=garbage')
+    assert response.status_code == 200
+    assert re.findall(r'entry-\d{3}', response.data.decode()) == re.findall(r'entry-\d{3}', first)
+
+
+def test_garbage_timeline_cursor_returns_first_page(app, team_with_posts):
+    client = login(app, 'user0')
+    first = client.get('/api/timeline/global').get_json()
+    garbage = client.get('/api/timeline/global?cursor=garbage')
+    assert garbage.status_code == 200
+    assert garbage.get_json()['html'] == first['html']
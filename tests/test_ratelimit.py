@@ -0,0 +1,53 @@
+"""Rate limits shared by several worker processes through one SQLite file"""
+import multiprocessing
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from ratelimit import SQLiteTokenBucketLimiter, SQLiteLimitsStorage
+
+PROCESSES = 6
+HITS_PER_PROCESS = 40
+LIMIT = 50
+
+
+def token_bucket_worker(path, start, results):
+    limiter = SQLiteTokenBucketLimiter(path)
+    start.wait()
+    results.put(sum(limiter.hit('user_1_comments', LIMIT, 3600)[0] for _ in range(HITS_PER_PROCESS)))
+
+
+def fixed_window_worker(path, start, results):
+    limiter = FixedWindowRateLimiter(SQLiteLimitsStorage(f'sqlite:///{path}'))
+    item = parse(f'{LIMIT} per hour')
+    start.wait()
+    results.put(sum(limiter.hit(item, '127.0.0.1') for _ in range(HITS_PER_PROCESS)))
+
+
+def run_workers(target, path):
+    """Total hits allowed across PROCESSES spawned workers racing on one key"""
+    context = multiprocessing.get_context('spawn')
+    start = context.Barrier(PROCESSES)
+    results = context.Queue()
+    workers = [context.Process(target=target, args=(path, start, results)) for _ in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get(timeout=60) for _ in workers)
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+    return allowed
+
+
+def test_token_buckets_hold_across_processes(tmp_path):
+    assert PROCESSES * HITS_PER_PROCESS > LIMIT
+    assert run_workers(token_bucket_worker, str(tmp_path / 'ratelimit.db')) == LIMIT
+
+
+def test_flask_limiter_storage_holds_across_processes(tmp_path):
+    assert run_workers(fixed_window_worker, str(tmp_path / 'ratelimit.db')) == LIMIT
+
+
+def test_limits_3_elastic_expiry_argument(tmp_path):
+    storage = SQLiteLimitsStorage(f'sqlite:///{tmp_path / "ratelimit.db"}')
+    assert storage.incr('key', 60, False, amount=1) == 1
+    assert storage.incr('key', 60, True) == 2
+    assert storage.incr('key', 60) == 3
@@ -0,0 +1,48 @@
+"""Concurrent reaction writes against a file-backed SQLite database"""
+import random
+import threading
+from sqlalchemy import func
+from models import db, Reaction, PostReactionCount, Post, User
+from reactions import set_reaction
+
+THREADS = 8
+OPERATIONS_PER_THREAD = 150
+REACTION_SUBSET = ('like', 'fire', 'idea')
+
+
+def test_concurrent_toggles_keep_counters_exact(app, team_with_posts):
+    assert db.engine.url.database, 'the stress test needs a file-backed database'
+    # Few posts and users, so threads keep colliding on the same rows
+    post_ids = [post_id for (post_id,) in db.session.query(Post.id).order_by(Post.id).limit(3)]
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    db.session.remove()
+
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        start.wait()
+        for _ in range(OPERATIONS_PER_THREAD):
+            try:
+                with app.app_context():
+                    set_reaction(rng.choice(post_ids), rng.choice(user_ids), rng.choice(REACTION_SUBSET),
+                                 rng.choice((None, None, True, False)))
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    actual = {(post_id, rtype): count for post_id, rtype, count in
+              db.session.query(Reaction.post_id, Reaction.reaction_type, func.count(Reaction.id))
+              .group_by(Reaction.post_id, Reaction.reaction_type)}
+    counters = {(row.post_id, row.reaction_type): row.count for row in PostReactionCount.query}
+    assert actual, 'no reactions were written'
+    for key, count in counters.items():
+        assert count == actual.get(key, 0), key
+    assert set(actual) <= set(counters)
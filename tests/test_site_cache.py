@@ -0,0 +1,61 @@
+"""Cached site settings and announcements: invalidation by admin writes and scheduled expiry"""
+from datetime import datetime, timedelta
+import pytest
+import utils
+from conftest import QueryCounter
+from models import db, Announcement, User
+from utils import get_active_announcements, invalidate_site_cache
+
+
+@pytest.fixture
+def cached(app, database, monkeypatch):
+    """Start from an empty cache; only invalidation or expiry may change it within a test"""
+    monkeypatch.setitem(app.config, 'SITE_CACHE_TTL', 3600)
+    invalidate_site_cache()
+
+
+def test_settings_change_shows_on_the_next_request(app, cached, admin_client):
+    assert 'Renamed Camp' not in admin_client.get('/announcements').data.decode()
+
+    response = admin_client.post('/admin/settings', data={
+        'site_name': 'Renamed Camp', 'primary_color': '#112233', 'secondary_color': '#445566',
+        'font_family': 'Inter', 'custom_css': ''
+    })
+    assert response.status_code == 302
+    assert '&copy; 2026 Renamed Camp' in admin_client.get('/announcements').data.decode()
+
+
+def test_new_announcement_shows_on_the_next_request(app, cached, admin_client):
+    assert 'Lunch is served' not in admin_client.get('/announcements').data.decode()
+
+    response = admin_client.post('/admin/announcements', data={
+        'title': 'Lunch is served', 'content': 'In the main hall', 'announcement_type': 'info'
+    })
+    assert response.status_code == 302
+    assert 'Lunch is served' in admin_client.get('/announcements').data.decode()
+
+
+def test_expired_announcements_drop_out_without_a_reload(app, cached, monkeypatch):
+    admin = User(username='admin', password_hash='-', is_admin=True)
+    db.session.add(admin)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.add_all([
+        Announcement(title='Soon over', content='-', announcement_type='info', created_by_admin_id=admin.id,
+                     expires_at=now + timedelta(minutes=5)),
+        Announcement(title='Later', content='-', announcement_type='info', created_by_admin_id=admin.id,
+                     expires_at=now + timedelta(hours=2)),
+        Announcement(title='Forever', content='-', announcement_type='info', created_by_admin_id=admin.id),
+    ])
+    db.session.commit()
+    assert {a.title for a in get_active_announcements()} == {'Soon over', 'Later', 'Forever'}
+
+    class Later(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now + timedelta(minutes=10)
+
+    monkeypatch.setattr(utils, 'datetime', Later)
+    with QueryCounter(db.engine) as counter:
+        assert {a.title for a in get_active_announcements()} == {'Later', 'Forever'}
+    assert counter.count == 0
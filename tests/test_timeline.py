@@ -0,0 +1,50 @@
+"""Post card hydration: the query count of a feed page must not grow with its size"""
+from conftest import login, QueryCounter
+from models import db, Post, PostMedia, Comment, User
+from reactions import set_reaction
+
+
+def add_activity():
+    """Give every post media, comments and reactions, so each part of the card is rendered"""
+    users = User.query.all()
+    for post in Post.query.all():
+        db.session.add(PostMedia(post_id=post.id, media_type='image', file_path=f'{post.id}.jpg'))
+        for i, user in enumerate(users):
+            db.session.add(Comment(post_id=post.id, user_id=user.id, content=f'Comment {i}',
+                                   content_html=f'<p>Comment {i}</p>'))
+        db.session.flush()
+        for user in users:
+            set_reaction(post.id, user.id, 'fire', True)
+    db.session.commit()
+
+
+def test_feed_query_count_is_independent_of_page_size(app, team_with_posts):
+    add_activity()
+    client = login(app, 'user0')
+    client.get('/timeline/global?limit=5')  # warm the per-process caches
+
+    counts = {}
+    for limit in (20, 50):
+        with QueryCounter(db.engine) as counter:
+            response = client.get(f'/timeline/global?limit={limit}')
+        assert response.status_code == 200
+        assert response.data.count(b'class="post-card"') == limit
+        counts[limit] = counter.count
+
+    assert counts[20] == counts[50], counts
+    assert counts[20] <= 12, counts
+
+
+def test_feed_renders_comment_previews(app, team_with_posts):
+    add_activity()
+    client = login(app, 'user1')
+    html = client.get('/timeline/global?limit=1').data.decode()
+    assert html.count('class="comment"') == 3
+    assert 'Load more comments' not in html
+
+    post = Post.query.order_by(Post.id.desc()).first()
+    for i in range(3):
+        db.session.add(Comment(post_id=post.id, user_id=1, content='Extra', content_html='<p>Extra</p>'))
+    db.session.commit()
+    html = client.get('/timeline/global?limit=1').data.decode()
+    assert 'Load more comments' in html
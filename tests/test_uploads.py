@@ -0,0 +1,38 @@
+"""Resumable upload API: chunk progress and sessions expiring mid-chunk"""
+import os
+from datetime import timedelta
+import upload_sessions
+from models import db, UploadSession
+from conftest import login
+
+
+def start(client, size):
+    response = client.post('/api/uploads', json={'filename': 'clip.mp4', 'size': size})
+    assert response.status_code == 201
+    return response.get_json()['upload']['id']
+
+
+def test_chunk_progress_is_read_from_the_staging_file(app, team_with_posts):
+    client = login(app, 'user0')
+    upload_id = start(client, 10)
+
+    response = client.put(f'/api/uploads/{upload_id}?offset=0', data=b'12345')
+    assert response.get_json() == {'success': True, 'received': 5}
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['upload']['received'] == 5
+
+
+def test_session_expired_while_chunk_streams_returns_404(app, team_with_posts, monkeypatch):
+    client = login(app, 'user0')
+    upload_id = start(client, 10)
+    write_chunk = upload_sessions.write_chunk
+
+    def write_then_expire(*args, **kwargs):
+        received = write_chunk(*args, **kwargs)
+        assert upload_sessions.expire_sessions(ttl=timedelta(0)) == 1
+        return received
+
+    monkeypatch.setattr(upload_sessions, 'write_chunk', write_then_expire)
+    response = client.put(f'/api/uploads/{upload_id}?offset=0', data=b'12345')
+    assert response.status_code == 404
+    assert db.session.get(UploadSession, upload_id) is None
+    assert not os.path.exists(upload_sessions.part_path(upload_id))
@@ -0,0 +1,114 @@
+"""Batched loading of the data rendered by post cards"""
+from collections import defaultdict
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, User, Team, PostMedia, Comment
+from reactions import get_reaction_counts, get_viewer_reactions, summarize_reactions
+from utils import encode_cursor
+
+
+def hydrate_posts(posts, viewer_id, comment_limit):
+    """
+    Load everything components/post_card.html needs for a page of posts
+    
+    Authors, teams, media, reaction counters, the viewer's reactions and
+    the first comments with their counts are each fetched with batched
+    queries, so rendering a page costs the same number of queries no
+    matter how many posts it holds. The relationships are populated in
+    place so the template never triggers a lazy load.
+    
+    Args:
+        posts: List of Post objects to hydrate
+        viewer_id: ID of the user viewing the page (for "reacted" state)
+        comment_limit: Comments rendered with each post, or 0 to only
+            count them (comment_preview is then None and the client loads
+            the previews)
+    
+    Returns:
+        list: The same posts, with reaction_summary, comment_count,
+        comment_preview and comment_cursor (None when every comment is
+        in the preview) set
+    """
+    if not posts:
+        return posts
+    
+    post_ids = [post.id for post in posts]
+    
+    users = {user.id: user for user in
+             User.query.filter(User.id.in_({post.user_id for post in posts}))}
+    teams = {team.id: team for team in
+             Team.query.filter(Team.id.in_({post.team_id for post in posts}))}
+    
+    media = defaultdict(list)
+    for item in (PostMedia.query
+                 .filter(PostMedia.post_id.in_(post_ids))
+                 .order_by(PostMedia.post_id, PostMedia.display_order)):
+        media[item.post_id].append(item)
+    
+    reaction_counts = get_reaction_counts(post_ids)
+    viewer_reactions = get_viewer_reactions(post_ids, viewer_id)
+    
+    previews = load_comment_previews(post_ids, comment_limit)
+    
+    for post in posts:
+        set_committed_value(post, 'user', users.get(post.user_id))
+        set_committed_value(post, 'team', teams.get(post.team_id))
+        set_committed_value(post, 'media', media[post.id])
+        post.reaction_summary = summarize_reactions(
+            reaction_counts[post.id],
+            {rtype for post_id, rtype in viewer_reactions if post_id == post.id}
+        )
+        comments, post.comment_count = previews[post.id]
+        post.comment_preview = comments if comment_limit else None
+        post.comment_cursor = None
+        if comment_limit and post.comment_count > len(comments):
+            post.comment_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+    
+    return posts
+
+
+def load_comment_previews(post_ids, limit):
+    """
+    Load the first comments of several posts at once
+    
+    Uses a ROW_NUMBER() window to take the oldest `limit` visible comments
+    of every post in a single query (authors joined in), plus one grouped
+    query for the totals. A limit of 0 loads only the totals.
+    
+    Returns:
+        dict: {post_id: (comments, total)} for every requested post
+    """
+    previews = {post_id: ([], 0) for post_id in post_ids}
+    if not post_ids:
+        return previews
+    
+    comments = []
+    if limit > 0:
+        ranked = (db.session.query(
+                      Comment.id.label('id'),
+                      func.row_number().over(
+                          partition_by=Comment.post_id,
+                          order_by=(Comment.created_at, Comment.id)
+                      ).label('position'))
+                  .filter(Comment.post_id.in_(post_ids), Comment.deleted == False)
+                  .subquery())
+        comments = (Comment.query
+                    .options(joinedload(Comment.user))
+                    .join(ranked, Comment.id == ranked.c.id)
+                    .filter(ranked.c.position <= limit)
+                    .order_by(Comment.post_id, Comment.created_at, Comment.id)
+                    .all())
+    
+    totals = dict(
+        db.session.query(Comment.post_id, func.count(Comment.id))
+        .filter(Comment.post_id.in_(post_ids), Comment.deleted == False)
+        .group_by(Comment.post_id)
+    )
+    
+    grouped = defaultdict(list)
+    for comment in comments:
+        grouped[comment.post_id].append(comment)
+    for post_id in post_ids:
+        previews[post_id] = (grouped[post_id], totals.get(post_id, 0))
+    return previews
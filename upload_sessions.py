@@ -0,0 +1,326 @@
+"""
+Resumable chunked uploads for large videos
+
+A client starts a session with the file's name and size, PUTs the bytes in
+chunks at explicit offsets and then finalizes it. Each chunk is streamed
+from the request straight into a staging file, so memory use does not
+depend on the file size, and an interrupted upload resumes from the bytes
+already on disk. Finalizing checks the size, leading bytes and checksum
+and moves the file into content-addressed storage (see media.py), where
+the session holds a reference to it until a post claims it.
+"""
+import os
+import re
+import uuid
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, UploadSession
+from utils import remove_file
+import media
+
+UPLOAD_FOLDER = 'videos'
+UPLOAD_SUFFIX = '.upload'
+# Sessions untouched this long are deleted, with their data or blob reference
+SESSION_TTL = timedelta(hours=24)
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(ValueError):
+    """
+    A request the upload session cannot accept
+
+    status is the HTTP status to answer with; received, when set, is the
+    offset the client should continue from.
+    """
+
+    def __init__(self, message, status=400, received=None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+def part_path(session_id):
+    """Staging file holding the bytes received so far"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], media.STAGING_FOLDER, session_id + UPLOAD_SUFFIX)
+
+
+def received_bytes(session):
+    """Bytes stored so far; read from the staging file, which may end in a partial chunk"""
+    if session.status != 'uploading':
+        return session.size
+    try:
+        return os.path.getsize(part_path(session.id))
+    except FileNotFoundError:
+        return 0
+
+
+def session_state(session):
+    """JSON-ready description of a session for the upload API"""
+    return {
+        'id': session.id,
+        'size': session.size,
+        'received': received_bytes(session),
+        'status': session.status,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+    }
+
+
+def _checksum(value):
+    """Normalized SHA-256 hex digest, or None if not given"""
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    if not SHA256_PATTERN.match(value):
+        raise UploadError('sha256 must be 64 hexadecimal characters')
+    return value
+
+
+def start_session(user_id, filename, size, allowed_extensions, sha256=None):
+    """
+    Open an upload session; the caller commits
+
+    Args:
+        filename: Name of the file on the client, for its extension
+        size: Total size in bytes
+        sha256: Optional checksum of the whole file, checked on finalize
+
+    Raises:
+        UploadError: If the name, size or checksum is not acceptable
+    """
+    if not isinstance(filename, str) or '.' not in filename or \
+            filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
+        raise UploadError(f"Allowed formats: {', '.join(sorted(allowed_extensions))}")
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    max_size = current_app.config['MAX_VIDEO_UPLOAD_SIZE']
+    if size > max_size:
+        raise UploadError(f'Videos are limited to {max_size // (1024 * 1024)}MB', 413)
+
+    session = UploadSession(id=uuid.uuid4().hex, user_id=user_id, filename=filename[-255:],
+                            size=size, sha256=_checksum(sha256))
+    db.session.add(session)
+    return session
+
+
+@contextmanager
+def _locked(session_id, create=False):
+    """
+    Open a session's staging file holding an exclusive lock
+
+    The lock keeps a retried chunk from writing while the original request
+    is still streaming, and finalize from moving a file that is being written.
+    """
+    path = part_path(session_id)
+    flags = os.O_RDWR | (os.O_CREAT if create else 0)
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, flags, 0o644)
+    except FileNotFoundError:
+        raise UploadError('No data has been received', 409, received=0) from None
+    with os.fdopen(fd, 'r+b') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another request is writing this upload', 409,
+                              received=os.fstat(f.fileno()).st_size) from None
+        yield f
+
+
+def write_chunk(session, offset, stream, chunk_sha256=None):
+    """
+    Append one chunk read from stream at offset
+
+    The body is copied in COPY_BUFFER_SIZE blocks; nothing is held in the
+    database while it streams. If the connection drops mid-chunk the bytes
+    that arrived are kept and the client resumes after them, unless a
+    chunk checksum was sent, in which case the partial chunk is dropped.
+
+    Args:
+        offset: Must equal the bytes received so far
+        stream: File-like request body
+        chunk_sha256: Optional checksum of this chunk
+
+    Returns:
+        int: Bytes received so far, including this chunk
+
+    Raises:
+        UploadError: On an offset mismatch, a chunk that is too long or a
+            chunk checksum mismatch
+    """
+    session_id, size, status = session.id, session.size, session.status
+    if status != 'uploading':
+        raise UploadError('The upload is already complete', 409, received=size)
+    chunk_sha256 = _checksum(chunk_sha256)
+    max_chunk = current_app.config['UPLOAD_CHUNK_SIZE']
+    # End the read transaction so no connection sits in one while the body streams
+    db.session.commit()
+
+    with _locked(session_id, create=True) as f:
+        received = os.fstat(f.fileno()).st_size
+        if offset != received:
+            raise UploadError('offset does not match the bytes received', 409, received=received)
+        f.seek(offset)
+        digest = hashlib.sha256()
+        remaining = min(size - offset, max_chunk)
+        try:
+            while True:
+                # One byte past the limit detects an oversized chunk without reading it all
+                block = stream.read(min(media.COPY_BUFFER_SIZE, remaining + 1))
+                if not block:
+                    break
+                if len(block) > remaining:
+                    raise UploadError('Chunk is larger than the chunk size or the rest of the file', 413,
+                                      received=offset)
+                f.write(block)
+                digest.update(block)
+                remaining -= len(block)
+            if chunk_sha256 and digest.hexdigest() != chunk_sha256:
+                raise UploadError('Chunk checksum mismatch', 422, received=offset)
+        except BaseException as e:
+            # Unverifiable or rejected bytes are dropped; the client resends from offset
+            if chunk_sha256 or isinstance(e, UploadError):
+                f.truncate(offset)
+            raise
+        return f.tell()
+
+
+def touch_session(session_id):
+    """
+    Record chunk progress so the session does not expire; the caller commits
+
+    A conditional update rather than a flush of the loaded session, which
+    expire_sessions may have deleted while the chunk streamed.
+
+    Returns:
+        bool: False if the session is gone; its staging file is removed
+    """
+    touched = UploadSession.query.filter_by(id=session_id, status='uploading') \
+        .update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+    if not touched:
+        remove_file(part_path(session_id))
+    return bool(touched)
+
+
+def finalize(session, sha256=None):
+    """
+    Verify a fully received upload and move it into content-addressed storage
+
+    The file is hashed in one streaming pass, which also yields its
+    content-addressed name. Finalizing a completed session again is a no-op,
+    so clients can retry when the response was lost. The caller commits.
+
+    Args:
+        sha256: Checksum of the whole file; falls back to the one given
+            when the session started
+
+    Returns:
+        str: Filename of the stored video in the videos folder
+
+    Raises:
+        UploadError: If bytes are missing, the file is not a video of its
+            type or the checksum does not match (the data is then discarded
+            and the upload must restart from offset 0)
+    """
+    if session.status != 'uploading':
+        return session.file_path
+    session_id, size, filename = session.id, session.size, session.filename
+    expected = _checksum(sha256) or session.sha256
+    ext = filename.rsplit('.', 1)[1].lower()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    db.session.commit()
+
+    with _locked(session_id) as f:
+        received = os.fstat(f.fileno()).st_size
+        if received != size:
+            raise UploadError(f'{size - received} bytes have not been received yet', 409, received=received)
+        if not media.matches_signature(f.read(16), ext):
+            f.truncate(0)
+            raise UploadError(f'The file is not a valid .{ext} video', 422, received=0)
+        f.seek(0)
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(media.COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+        digest = digest.hexdigest()
+        if expected and digest != expected:
+            f.truncate(0)
+            raise UploadError('Checksum mismatch; the upload must be restarted', 422, received=0)
+        os.fsync(f.fileno())
+
+        # Renamed while still locked, so no late chunk can be appended to it
+        staged = media.StagedUpload(upload_folder, UPLOAD_FOLDER, media.content_filename(digest, ext),
+                                    part_path(session_id), size)
+        media.publish([staged])
+
+    media.add_references([staged])
+    session.status = 'complete'
+    session.file_path = staged.filename
+    session.sha256 = digest
+    session.updated_at = datetime.utcnow()
+    return staged.filename
+
+
+def claim_upload(upload_id, user_id):
+    """
+    Hand a user's completed upload to a new post, in the caller's transaction
+
+    The session's blob reference passes to the post, so the caller does not
+    add one.
+
+    Returns:
+        str: Filename of the video, or None if there is no such completed upload
+    """
+    session = UploadSession.query.filter_by(id=upload_id, user_id=user_id, status='complete').first()
+    if session is None:
+        return None
+    # Conditional update: of two posts submitted with the same upload only one gets it
+    claimed = UploadSession.query.filter_by(id=upload_id, status='complete') \
+        .update({'status': 'attached', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    return session.file_path if claimed else None
+
+
+def expire_sessions(ttl=SESSION_TTL):
+    """
+    Delete sessions untouched for ttl and commit
+
+    Unfinished sessions lose their staging file; completed ones that no
+    post claimed release their blob, which the garbage collector then
+    removes. Staging files without a session are deleted too.
+
+    Returns:
+        int: Sessions deleted
+    """
+    cutoff = datetime.utcnow() - ttl
+    table = UploadSession.__table__
+    expired = 0
+    for session_id, status, file_path in db.session.query(
+            UploadSession.id, UploadSession.status, UploadSession.file_path) \
+            .filter(UploadSession.updated_at < cutoff):
+        # Conditional delete: a chunk or claim may have touched the session meanwhile
+        result = db.session.execute(table.delete().where(table.c.id == session_id, table.c.status == status,
+                                                         table.c.updated_at < cutoff))
+        if not result.rowcount:
+            continue
+        if status == 'complete':
+            media.release_reference(UPLOAD_FOLDER, file_path)
+        expired += 1
+        db.session.commit()
+        if status == 'uploading':
+            remove_file(part_path(session_id))
+
+    staging_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], media.STAGING_FOLDER)
+    if os.path.isdir(staging_dir):
+        known = {session_id for (session_id,) in db.session.query(UploadSession.id)}
+        for entry in os.scandir(staging_dir):
+            session_id = entry.name[:-len(UPLOAD_SUFFIX)]
+            try:
+                if entry.name.endswith(UPLOAD_SUFFIX) and session_id not in known and \
+                        datetime.utcfromtimestamp(entry.stat().st_mtime) < cutoff:
+                    remove_file(entry.path)
+            except OSError:
+                continue
+    return expired
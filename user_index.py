@@ -0,0 +1,154 @@
+"""In-memory prefix index of usernames for the @mention autocomplete"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import or_
+from models import db, User, Mention
+
+# Full reload interval; users created through other worker processes
+# only reach this process's index on reload
+INDEX_TTL = 300  # seconds
+RECENT_INTERACTIONS_TTL = 300  # seconds
+RECENT_INTERACTIONS_LIMIT = 50
+
+
+class UsernameIndex:
+    """
+    Sorted index of usernames supporting ranked prefix search
+
+    Usernames are kept as a sorted list of (lowercase username, user id)
+    so a prefix lookup is a bisect plus a short forward scan. Team-mates
+    and users the searcher recently interacted with (via @mentions) are
+    ranked ahead of alphabetical matches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []  # sorted (username.lower(), user_id)
+        self._users = {}  # user_id -> dict(id, username, profile_picture, team_id)
+        self._team_members = defaultdict(set)
+        self._recent = {}  # user_id -> (loaded_at, [user_id, ...] most recent first)
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        """Load every user with one query on first use and after INDEX_TTL"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < INDEX_TTL:
+            return
+        rows = db.session.query(User.id, User.username, User.profile_picture, User.team_id).all()
+        with self._lock:
+            self._users = {}
+            self._team_members = defaultdict(set)
+            for user_id, username, profile_picture, team_id in rows:
+                self._store(user_id, username, profile_picture, team_id)
+            self._keys = sorted((user['username'].lower(), user_id)
+                                for user_id, user in self._users.items())
+            self._loaded_at = time.monotonic()
+
+    def _store(self, user_id, username, profile_picture, team_id):
+        """Record a user's searchable fields (caller holds the lock)"""
+        self._users[user_id] = {
+            'id': user_id,
+            'username': username,
+            'profile_picture': profile_picture,
+            'team_id': team_id
+        }
+        if team_id:
+            self._team_members[team_id].add(user_id)
+
+    def add_or_update(self, user):
+        """Incrementally insert or refresh one user, e.g. after creation or a team change"""
+        if self._loaded_at is None:
+            return  # Loaded lazily on the first search
+        with self._lock:
+            previous = self._users.get(user.id)
+            if previous:
+                self._team_members[previous['team_id']].discard(user.id)
+                if previous['username'] != user.username:
+                    self._keys.remove((previous['username'].lower(), user.id))
+                    bisect.insort(self._keys, (user.username.lower(), user.id))
+            else:
+                bisect.insort(self._keys, (user.username.lower(), user.id))
+            self._store(user.id, user.username, user.profile_picture, user.team_id)
+
+    def note_interaction(self, user_id, other_user_id):
+        """Move other_user_id to the front of user_id's recent interactions"""
+        with self._lock:
+            cached = self._recent.get(user_id)
+            if cached:
+                recent = [other_user_id] + [uid for uid in cached[1] if uid != other_user_id]
+                self._recent[user_id] = (cached[0], recent[:RECENT_INTERACTIONS_LIMIT])
+
+    def _recent_interactions(self, user_id):
+        """Users that user_id recently mentioned or was mentioned by, most recent first"""
+        cached = self._recent.get(user_id)
+        if cached and time.monotonic() - cached[0] < RECENT_INTERACTIONS_TTL:
+            return cached[1]
+
+        rows = (db.session.query(Mention.mentioner_user_id, Mention.mentioned_user_id)
+                .filter(or_(Mention.mentioner_user_id == user_id,
+                            Mention.mentioned_user_id == user_id))
+                .order_by(Mention.created_at.desc())
+                .limit(RECENT_INTERACTIONS_LIMIT)
+                .all())
+        recent = []
+        for mentioner_id, mentioned_id in rows:
+            other_id = mentioned_id if mentioner_id == user_id else mentioner_id
+            if other_id not in recent:
+                recent.append(other_id)
+        with self._lock:
+            self._recent[user_id] = (time.monotonic(), recent)
+        return recent
+
+    def search(self, prefix, searcher=None, limit=10):
+        """
+        Find users whose username starts with prefix (case-insensitive)
+
+        Args:
+            prefix: Username prefix; an empty prefix matches everyone
+            searcher: User doing the search, used for ranking
+            limit: Maximum number of results
+
+        Returns:
+            list: User dicts, team-mates first, then recent interactions,
+            then alphabetical matches
+        """
+        self._ensure_loaded()
+        prefix = prefix.lower()
+
+        preferred = []
+        if searcher is not None:
+            recent = self._recent_interactions(searcher.id)
+            with self._lock:
+                team_mates = sorted(self._team_members.get(searcher.team_id, ()),
+                                    key=lambda uid: self._users[uid]['username'].lower())
+            preferred = team_mates + recent
+
+        results = []
+        seen = set()
+        if searcher is not None:
+            seen.add(searcher.id)  # Don't suggest mentioning yourself
+
+        with self._lock:
+            for user_id in preferred:
+                user = self._users.get(user_id)
+                if user and user_id not in seen and user['username'].lower().startswith(prefix):
+                    results.append(user)
+                    seen.add(user_id)
+                    if len(results) >= limit:
+                        return results
+
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, user_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if user_id not in seen:
+                    results.append(self._users[user_id])
+                    seen.add(user_id)
+                position += 1
+
+        return results
+
+
+username_index = UsernameIndex()
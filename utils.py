@@ -1,8 +1,80 @@
 """Utility functions for the Campfire Adelaide Dashboard"""
 import re
 import os
+import time
+import random
+import string
+import base64
+import binascii
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from models import User, Mention
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, User, Mention, Announcement, RegistrationCode
+
+# Process-local cache of data rendered on every page (site settings and
+# active announcements). Writers call invalidate_site_cache(), which bumps
+# the version; readers reload lazily on their next render.
+_site_cache = {'version': 0, 'entry': None}
+_site_cache_lock = threading.Lock()
+
+# Bounded LRU cache of username -> user id shared by mention parsing and
+# highlighting. Unknown names are cached as None for a short while only,
+# since users registered through another worker process never invalidate it.
+USERNAME_CACHE_SIZE = 10000
+UNKNOWN_USERNAME_TTL = 300  # seconds
+_username_cache = OrderedDict()
+_username_cache_lock = threading.Lock()
+
+MENTION_PATTERN = re.compile(r'@(\w+)')
+
+REGISTRATION_CODE_LENGTH = 6
+# Codes checked per IN (...) query; stays well under SQLite's bound-parameter limit
+CODE_LOOKUP_BATCH = 500
+
+
+def resolve_usernames(usernames):
+    """
+    Map usernames to user IDs through the shared username cache
+    
+    All cache misses are resolved with a single IN query.
+    
+    Returns:
+        dict: {username: user_id} for the usernames that exist
+    """
+    resolved = {}
+    missing = []
+    now = time.monotonic()
+    with _username_cache_lock:
+        for username in set(usernames):
+            cached = _username_cache.get(username)
+            if cached is None or (cached[0] is None and now - cached[1] > UNKNOWN_USERNAME_TTL):
+                missing.append(username)
+                continue
+            _username_cache.move_to_end(username)
+            if cached[0] is not None:
+                resolved[username] = cached[0]
+    
+    if missing:
+        found = dict(db.session.query(User.username, User.id).filter(User.username.in_(missing)))
+        with _username_cache_lock:
+            for username in missing:
+                _username_cache[username] = (found.get(username), now)
+                _username_cache.move_to_end(username)
+            while len(_username_cache) > USERNAME_CACHE_SIZE:
+                _username_cache.popitem(last=False)
+        resolved.update(found)
+    
+    return resolved
+
+
+def invalidate_username(username):
+    """Drop a username from the cache, e.g. after a user with that name is created"""
+    with _username_cache_lock:
+        _username_cache.pop(username, None)
 
 
 def parse_mentions(text, current_user_id, post_id=None, comment_id=None):
@@ -11,17 +83,15 @@ def parse_mentions(text, current_user_id, post_id=None, comment_id=None):
     Returns list of Mention objects
     """
     # Find all @mentions (alphanumeric usernames)
-    mention_pattern = r'@(\w+)'
-    mentioned_usernames = re.findall(mention_pattern, text)
+    user_ids = resolve_usernames(MENTION_PATTERN.findall(text))
     
     mentions = []
-    for username in set(mentioned_usernames):  # Use set to avoid duplicates
-        user = User.query.filter_by(username=username).first()
-        if user and user.id != current_user_id:  # Don't mention yourself
+    for user_id in set(user_ids.values()):  # Use set to avoid duplicates
+        if user_id != current_user_id:  # Don't mention yourself
             mention = Mention(
                 post_id=post_id,
                 comment_id=comment_id,
-                mentioned_user_id=user.id,
+                mentioned_user_id=user_id,
                 mentioner_user_id=current_user_id
             )
             mentions.append(mention)
@@ -33,16 +103,15 @@ def highlight_mentions(text):
     """
     Convert @mentions to HTML links
     """
-    mention_pattern = r'@(\w+)'
+    user_ids = resolve_usernames(MENTION_PATTERN.findall(text))
     
     def replace_mention(match):
         username = match.group(1)
-        user = User.query.filter_by(username=username).first()
-        if user:
-            return f'<a href="/user/{user.id}" class="mention">@{username}</a>'
+        if username in user_ids:
+            return f'<a href="/user/{user_ids[username]}" class="mention">@{username}</a>'
         return match.group(0)
     
-    return re.sub(mention_pattern, replace_mention, text)
+    return MENTION_PATTERN.sub(replace_mention, text)
 
 
 def sanitize_html(text):
@@ -58,6 +127,17 @@ def sanitize_html(text):
     return text
 
 
+# Bump whenever render_comment's output changes, then run rerender_comments.py
+COMMENT_RENDER_VERSION = 1
+
+
+def render_comment(text):
+    """
+    Render raw comment text to the HTML stored in Comment.content_html
+    """
+    return highlight_mentions(sanitize_html(text))
+
+
 def validate_url(url):
     """
     Validate if a string is a valid URL
@@ -72,9 +152,12 @@ def validate_url(url):
     return url_pattern.match(url) is not None
 
 
-def get_site_settings():
+def load_site_settings():
     """
-    Get current site settings (cached)
+    Load the site settings row from the database, creating it if missing
+    
+    Use this when the settings are going to be modified; templates should
+    use the cached get_site_settings() instead.
     """
     from models import SiteSettings
     settings = SiteSettings.query.first()
@@ -87,6 +170,77 @@ def get_site_settings():
     return settings
 
 
+def invalidate_site_cache():
+    """Bump the site cache version so settings and announcements are reloaded"""
+    with _site_cache_lock:
+        _site_cache['version'] += 1
+
+
+def _snapshot(obj):
+    """Detached, read-only copy of a model's column values, safe to share across requests"""
+    return SimpleNamespace(**{column.key: getattr(obj, column.key) for column in obj.__table__.columns})
+
+
+def _next_expiry(announcements):
+    """Earliest expires_at among the given announcements, or None"""
+    return min((a.expires_at for a in announcements if a.expires_at), default=None)
+
+
+def _get_site_cache():
+    """
+    Return the current site cache entry, reloading it if it is stale
+    
+    An entry is stale when its version has been bumped in this process, or
+    after SITE_CACHE_TTL seconds so that writes made by other worker
+    processes are picked up too.
+    """
+    ttl = current_app.config.get('SITE_CACHE_TTL', 60)
+    entry = _site_cache['entry']
+    if (entry is None or entry['version'] != _site_cache['version']
+            or (ttl and time.monotonic() - entry['loaded_at'] > ttl)):
+        with _site_cache_lock:
+            version = _site_cache['version']
+            entry = _site_cache['entry']
+            if (entry is None or entry['version'] != version
+                    or (ttl and time.monotonic() - entry['loaded_at'] > ttl)):
+                now = datetime.utcnow()
+                announcements = [_snapshot(a) for a in Announcement.query.filter(
+                    (Announcement.expires_at == None) | (Announcement.expires_at > now)
+                ).order_by(Announcement.is_pinned.desc(), Announcement.created_at.desc())]
+                entry = {
+                    'version': version,
+                    'loaded_at': time.monotonic(),
+                    'settings': _snapshot(load_site_settings()),
+                    'announcements': announcements,
+                    'next_expiry': _next_expiry(announcements)
+                }
+                _site_cache['entry'] = entry
+    return entry
+
+
+def get_site_settings():
+    """
+    Get current site settings (cached)
+    """
+    return _get_site_cache()['settings']
+
+
+def get_active_announcements():
+    """
+    Get unexpired announcements, pinned first (cached)
+    
+    Expiry is applied from the cached expires_at values, so announcements
+    drop off on schedule without querying the database.
+    """
+    entry = _get_site_cache()
+    if entry['next_expiry'] and entry['next_expiry'] <= datetime.utcnow():
+        now = datetime.utcnow()
+        active = [a for a in entry['announcements'] if not a.expires_at or a.expires_at > now]
+        entry['announcements'] = active
+        entry['next_expiry'] = _next_expiry(active)
+    return entry['announcements']
+
+
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
@@ -100,22 +254,133 @@ def generate_unique_filename(original_filename):
     return filename
 
 
+def remove_file(path):
+    """Delete a file if it exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def generate_registration_codes(count, length=REGISTRATION_CODE_LENGTH):
+    """
+    Create `count` new unique numeric registration codes
+    
+    Candidates are drawn in batches and checked against existing codes
+    with one IN query per CODE_LOOKUP_BATCH candidates, and the new codes
+    are inserted with a single executemany, so the cost is a handful of
+    statements rather than a query and an INSERT per code. Nothing is
+    committed; the caller commits.
+    
+    Args:
+        count: Number of codes to create
+        length: Digits per code
+    
+    Returns:
+        list: The new codes
+    
+    Raises:
+        ValueError: If fewer than `count` unused code values remain
+    """
+    if RegistrationCode.query.count() + count > 10 ** length:
+        raise ValueError(f'Not enough {length}-digit codes left to generate {count}')
+    
+    codes = set()
+    while len(codes) < count:
+        # Draw a little extra to absorb collisions in this round
+        needed = count - len(codes)
+        candidates = {''.join(random.choices(string.digits, k=length))
+                      for _ in range(needed + needed // 10 + 1)} - codes
+        candidates = list(candidates)
+        taken = set()
+        for i in range(0, len(candidates), CODE_LOOKUP_BATCH):
+            batch = candidates[i:i + CODE_LOOKUP_BATCH]
+            taken.update(row[0] for row in db.session.query(RegistrationCode.code)
+                         .filter(RegistrationCode.code.in_(batch)))
+        codes.update(code for code in candidates if code not in taken)
+    
+    codes = list(codes)[:count]
+    now = datetime.utcnow()
+    db.session.execute(RegistrationCode.__table__.insert(),
+                       [{'code': code, 'is_used': False, 'created_at': now} for code in codes])
+    return codes
+
+
+def upsert(table):
+    """INSERT construct supporting ON CONFLICT for the active database dialect"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor produced by encode_cursor
+    Returns (created_at, id) or None if the token is missing or malformed
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, binascii.Error):
+        return None
+
+
+def keyset_paginate(query, model, cursor=None, limit=20, descending=True):
+    """
+    Fetch one page of a query ordered by (created_at, id) using a keyset cursor
+    
+    Unlike offset pagination the cost of a page does not depend on how deep
+    it is, provided an index on (..., created_at, id) backs the query.
+    
+    Returns (items, next_cursor); next_cursor is None on the last page
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, row_id = position
+        if descending:
+            query = query.filter(and_(
+                model.created_at <= created_at,
+                or_(model.created_at < created_at, model.id < row_id)
+            ))
+        else:
+            query = query.filter(and_(
+                model.created_at >= created_at,
+                or_(model.created_at > created_at, model.id > row_id)
+            ))
+    
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+    
+    # Fetch one extra row to find out whether another page exists
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return items, next_cursor
+
+
 def create_audit_log(user_id, action_type, action_details, ip_address=None):
     """
     Create an audit log entry
+    
+    The entry is queued for the background audit writer (see audit.py)
+    rather than committed here, so it neither slows the request down nor
+    commits anything else pending in the session.
     """
-    from models import AuditLog, db
-    import json
-    
-    log = AuditLog(
-        user_id=user_id,
-        action_type=action_type,
-        action_details=json.dumps(action_details) if isinstance(action_details, dict) else action_details,
-        ip_address=ip_address
-    )
-    db.session.add(log)
-    db.session.commit()
-    return log
+    from audit import audit_writer
+    audit_writer.submit(user_id, action_type, action_details, ip_address)
 
 
 def format_time_ago(dt):